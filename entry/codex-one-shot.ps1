@@ -17,8 +17,8 @@ $prompt = @"
   Python: 
     - 生成/更新 
       - 移动策略工厂：
-        - 源码：src/tools/move/implementations.py（使用 @factory.register("<key>")）
-        - 接口：src/tools/move/interfaces.py（Mover 类型）
+        - 规则：src/tools/move/rules.toml（新增一条 [[rule]]，字段说明见文件开头）
+        - 编译/注册：src/tools/move/rules.py、src/tools/move/implementations.py（一般不需要改）
         - 默认行为：default_move / hardlink
       - 新增/完善 Pytest：tests/test_mover_<key>.py（仿照现有用例）
     - 运行测试：pytest -q
@@ -1,9 +1,12 @@
 import argparse
 
-from tools import enqueue
+from tools.enqueue_client import EnqueueRejected, enqueue_addr, send_enqueue
+from tools.share import LOGGER, setup_logging
 
 
 def main():
+    # 只插一行就退出，不挂 TG 推送
+    setup_logging(network=False)
     parser = argparse.ArgumentParser()
     parser.add_argument("--name", required=True)
     parser.add_argument("--category", default="")
@@ -22,12 +25,27 @@ def main():
             return (k, int(v))
         return (k, v)
 
-    enqueue(
-        name=args.name,
-        category=args.category,
-        tags=dict([_parse_kv(tag) for tag in tags_args]),
-        content_path=args.content_path,
-    )
+    request = {
+        "name": args.name,
+        "category": args.category,
+        "tags": dict([_parse_kv(tag) for tag in tags_args]),
+        "content_path": args.content_path,
+    }
+
+    # 先交给常驻 worker 里的入队服务（批量写库并立即开始处理），连不上再直接写库
+    if enqueue_addr():
+        try:
+            task_id = send_enqueue(request)
+        except (OSError, ValueError, EnqueueRejected) as e:
+            LOGGER.warning(f"入队服务不可用，直接写入数据库: {e}")
+        else:
+            LOGGER.info(f"任务已提交到入队服务，ID: {task_id}")
+            return
+
+    # 直接写库时才加载 dba
+    from tools.intake import enqueue
+
+    enqueue(**request)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
 from tools import execute
+from tools.share import setup_logging
 
 if __name__ == "__main__":
+    setup_logging()
     execute()
@@ -0,0 +1,33 @@
+import argparse
+
+from tools import dba
+from tools.move import journal
+from tools.service import dry_run_move, get_task
+from tools.share import setup_logging
+from tools.share.result import Err
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="查看 / 预演 / 回滚任务的链接计划")
+    parser.add_argument(
+        "action",
+        choices=["dry-run", "show", "rollback"],
+        help="dry-run: 只计算不执行；show: 查看已记录的计划；rollback: 删除任务新建的链接",
+    )
+    parser.add_argument("--task_id", required=True, type=int)
+    args = parser.parse_args()
+
+    if args.action == "dry-run":
+        result = get_task(args.task_id)
+        if isinstance(result, Err):
+            raise SystemExit(str(result.error))
+        print(journal.format_plan(dry_run_move(result.value)))
+    elif args.action == "show":
+        print(journal.format_plan(dba.get_link_plan(args.task_id).value))
+    else:
+        print(f"已删除 {journal.rollback(args.task_id)} 个链接")
+
+
+if __name__ == "__main__":
+    main()
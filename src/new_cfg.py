@@ -2,9 +2,11 @@ import argparse
 import json
 
 from tools import create_cfg
+from tools.share import setup_logging
 
 
 def main():
+    setup_logging()
     parser = argparse.ArgumentParser()
     parser.add_argument("--season", required=True)
     parser.add_argument("--tmdb_id", required=True)
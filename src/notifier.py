@@ -0,0 +1,39 @@
+import argparse
+import signal
+import sys
+
+from tools import dba
+from tools.share import LOGGER, setup_logging
+from tools.share.outbox import sender_from_env
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(
+        description="常驻发送 outbox 里的 Telegram 通知（worker 进程已经顺带发送，不跑 worker 时才需要）"
+    )
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument(
+        "--once", action="store_true", help="把当前到期的通知发完就退出"
+    )
+    args = parser.parse_args()
+
+    notifier = sender_from_env()
+    if notifier is None:
+        LOGGER.error("未设置 TELEGRAM_BOT_TOKEN/TELEGRAM_CHAT_ID")
+        sys.exit(1)
+    notifier.poll_interval_sec = args.poll_interval
+
+    if args.once:
+        while notifier.drain_once() > 0:
+            pass
+    else:
+        for name in ("SIGINT", "SIGTERM"):
+            signal.signal(getattr(signal, name), lambda signum, frame: notifier.stop())
+        # 在主线程里跑，收到信号后发完最后一轮再退出
+        notifier.run()
+    dba.POOL.close_all()
+
+
+if __name__ == "__main__":
+    main()
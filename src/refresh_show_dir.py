@@ -0,0 +1,25 @@
+import argparse
+
+from tools.dba import get_cfg_by_idx
+from tools.meta import Cfg
+from tools.service import refresh_show_dir
+from tools.share import setup_logging
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="按 TMDB 当前剧名重新登记剧集目录")
+    parser.add_argument("--tmdb_id", required=True, type=int)
+    parser.add_argument("--category", required=True)
+    parser.add_argument(
+        "--season", type=int, default=1, help="用哪一季的 cfg 来找分类根目录"
+    )
+    args = parser.parse_args()
+
+    cfg = get_cfg_by_idx(args.tmdb_id, args.season).value or Cfg.get_default_cfg()
+    root_dir = cfg.cfg["category_mapping"][args.category]
+    print(refresh_show_dir(args.tmdb_id, args.category, root_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from typing import Any
+
+from tools import service
+from tools.dba import (
+    LeaseLostError,
+    LockNotExpiredError,
+    get_lock,
+    hold_lock,
+    release_lock,
+)
+from tools.service import (
+    SERIES_LOCK_TTL,
+    fail_task,
+    pop_task,
+    process_task,
+    release_tasks,
+    series_lock_name,
+)
+from tools.share import LOGGER
+from tools.share.result import Err, Ok
+
+"""
+execute / create_cfg 的实现。会加载 service（requests、移动规则等），只在真正需要时才导入，见 tools/__init__.py。
+"""
+
+
+def execute() -> Ok[None]:
+    # pop_task 原子地领取任务，多个 execute 可以并行，不再需要全局锁；
+    # 同一部剧的任务由 series 锁串行，避免同时往一个目录里链接
+    match pop_task():
+        case Ok(value=task):
+            key = series_lock_name(task)
+            # 锁在后台续期，大包处理得再久也不会过期
+            with hold_lock(key, ttl=SERIES_LOCK_TTL) as result:
+                if isinstance(result, Err):
+                    LOGGER.info(f"{key} 正在被处理，任务放回队列: {result.error}")
+                    release_tasks([task], task.worker_id)
+                    return Ok(None)
+                try:
+                    process_task(task, result.value)
+                except LeaseLostError as e:
+                    LOGGER.warning(f"{key} 已被接管，任务放回队列: {e}")
+                    release_tasks([task], task.worker_id)
+                except Exception:
+                    # 和 worker 一样记一次失败：退避后重试，次数到上限标记为已失败
+                    LOGGER.exception(f"任务处理失败, ID: {task.id}")
+                    fail_task(task, task.worker_id)
+                    raise
+        case Err(error=e):
+            LOGGER.debug(f"{e}. 没有任务，跳过...")
+
+    return Ok(None)
+
+
+def create_cfg(season: int, tmdb_id: int, cfg: dict[str, Any] | None = None):
+    result = get_lock("create_cfg", ttl=300)
+    if isinstance(result, Err):
+        error = result.error
+        if isinstance(error, LockNotExpiredError):
+            LOGGER.info(f"锁未过期: {error}")
+            return Ok(None)
+        # 过期的锁 get_lock 会直接接管，不会走到这里
+        raise RuntimeError(f"获取锁失败: {error}")
+    lock_token = result.value
+
+    service.create_cfg(season, tmdb_id, cfg)
+
+    return release_lock("create_cfg", lock_token)
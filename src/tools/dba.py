@@ -1,26 +1,28 @@
 import json
+import ntpath
+import os
+import posixpath
 import sqlite3
+import threading
 import time
-import uuid
-from dataclasses import dataclass
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
-from dotenv import load_dotenv
-
 from tools.meta import Cfg, Task
 from tools.share import LOGGER, format_timestamp, sqlite_row_to_dict
-from tools.share.result import Ok, Result, err
+from tools.share.result import Err, Ok, Result, err
 
-load_dotenv()
 DB_PATH = Path("data")
 DB_FILE = DB_PATH / "app.db"
 
+RowFactory = Callable[[sqlite3.Cursor, tuple[Any, ...]], Any]
 
-SCHEMA = """
-PRAGMA encoding = 'UTF-8';   -- 默认就是 UTF-8
-PRAGMA encoding;             -- 查询当前编码
 
+# 初始版本的表结构（user_version = 1）。之后的改动都写成迁移，不要再改这里
+SCHEMA = """
 CREATE TABLE IF NOT EXISTS task(
     id           INTEGER PRIMARY KEY,
     name         TEXT NOT NULL,
@@ -45,61 +47,470 @@ CREATE TABLE IF NOT EXISTS locks(
     token      TEXT NOT NULL UNIQUE,                                              -- 防止其他程序来关掉锁
     is_locked  INTEGER NOT NULL DEFAULT  1 CHECK (is_locked IN (0,1)),            -- 是否锁定
     locked_at  INTEGER NOT NULL DEFAULT (CAST(strftime('%s','now') AS INTEGER)),  -- 锁定时间
-    expires_at INTEGER NOT NULL                                                   -- timeout 
+    expires_at INTEGER NOT NULL                                                   -- timeout
 );
 
 CREATE INDEX IF NOT EXISTS idx_locks_name_active ON locks(name, is_locked, expires_at DESC);
 CREATE INDEX IF NOT EXISTS idx_locks_expires_at ON locks(expires_at);
 """
 
+Migration = Callable[[sqlite3.Connection], None]
+MIGRATIONS: dict[int, Migration] = {}
+
+
+def migration(version: int):
+    """注册一个 schema 迁移。版本号写入 PRAGMA user_version，只会向前执行一次。"""
+
+    def deco(fn: Migration) -> Migration:
+        if version in MIGRATIONS:
+            raise ValueError(f"迁移版本重复: {version}")
+        MIGRATIONS[version] = fn
+        return fn
+
+    return deco
+
+
+def execute_statements(conn: sqlite3.Connection, script: str) -> None:
+    """逐条执行 SQL 脚本。executescript 会先隐式 COMMIT，不能放进迁移事务里用。"""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        raise ValueError(f"SQL 脚本结尾不完整: {statement!r}")
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+@migration(1)
+def _migrate_base_schema(conn: sqlite3.Connection) -> None:
+    # 引入迁移之前建的库已经有这些表，全部 IF NOT EXISTS，可以直接重放
+    execute_statements(conn, SCHEMA)
+
+
+@migration(2)
+def _migrate_task_lease(conn: sqlite3.Connection) -> None:
+    columns = table_columns(conn, "task")
+    for column, decl in (("worker_id", "TEXT"), ("lease_expires_at", "INTEGER")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE task ADD COLUMN {column} {decl}")
+
 
-def get_connection():
-    if not DB_PATH.exists():
-        DB_PATH.mkdir(parents=True, exist_ok=True)
+@migration(3)
+def _migrate_queue_indexes(conn: sqlite3.Connection) -> None:
+    execute_statements(
+        conn,
+        """
+        -- 只索引未开始的任务，已完成的任务再多也不影响出队
+        CREATE INDEX IF NOT EXISTS idx_task_pending ON task(created_at, id) WHERE status = 0;
+        -- 回收过期租约时只看进行中的任务
+        CREATE INDEX IF NOT EXISTS idx_task_leased ON task(lease_expires_at) WHERE status = 1;
 
-    connection = sqlite3.connect(DB_FILE)
-    connection.row_factory = sqlite_row_to_dict
+        -- (tmdb_id, season) 唯一。先清理并发创建出来的重复行，保留最早的一条（与之前读取时的行为一致）
+        DELETE FROM cfg WHERE id NOT IN (SELECT MIN(id) FROM cfg GROUP BY tmdb_id, season);
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_cfg_tmdb_season ON cfg(tmdb_id, season);
+        """,
+    )
 
-    # 检查数据库是否存在，如果不存在则创建
-    locks_table = connection.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name='locks'"
-    ).fetchone()
-    if locks_table is None:
-        LOGGER.info(f"数据库不存在，正在创建 {DB_FILE}...")
-        connection.executescript(SCHEMA)  # 初始化数据库（如果不存在）
-        connection.commit()
 
-    connection.execute("PRAGMA busy_timeout=5000")
-    return connection
+@migration(4)
+def _migrate_tmdb_cache(conn: sqlite3.Connection) -> None:
+    execute_statements(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS tmdb_cache(
+            kind          TEXT NOT NULL,              -- tv / movie / tv/season/1 ...
+            tmdb_id       INTEGER NOT NULL,
+            language      TEXT NOT NULL DEFAULT '',
+            appends       TEXT NOT NULL DEFAULT '',   -- append_to_response，排序后拼接
+            params        TEXT NOT NULL DEFAULT '{}', -- 其余查询参数（json，key 排序）
+            status        INTEGER NOT NULL,           -- 200 正常缓存，404 负缓存
+            payload       TEXT,                       -- 响应 json，负缓存时为空
+            etag          TEXT,
+            last_modified TEXT,
+            fetched_at    INTEGER NOT NULL,
+            expires_at    INTEGER NOT NULL,
+            PRIMARY KEY (kind, tmdb_id, language, appends, params)
+        ) WITHOUT ROWID;
+        """,
+    )
+
+
+@migration(5)
+def _migrate_show_dir(conn: sqlite3.Connection) -> None:
+    execute_statements(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS show_dir(
+            tmdb_id    INTEGER NOT NULL,
+            category   TEXT NOT NULL,
+            directory  TEXT NOT NULL,  -- 剧集在库里的根目录（分类根目录/剧名）
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            updated_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            PRIMARY KEY (tmdb_id, category)
+        ) WITHOUT ROWID;
+        """,
+    )
+
+
+@migration(6)
+def _migrate_link_plan(conn: sqlite3.Connection) -> None:
+    execute_statements(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS link_plan(
+            task_id     INTEGER NOT NULL,
+            seq         INTEGER NOT NULL,  -- 执行顺序
+            source      TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            strategy    TEXT,  -- 计划时为预估的方式，执行后为实际使用的方式
+            status      INTEGER NOT NULL DEFAULT 0,  -- 0 待执行 1 已链接 2 已存在跳过 3 冲突 4 已回滚
+            created_at  INTEGER NOT NULL DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            updated_at  INTEGER NOT NULL DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            PRIMARY KEY (task_id, seq)
+        ) WITHOUT ROWID;
+        """,
+    )
+
+
+@migration(7)
+def _migrate_outbox(conn: sqlite3.Connection) -> None:
+    execute_statements(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS outbox(
+            id              INTEGER PRIMARY KEY,
+            channel         TEXT NOT NULL DEFAULT 'telegram',
+            text            TEXT NOT NULL,
+            attempts        INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL DEFAULT 0,  -- 领取后写入租约到期时间，失败后写入下次重试时间
+            created_at      INTEGER NOT NULL DEFAULT (CAST(strftime('%s','now') AS INTEGER)),
+            sent_at         INTEGER  -- NULL 表示还没发出去
+        );
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+            ON outbox(next_attempt_at, id) WHERE sent_at IS NULL;
+        """,
+    )
+
+
+@migration(8)
+def _migrate_lock_fence(conn: sqlite3.Connection) -> None:
+    if "fence" not in table_columns(conn, "locks"):
+        # 同名锁每被获取一次加一，持有者凭它判断自己是不是最新的持有者
+        conn.execute("ALTER TABLE locks ADD COLUMN fence INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_locks_name_fence ON locks(name, fence DESC)"
+    )
+
+
+@migration(9)
+def _migrate_task_attempts(conn: sqlite3.Connection) -> None:
+    if "attempts" not in table_columns(conn, "task"):
+        # 处理失败的次数。到上限后 status 改为 4（已失败），不再被领取
+        conn.execute("ALTER TABLE task ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+
+def schema_version() -> int:
+    return max(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """把库升级到最新版本，返回升级前的版本号。"""
+    conn.execute("BEGIN IMMEDIATE")  # 多进程同时启动时只有一个会真正执行迁移
+    try:
+        current: int = conn.execute("PRAGMA user_version").fetchone()[0]
+        previous = current
+        for version in sorted(v for v in MIGRATIONS if v > current):
+            LOGGER.info(f"数据库迁移: {previous} -> {version}")
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            previous = version
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return current
 
 
-def insert_task(
-    name: str, category: str, tags: dict, content_path: str
-) -> Ok[int | None]:
+class ConnectionPool:
+    """
+    进程内的 sqlite 连接池：每个线程复用一条连接。
+    - schema 每个进程只初始化一次，不再每次取连接都查 sqlite_master
+    - busy_timeout 等连接级 PRAGMA 只在建连时设置一次
+    - 连接常驻，sqlite3 自带的语句缓存（cached_statements）保持热态
+    """
+
+    def __init__(
+        self,
+        db_file: Path | str,
+        *,
+        cached_statements: int = 256,
+        busy_timeout_ms: int = 5000,
+    ) -> None:
+        self.db_file = Path(db_file)
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._bootstrapped = False
+        self._pid = os.getpid()
+
+    def _bootstrap(self) -> None:
+        if self._bootstrapped:
+            return
+        with self._lock:
+            if self._bootstrapped:
+                return
+
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            is_new = not self.db_file.exists()
+            if is_new:
+                LOGGER.info(f"数据库不存在，正在创建 {self.db_file}...")
+
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout_ms / 1000)
+            try:
+                if is_new:
+                    conn.execute("PRAGMA encoding = 'UTF-8'")  # 默认就是 UTF-8
+                migrate(conn)
+                # WAL：多个 worker 并发领取任务时，读不阻塞写（不能在事务里切换）
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+            self._bootstrapped = True
+
+    def _connect(self) -> sqlite3.Connection:
+        self._bootstrap()
+        connection = sqlite3.connect(
+            self.db_file,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,  # 只在所属线程使用，关闭时可能来自其他线程
+        )
+        connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # fork 出来的子进程不能复用父进程的连接
+            self._reset()
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def connection(
+        self, row_factory: RowFactory | None = sqlite_row_to_dict
+    ) -> Iterator[sqlite3.Connection]:
+        """
+        借出当前线程的连接，语义与 `with sqlite3.connect(...) as conn` 一致：
+        正常退出提交，异常退出回滚。支持嵌套，只有最外层负责提交/回滚。
+        """
+        connection = self.acquire()
+        depth: int = self._local.depth
+        previous = connection.row_factory
+        connection.row_factory = row_factory
+        self._local.depth = depth + 1
+        try:
+            yield connection
+        except BaseException:
+            if depth == 0:
+                connection.rollback()
+            raise
+        else:
+            if depth == 0:
+                connection.commit()
+        finally:
+            connection.row_factory = previous
+            self._local.depth = depth
+
+    def close_all(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def _reset(self) -> None:
+        # 不 close 父进程的连接，直接丢弃引用
+        self._connections = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+
+POOL = ConnectionPool(DB_FILE)
+
+
+def get_connection(
+    row_factory: RowFactory | None = sqlite_row_to_dict,
+) -> AbstractContextManager[sqlite3.Connection]:
+    return POOL.connection(row_factory)
+
+
+def insert_task(name: str, category: str, tags: dict, content_path: str) -> Ok[int]:
+    """入队一个任务，去重规则同 insert_tasks。"""
+    task = {
+        "name": name,
+        "category": category,
+        "tags": tags,
+        "content_path": content_path,
+    }
+    return Ok(insert_tasks([task]).value[0])
+
+
+def normalize_content_path(path: str) -> str:
+    """
+    用于比较 content_path：统一成 / 分隔，去掉重复和结尾的分隔符、. 和 ..。
+    qBittorrent 跑在 Windows 上时路径是反斜杠、不分大小写，按 ntpath 规范化（转小写）；
+    不看 os.path，因为 worker 可能跑在 Linux 上处理 Windows 传来的路径。
+    """
+    if os.name == "nt" or "\\" in path or ntpath.splitdrive(path)[0]:
+        return ntpath.normcase(ntpath.normpath(path)).replace("\\", "/")
+    # posixpath.normpath 保留开头的 //（UNC 路径 //server/share）
+    return posixpath.normpath(path)
+
+
+def path_contains(parent: str, child: str) -> bool:
+    """child 与 parent 相同或在 parent 下面（两者都要先 normalize_content_path）。"""
+    return child == parent or child.startswith(parent.rstrip("/") + "/")
+
+
+def _dedupe_key(task: dict[str, Any]) -> tuple[Any, Any, str]:
+    return (
+        task["tags"]["tmdb"]["id"],
+        task["tags"]["season"],
+        task.get("category", ""),
+    )
+
+
+def insert_tasks(tasks: list[dict[str, Any]]) -> Ok[list[int]]:
+    """
+    一个事务里批量入队（executemany），返回与 tasks 一一对应的任务 ID。
+    同一部剧同一分类（tmdb_id, season, category）的未开始任务之间按 content_path 去重，
+    重复的工作不会交给 worker（分类不同会链接到不同的媒体库，不算重复）：
+    - 路径与某个未开始任务相同或在它下面：不插入，返回那个任务的 ID
+    - 路径包含别的未开始任务：插入，被包含的任务改为已取消（批次内的直接不插入）
+    """
+    if not tasks:
+        return Ok([])
+
     with get_connection() as conn:
-        cur = conn.execute(
-            "INSERT INTO task (name, category, tags, content_path) VALUES (?, ?, ?, ?)",
-            (name, category, json.dumps(tags, ensure_ascii=False), content_path),
+        if not conn.in_transaction:
+            # 查未开始任务到写入之间不能有别的进程入队
+            conn.execute("BEGIN IMMEDIATE")
+        first_id: int = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 AS id FROM task"
+        ).fetchone()["id"]
+
+        # 每部剧当前的未开始任务 [(ID, 规范化路径)]，随着批次处理更新
+        pending: dict[tuple[Any, Any, str], list[tuple[int, str]]] = {}
+        for key in dict.fromkeys(map(_dedupe_key, tasks)):
+            existing = conn.execute(
+                """
+                SELECT id, content_path FROM task
+                 WHERE status = 0
+                   AND json_extract(tags, '$.tmdb.id') = ?
+                   AND json_extract(tags, '$.season') = ?
+                   AND category = ?
+                """,
+                key,
+            ).fetchall()
+            pending[key] = [
+                (row["id"], normalize_content_path(row["content_path"]))
+                for row in existing
+            ]
+
+        next_id = first_id
+        ids: list[int] = []
+        new_rows: dict[int, tuple[Any, ...]] = {}
+        replaced: dict[int, int] = {}  # 被覆盖的任务 -> 覆盖它的任务
+        for task in tasks:
+            key = _dedupe_key(task)
+            path = normalize_content_path(task["content_path"])
+            covering = next(
+                (i for i, p in pending[key] if path_contains(p, path)), None
+            )
+            if covering is not None:
+                ids.append(covering)
+                continue
+
+            task_id = next_id
+            next_id += 1
+            covered = [i for i, p in pending[key] if path_contains(path, p)]
+            for i in covered:
+                replaced[i] = task_id
+                new_rows.pop(i, None)
+            pending[key] = [(i, p) for i, p in pending[key] if i not in replaced]
+            pending[key].append((task_id, path))
+            new_rows[task_id] = (
+                task_id,
+                task["name"],
+                task.get("category", ""),
+                json.dumps(task["tags"], ensure_ascii=False),
+                task["content_path"],
+            )
+            ids.append(task_id)
+
+        conn.executemany(
+            "INSERT INTO task (id, name, category, tags, content_path) VALUES (?, ?, ?, ?, ?)",
+            list(new_rows.values()),
+        )
+        cancelled = [i for i in replaced if i < first_id]
+        conn.executemany(
+            "UPDATE task SET status = 3, updated_at = ? WHERE id = ? AND status = 0",
+            [(int(time.time()), i) for i in cancelled],
+        )
+
+    def resolve(task_id: int) -> int:
+        while task_id in replaced:
+            task_id = replaced[task_id]
+        return task_id
+
+    ids = [resolve(i) for i in ids]
+    collapsed = len(tasks) - len(new_rows)
+    if collapsed or cancelled:
+        LOGGER.info(
+            f"入队去重: 提交 {len(tasks)} 个，新建 {len(new_rows)} 个，合并 {collapsed} 个，"
+            f"取消被包含的任务 {cancelled}"
         )
-        return Ok(cur.lastrowid)
+    return Ok(ids)
 
 
 def get_task_by_id(task_id: int) -> Ok[Task | None]:
-    with get_connection() as conn:
-        conn.row_factory = Task.format_for_sqlite
+    with get_connection(Task.format_for_sqlite) as conn:
         cur = conn.execute("SELECT * FROM task WHERE id = ?", (task_id,))
 
         return Ok(cur.fetchone())
 
 
-def update_task_status(task_id: int, status: int):
+def update_task_status(task_id: int, status: int, lease: "Lease | None" = None):
+    """传 lease 时是受保护的写入：锁已被接管（fence 过时）就不写，抛 LeaseLostError。"""
+    sql = "UPDATE task SET status = ?, updated_at = ? WHERE id = ?"
+    params: tuple[Any, ...] = (status, int(time.time()), task_id)
+    if lease is not None:
+        sql += f" AND {FENCE_CONDITION}"
+        params += fence_params(lease)
     with get_connection() as conn:
-        cur = conn.execute(
-            "UPDATE task SET status = ?, updated_at = ? WHERE id = ?",
-            (status, int(time.time()), task_id),
-        )
+        cur = conn.execute(sql, params)
 
         if cur.rowcount is None or cur.rowcount == 0:
+            if lease is not None:
+                ensure_lease(lease)
             raise RuntimeError("改变状态失败")
 
 
@@ -123,21 +534,44 @@ class LockExpiredError(Exception):
         return f"锁: '{self.name}' 已经过期 (过期时间={format_timestamp(self.expires_at)}，原时间戳：{self.expires_at}), 但该锁仍未被释放."
 
 
-def get_lock(
-    name: str, ttl: int = 60
-) -> Result[str, LockNotExpiredError | LockExpiredError]:
-    token = str(uuid.uuid4())
+@dataclass(eq=False)
+class LeaseLostError(Exception):
+    name: str
+    fence: int
+
+    def __str__(self) -> str:
+        return f"锁: '{self.name}' 已被接管或已过期 (fence={self.fence})，放弃受保护的写入."
+
+
+@dataclass
+class Lease:
+    """持有中的锁。fence 是 fencing token：同名锁每次被获取都更大，被接管后旧持有者的 fence 就过时了。"""
+
+    name: str
+    token: str
+    fence: int
+    ttl: int
+    expires_at: int
+    # 续期失败（已被接管）时置位，长任务在关键步骤之间检查它
+    lost: threading.Event = field(default_factory=threading.Event, repr=False)
+
+
+def acquire_lock(name: str, ttl: int = 60) -> Result[Lease, LockNotExpiredError]:
+    """
+    获取锁。已过期的锁（持有者没有续期，大概率已经崩溃）直接接管，fence 加一；
+    未过期时返回 LockNotExpiredError。
+    """
+    token = os.urandom(16).hex()
     now = int(time.time())
     with get_connection() as conn:
         conn.execute("BEGIN IMMEDIATE")
-
-        cur_1 = conn.execute(
-            "SELECT id, token, name, expires_at FROM locks WHERE name = ? and is_locked = 1 LIMIT 1",
+        row = conn.execute(
+            "SELECT token, name, expires_at FROM locks WHERE name = ? AND is_locked = 1 LIMIT 1",
             (name,),
-        )
-        row = cur_1.fetchone()
+        ).fetchone()
         if row is not None:
             if row["expires_at"] > now:
+                conn.rollback()
                 return err(
                     LockNotExpiredError(
                         name=row["name"],
@@ -145,30 +579,99 @@ def get_lock(
                         expires_at=row["expires_at"],
                     )
                 )
-            else:
-                return err(
-                    LockExpiredError(
-                        name=row["name"],
-                        token=row["token"],
-                        expires_at=row["expires_at"],
-                    )
-                )
+            expired = LockExpiredError(
+                name=row["name"], token=row["token"], expires_at=row["expires_at"]
+            )
+            LOGGER.warning(f"{expired} 接管该锁")
+            conn.execute(
+                "UPDATE locks SET is_locked = 0 WHERE name = ? AND is_locked = 1",
+                (name,),
+            )
 
-        cur_2 = conn.execute(
+        fence: int = conn.execute(
+            "SELECT COALESCE(MAX(fence), 0) + 1 AS fence FROM locks WHERE name = ?",
+            (name,),
+        ).fetchone()["fence"]
+        conn.execute(
             """
-            INSERT INTO locks (name, token, locked_at, expires_at)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO locks (name, token, fence, locked_at, expires_at)
+            VALUES (?, ?, ?, ?, ?)
             """,
-            (name, token, now, now + ttl),
+            (name, token, fence, now, now + ttl),
         )
 
-        if cur_2.rowcount is None:
-            conn.rollback()
-            raise RuntimeError(f"Failed to acquire lock for {name}.")
+    return Ok(Lease(name=name, token=token, fence=fence, ttl=ttl, expires_at=now + ttl))
+
+
+def get_lock(name: str, ttl: int = 60) -> Result[str, LockNotExpiredError]:
+    """只要 token 的旧接口，见 acquire_lock。"""
+    result = acquire_lock(name, ttl)
+    if isinstance(result, Err):
+        return result
+    return Ok(result.value.token)
+
+
+def renew_lock(lease: Lease) -> Result[int, LockExpiredError]:
+    """续期，返回新的过期时间。锁已经被接管或释放时返回 LockExpiredError。"""
+    now = int(time.time())
+    with get_connection() as conn:
+        cur = conn.execute(
+            """
+            UPDATE locks SET expires_at = ?
+             WHERE name = ? AND token = ? AND fence = ? AND is_locked = 1
+            """,
+            (now + lease.ttl, lease.name, lease.token, lease.fence),
+        )
+        if cur.rowcount == 0:
+            return err(
+                LockExpiredError(
+                    name=lease.name, token=lease.token, expires_at=lease.expires_at
+                )
+            )
+    lease.expires_at = now + lease.ttl
+    return Ok(lease.expires_at)
 
-        conn.commit()
 
-    return Ok(token)
+def is_current_lease(lease: Lease) -> bool:
+    """lease 仍被持有且没有更新的持有者（写入受保护的数据前用它做 fencing 检查）。"""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT MAX(fence) AS fence FROM locks WHERE name = ?", (lease.name,)
+        ).fetchone()
+        held = conn.execute(
+            "SELECT 1 FROM locks WHERE name = ? AND token = ? AND is_locked = 1 AND expires_at > ?",
+            (lease.name, lease.token, int(time.time())),
+        ).fetchone()
+    return held is not None and row["fence"] == lease.fence
+
+
+# 受保护写入的 fencing 条件（拼在 UPDATE 的 WHERE 里，参数见 fence_params）：
+# 持有者的锁仍然有效，并且没有 fence 更大的同名锁（没有被接管过）
+FENCE_CONDITION = """
+    EXISTS (
+        SELECT 1 FROM locks
+         WHERE name = ? AND token = ? AND fence = ? AND is_locked = 1 AND expires_at > ?
+    )
+    AND NOT EXISTS (SELECT 1 FROM locks WHERE name = ? AND fence > ?)
+"""
+
+
+def fence_params(lease: Lease) -> tuple[Any, ...]:
+    return (
+        lease.name,
+        lease.token,
+        lease.fence,
+        int(time.time()),
+        lease.name,
+        lease.fence,
+    )
+
+
+def ensure_lease(lease: Lease) -> None:
+    """fencing 检查：lease 不再有效时标记 lease.lost 并抛 LeaseLostError。"""
+    if not is_current_lease(lease):
+        lease.lost.set()
+        raise LeaseLostError(lease.name, lease.fence)
 
 
 def release_lock(name: str, token: str) -> Ok[None]:
@@ -183,19 +686,221 @@ def release_lock(name: str, token: str) -> Ok[None]:
     return Ok(None)
 
 
-def get_least_task() -> Ok[Task | None]:
+class _LockKeeper:
+    """
+    后台给所有持有中的锁续期（每个进程一个线程、一条连接）。
+    每把锁每隔 1/3 ttl 续期一次，续期失败就置 lease.lost 并不再管它。
+    """
+
+    def __init__(self) -> None:
+        self._leases: dict[str, Lease] = {}
+        self._due: dict[str, float] = {}  # token -> 下次续期的时间
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def add(self, lease: Lease) -> None:
+        with self._cond:
+            self._leases[lease.token] = lease
+            self._due[lease.token] = time.monotonic() + lease.ttl / 3
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="lock-keeper", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def remove(self, lease: Lease) -> None:
+        with self._cond:
+            self._leases.pop(lease.token, None)
+            self._due.pop(lease.token, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._leases:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [self._leases[t] for t, at in self._due.items() if at <= now]
+                if not due:
+                    self._cond.wait(max(min(self._due.values()) - now, 0.05))
+                    continue
+                for lease in due:
+                    self._due[lease.token] = now + lease.ttl / 3
+
+            for lease in due:
+                try:
+                    result = renew_lock(lease)
+                except sqlite3.Error as e:
+                    # 库暂时忙，稍后再试；真到期了会续期失败
+                    LOGGER.warning(f"锁续期失败，稍后重试: {lease.name}: {e}")
+                    continue
+                if isinstance(result, Err):
+                    with self._cond:
+                        if self._leases.pop(lease.token, None) is None:
+                            continue  # 续期期间已经正常释放
+                        self._due.pop(lease.token, None)
+                    LOGGER.error(f"锁已丢失: {result.error}")
+                    lease.lost.set()
+
+
+_KEEPER = _LockKeeper()
+
+
+@contextmanager
+def hold_lock(name: str, ttl: int = 60) -> Iterator[Result[Lease, LockNotExpiredError]]:
+    """
+    获取锁并在后台持续续期，退出时释放：
+        with hold_lock(key, ttl=120) as result:
+            if isinstance(result, Err): ...  # 别人正在持有
+            lease = result.value             # lease.lost 置位说明锁已被接管，应停止后续写入
+    进程崩溃后不再续期，最多一个 ttl 之后别人就能接管。
+    """
+    result = acquire_lock(name, ttl)
+    if isinstance(result, Err):
+        yield result
+        return
+
+    lease = result.value
+    _KEEPER.add(lease)
+    try:
+        yield result
+    finally:
+        _KEEPER.remove(lease)
+        if lease.lost.is_set():
+            LOGGER.warning(f"锁 {name} 已被接管，不再释放 (fence={lease.fence})")
+        else:
+            try:
+                release_lock(name, lease.token)
+            except RuntimeError as e:
+                LOGGER.warning(str(e))
+
+
+def series_lock_name(tmdb_id: int, season: int) -> str:
+    # 与 claim_tasks 里拼接锁名的 SQL 保持一致
+    return f"series:tmdb-{tmdb_id}-s{season}"
+
+
+def claim_tasks(
+    worker_id: str, limit: int = 1, lease_sec: int = 1800
+) -> Ok[list[Task]]:
+    """
+    单条 UPDATE ... RETURNING 原子地领取最早的 limit 个任务，并写入租约。
+    未开始的任务，以及租约已过期（领取者大概率已经崩溃）的进行中任务都可以被领取。
+    同一部剧（series 锁）正在被处理时，该剧的任务先不领取。
+    """
+    now = int(time.time())
+    with get_connection(Task.format_for_sqlite) as conn:
+        cur = conn.execute(
+            """
+            UPDATE task
+               SET status = 1, worker_id = ?, lease_expires_at = ?, updated_at = ?
+             WHERE id IN (
+                   -- 拆成 UNION ALL，两边都能命中各自的部分索引
+                   SELECT id FROM (
+                          SELECT id, created_at, tags FROM task WHERE status = 0
+                           UNION ALL
+                          SELECT id, created_at, tags FROM task
+                           WHERE status = 1 AND lease_expires_at < ?
+                   ) AS candidate
+                    WHERE NOT EXISTS (
+                          SELECT 1 FROM locks
+                           WHERE locks.name = 'series:tmdb-'
+                                 || json_extract(candidate.tags, '$.tmdb.id')
+                                 || '-s' || json_extract(candidate.tags, '$.season')
+                             AND locks.is_locked = 1
+                             -- 过期没续期的锁（持有者已崩溃）不再挡住这部剧
+                             AND locks.expires_at > ?
+                    )
+                    ORDER BY created_at ASC, id ASC
+                    LIMIT ?
+             )
+            RETURNING *
+            """,
+            (worker_id, now + lease_sec, now, now, now, limit),
+        )
+        tasks: list[Task] = cur.fetchall()
+
+    # RETURNING 不保证顺序
+    return Ok(sorted(tasks, key=lambda task: (task.created_at, task.id)))
+
+
+def release_tasks(task_ids: list[int], worker_id: str) -> Ok[int]:
+    """把领取了但没有处理的任务放回队列。"""
+    now = int(time.time())
     with get_connection() as conn:
-        conn.row_factory = Task.format_for_sqlite
+        cur = conn.executemany(
+            """
+            UPDATE task SET status = 0, worker_id = NULL, lease_expires_at = NULL, updated_at = ?
+             WHERE id = ? AND worker_id = ? AND status = 1
+            """,
+            [(now, task_id, worker_id) for task_id in task_ids],
+        )
+        return Ok(cur.rowcount)
+
+
+def fail_task(
+    task_id: int,
+    worker_id: str,
+    max_attempts: int,
+    retry_base_sec: int,
+    retry_max_sec: int,
+) -> Ok[Task | None]:
+    """
+    记一次处理失败（attempts 只在这里加一，放回队列不算失败）。
+    失败次数到 max_attempts 时任务改为已失败（4）；否则保持进行中，
+    租约改为 retry_base_sec * 2^(失败次数-1)（最多 retry_max_sec）秒后到期，到期后被重新领取。
+    返回更新后的任务，任务已不归 worker_id 所有时返回 None。
+    """
+    now = int(time.time())
+    with get_connection(Task.format_for_sqlite) as conn:
+        # SET 里的 attempts 都是更新前的值
         cur = conn.execute(
-            "SELECT * FROM task WHERE status = 0 ORDER BY created_at ASC LIMIT 1"
+            """
+            UPDATE task
+               SET attempts = attempts + 1,
+                   status = CASE WHEN attempts + 1 >= ? THEN 4 ELSE 1 END,
+                   lease_expires_at = CASE WHEN attempts + 1 >= ? THEN NULL
+                                           ELSE ? + MIN(?, ? << attempts) END,
+                   updated_at = ?
+             WHERE id = ? AND worker_id = ? AND status = 1
+            RETURNING *
+            """,
+            (
+                max_attempts,
+                max_attempts,
+                now,
+                retry_max_sec,
+                retry_base_sec,
+                now,
+                task_id,
+                worker_id,
+            ),
         )
-        task = cur.fetchone()
-        return Ok(task)
+        return Ok(cur.fetchone())
+
+
+def renew_task_leases(
+    task_ids: list[int], worker_id: str, lease_sec: int = 1800
+) -> Ok[list[int]]:
+    """给仍由 worker_id 持有的任务续租，返回续租成功的任务 ID（租约已被别人领走的不在其中）。"""
+    if not task_ids:
+        return Ok([])
+    now = int(time.time())
+    placeholders = ", ".join("?" * len(task_ids))
+    with get_connection(None) as conn:
+        cur = conn.execute(
+            f"""
+            UPDATE task SET lease_expires_at = ?, updated_at = ?
+             WHERE id IN ({placeholders}) AND worker_id = ? AND status = 1
+            RETURNING id
+            """,
+            (now + lease_sec, now, *task_ids, worker_id),
+        )
+        return Ok([row[0] for row in cur.fetchall()])
 
 
 def get_cfg(task: Task) -> Ok[Cfg | None]:
-    with get_connection() as conn:
-        conn.row_factory = Cfg.format_for_sqlite
+    with get_connection(Cfg.format_for_sqlite) as conn:
         cur = conn.execute(
             "SELECT * FROM cfg WHERE tmdb_id = ? AND season = ?",
             (task.tags.tmdb.id, task.tags.season),
@@ -205,8 +910,7 @@ def get_cfg(task: Task) -> Ok[Cfg | None]:
 
 
 def get_cfg_by_idx(tmdb_id: int, season: int) -> Ok[Cfg | None]:
-    with get_connection() as conn:
-        conn.row_factory = Cfg.format_for_sqlite
+    with get_connection(Cfg.format_for_sqlite) as conn:
         cur = conn.execute(
             "SELECT * FROM cfg WHERE tmdb_id = ? AND season = ?",
             (tmdb_id, season),
@@ -216,9 +920,231 @@ def get_cfg_by_idx(tmdb_id: int, season: int) -> Ok[Cfg | None]:
 
 
 def insert_cfg(season: int, tmdb_id: int, cfg: dict[str, Any]):
-    with get_connection() as conn:
-        conn.row_factory = Cfg.format_for_sqlite
+    with get_connection(Cfg.format_for_sqlite) as conn:
         conn.execute(
-            "INSERT INTO cfg (season, tmdb_id, cfg) VALUES (?, ?, ?)",
+            # 并发创建同一个 cfg 时以先写入的为准
+            """
+            INSERT INTO cfg (season, tmdb_id, cfg) VALUES (?, ?, ?)
+            ON CONFLICT (tmdb_id, season) DO NOTHING
+            """,
             (season, tmdb_id, json.dumps(cfg, ensure_ascii=False)),
         )
+
+
+def get_tmdb_cache(key: dict[str, Any]) -> Ok[dict[str, Any] | None]:
+    with get_connection() as conn:
+        cur = conn.execute(
+            """
+            SELECT * FROM tmdb_cache
+             WHERE kind = :kind AND tmdb_id = :tmdb_id AND language = :language
+               AND appends = :appends AND params = :params
+            """,
+            key,
+        )
+        return Ok(cur.fetchone())
+
+
+def upsert_tmdb_cache(key: dict[str, Any], entry: dict[str, Any]) -> Ok[None]:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO tmdb_cache (kind, tmdb_id, language, appends, params,
+                                    status, payload, etag, last_modified, fetched_at, expires_at)
+            VALUES (:kind, :tmdb_id, :language, :appends, :params,
+                    :status, :payload, :etag, :last_modified, :fetched_at, :expires_at)
+            ON CONFLICT (kind, tmdb_id, language, appends, params) DO UPDATE SET
+                status = excluded.status,
+                payload = excluded.payload,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                fetched_at = excluded.fetched_at,
+                expires_at = excluded.expires_at
+            """,
+            {**key, **entry},
+        )
+    return Ok(None)
+
+
+def delete_tmdb_cache(kind: str, tmdb_id: int) -> Ok[int]:
+    with get_connection() as conn:
+        cur = conn.execute(
+            "DELETE FROM tmdb_cache WHERE kind = ? AND tmdb_id = ?", (kind, tmdb_id)
+        )
+        return Ok(cur.rowcount)
+
+
+def get_show_dir(tmdb_id: int, category: str) -> Ok[str | None]:
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT directory FROM show_dir WHERE tmdb_id = ? AND category = ?",
+            (tmdb_id, category),
+        ).fetchone()
+        return Ok(row["directory"] if row is not None else None)
+
+
+def register_show_dir(tmdb_id: int, category: str, directory: str) -> Ok[str]:
+    """登记剧集目录；已经登记过则保留原来的，返回最终生效的目录。"""
+    with get_connection() as conn:
+        row = conn.execute(
+            """
+            INSERT INTO show_dir (tmdb_id, category, directory) VALUES (?, ?, ?)
+            ON CONFLICT (tmdb_id, category) DO UPDATE SET directory = directory
+            RETURNING directory
+            """,
+            (tmdb_id, category, directory),
+        ).fetchone()
+        return Ok(row["directory"])
+
+
+def set_show_dir(tmdb_id: int, category: str, directory: str) -> Ok[None]:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO show_dir (tmdb_id, category, directory) VALUES (?, ?, ?)
+            ON CONFLICT (tmdb_id, category) DO UPDATE SET
+                directory = excluded.directory,
+                updated_at = CAST(strftime('%s','now') AS INTEGER)
+            """,
+            (tmdb_id, category, directory),
+        )
+    return Ok(None)
+
+
+def append_link_plan(
+    task_id: int, ops: list[dict[str, Any]], lease: Lease | None = None
+) -> Ok[list[int]]:
+    """在任务的链接计划末尾追加一批操作（seq 接着已有的往后排），返回它们的 seq。"""
+    with get_connection(None) as conn:
+        if lease is not None:
+            if not conn.in_transaction:
+                # 先拿写锁再检查，检查到写入之间锁不会被别的进程接管
+                conn.execute("BEGIN IMMEDIATE")
+            ensure_lease(lease)
+        start = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM link_plan WHERE task_id = ?",
+            (task_id,),
+        ).fetchone()[0]
+        seqs = list(range(start, start + len(ops)))
+        conn.executemany(
+            """
+            INSERT INTO link_plan (task_id, seq, source, destination, strategy)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (task_id, seq, op["source"], op["destination"], op["strategy"])
+                for seq, op in zip(seqs, ops)
+            ],
+        )
+        return Ok(seqs)
+
+
+def get_link_plan(task_id: int) -> Ok[list[dict[str, Any]]]:
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM link_plan WHERE task_id = ? ORDER BY seq", (task_id,)
+        ).fetchall()
+        return Ok(rows)
+
+
+def update_link_ops(
+    task_id: int,
+    updates: list[tuple[int, int, str | None]],
+    lease: Lease | None = None,
+) -> Ok[int]:
+    """
+    一个事务里批量记录操作结果，updates 为 [(seq, status, strategy)]，strategy 为 None 时不改。
+    传 lease 时整批只做一次 fencing 检查（与写入在同一个事务里），锁已被接管就一条都不写，抛 LeaseLostError。
+    """
+    if not updates:
+        return Ok(0)
+    with get_connection() as conn:
+        if lease is not None:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            ensure_lease(lease)
+        conn.executemany(
+            """
+            UPDATE link_plan
+               SET status = ?, strategy = COALESCE(?, strategy),
+                   updated_at = CAST(strftime('%s','now') AS INTEGER)
+             WHERE task_id = ? AND seq = ?
+            """,
+            [(status, strategy, task_id, seq) for seq, status, strategy in updates],
+        )
+    return Ok(len(updates))
+
+
+def delete_link_plan(task_id: int) -> Ok[int]:
+    with get_connection() as conn:
+        cursor = conn.execute("DELETE FROM link_plan WHERE task_id = ?", (task_id,))
+        return Ok(cursor.rowcount)
+
+
+def insert_outbox(texts: list[str], channel: str = "telegram") -> Ok[int]:
+    """写入待发送的通知，只是一次本地写入，不涉及网络。"""
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO outbox (channel, text) VALUES (?, ?)",
+            [(channel, text) for text in texts],
+        )
+    return Ok(len(texts))
+
+
+def claim_outbox(
+    limit: int = 50, lease_sec: int = 60, channel: str = "telegram"
+) -> Ok[list[dict[str, Any]]]:
+    """
+    领取到期的待发送通知，按写入顺序返回。领取时把 next_attempt_at 推到租约到期时间，
+    发送进程中途退出的话，租约过期后会被重新领取（至少发送一次）。
+    """
+    now = int(time.time())
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            UPDATE outbox
+            SET next_attempt_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE sent_at IS NULL AND next_attempt_at <= ? AND channel = ?
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+            )
+            RETURNING id, text, attempts
+            """,
+            (now + lease_sec, now, channel, limit),
+        ).fetchall()
+    # RETURNING 不保证顺序
+    rows.sort(key=lambda row: row["id"])
+    return Ok(rows)
+
+
+def mark_outbox_sent(ids: list[int]) -> Ok[int]:
+    with get_connection() as conn:
+        cursor = conn.executemany(
+            """
+            UPDATE outbox SET sent_at = CAST(strftime('%s','now') AS INTEGER)
+            WHERE id = ? AND sent_at IS NULL
+            """,
+            [(i,) for i in ids],
+        )
+        return Ok(cursor.rowcount)
+
+
+def defer_outbox(ids: list[int], delay_sec: int) -> Ok[int]:
+    """发送失败，delay_sec 秒后再试。"""
+    with get_connection() as conn:
+        cursor = conn.executemany(
+            "UPDATE outbox SET next_attempt_at = ? WHERE id = ? AND sent_at IS NULL",
+            [(int(time.time()) + delay_sec, i) for i in ids],
+        )
+        return Ok(cursor.rowcount)
+
+
+def purge_outbox(older_than_sec: int) -> Ok[int]:
+    """删除发送成功超过 older_than_sec 秒的记录。"""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "DELETE FROM outbox WHERE sent_at IS NOT NULL AND sent_at < ?",
+            (int(time.time()) - older_than_sec,),
+        )
+        return Ok(cursor.rowcount)
@@ -0,0 +1,70 @@
+import json
+import os
+import socket
+from typing import Any
+
+"""
+入队客户端：把任务发给常驻 worker 里的入队服务（见 tools.enqueue_server），
+由服务端批量写库并立即唤醒 worker。只依赖标准库，qBittorrent 的“运行外部程序”每次启动都很快。
+
+地址由 MY_QB_TOOLS_ENQUEUE_ADDR 配置：
+    127.0.0.1:48123（默认，本机 TCP）
+    unix:/path/to/enqueue.sock（Unix socket）
+"""
+
+DEFAULT_ADDR = "127.0.0.1:48123"
+MAX_LINE = 64 * 1024
+# 服务端最多等这么久写库，超时就回失败
+COMMIT_TIMEOUT_SEC = 10.0
+# 客户端要比服务端等得久：先超时的话会改为直接写库，而服务端随后可能又写成功了
+CLIENT_TIMEOUT_SEC = COMMIT_TIMEOUT_SEC + 5.0
+
+
+class EnqueueRejected(Exception):
+    """服务端处理失败，调用方可以改为直接写库。"""
+
+
+def enqueue_addr() -> str:
+    return os.getenv("MY_QB_TOOLS_ENQUEUE_ADDR", DEFAULT_ADDR)
+
+
+def parse_addr(addr: str) -> tuple[int, str | tuple[str, int]]:
+    if addr.startswith("unix:"):
+        return socket.AF_UNIX, addr[len("unix:") :]
+    host, _, port = addr.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def connect(addr: str, timeout: float) -> socket.socket:
+    family, address = parse_addr(addr)
+    if family == socket.AF_INET:
+        return socket.create_connection(address, timeout=timeout)  # type: ignore[arg-type]
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def send_enqueue(
+    request: dict[str, Any],
+    addr: str | None = None,
+    timeout: float = CLIENT_TIMEOUT_SEC,
+) -> int:
+    """
+    发送一个入队请求（一行 JSON），返回任务 ID。
+    连不上 / 超时抛 OSError，服务端拒绝抛 EnqueueRejected。
+    """
+    with connect(addr or enqueue_addr(), timeout) as sock:
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline(MAX_LINE)
+    if not line:
+        raise ConnectionError("入队服务没有响应")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise EnqueueRejected(response.get("error", "未知错误"))
+    return int(response["id"])
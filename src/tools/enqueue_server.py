@@ -0,0 +1,266 @@
+import errno
+import json
+import os
+import queue
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+from tools import dba
+from tools.enqueue_client import (
+    COMMIT_TIMEOUT_SEC,
+    MAX_LINE,
+    connect,
+    enqueue_addr,
+    parse_addr,
+)
+from tools.share import LOGGER
+
+"""
+入队服务：跑在常驻 worker 进程里，接收 tools.enqueue_client 发来的入队请求。
+- 协议：每个连接一行 JSON 请求，回一行 JSON 响应 {"ok": true, "id": 任务ID}
+- 组提交：同一时间到达的请求合并成一个事务写入 task 表，一次 fsync
+- 提交后立即回调 on_commit（worker 用它唤醒自己），不用等下一次轮询
+"""
+
+REQUIRED_FIELDS = ("name", "tags", "content_path")
+
+
+def validate(request: Any) -> dict[str, Any]:
+    """缺字段抛 ValueError，字段类型不对抛 TypeError。"""
+    if not isinstance(request, dict):
+        raise TypeError("请求必须是 JSON 对象")
+    missing = [field for field in REQUIRED_FIELDS if field not in request]
+    if missing:
+        raise ValueError(f"缺少字段: {missing}")
+    tags = request["tags"]
+    if not isinstance(tags, dict):
+        raise TypeError("tags 必须是 JSON 对象")
+    # 写库时按 (tags.tmdb.id, tags.season) 分组去重，worker 读取时按 meta.Tags 解析，这里提前把关
+    season = tags.get("season")
+    if not isinstance(season, int) or isinstance(season, bool):
+        raise TypeError(f"tags.season 必须是整数: {season!r}")
+    tmdb = tags.get("tmdb")
+    if not isinstance(tmdb, dict):
+        raise TypeError("tags.tmdb 必须是 JSON 对象")
+    tmdb_id = tmdb.get("id")
+    if not isinstance(tmdb_id, int) or isinstance(tmdb_id, bool):
+        raise TypeError(f"tags.tmdb.id 必须是整数: {tmdb_id!r}")
+    if not isinstance(tmdb.get("name"), str):
+        raise TypeError("tags.tmdb.name 必须是字符串")
+    return {
+        "name": str(request["name"]),
+        "category": str(request.get("category", "")),
+        "tags": request["tags"],
+        "content_path": str(request["content_path"]),
+    }
+
+
+class GroupCommitter:
+    """单线程写库：取到第一个请求后最多再等 max_delay_sec，把这期间到达的请求一起提交。"""
+
+    def __init__(
+        self,
+        *,
+        max_batch: int = 64,
+        max_delay_sec: float = 0.005,
+        on_commit: Callable[[list[int]], None] | None = None,
+    ) -> None:
+        self.max_batch = max_batch
+        self.max_delay_sec = max_delay_sec
+        self.on_commit = on_commit
+        self.stats = {"requests": 0, "commits": 0}
+
+        self._queue: queue.SimpleQueue[tuple[dict[str, Any], Future[int]] | None] = (
+            queue.SimpleQueue()
+        )
+        self._thread: threading.Thread | None = None
+
+    def submit(self, request: dict[str, Any]) -> Future[int]:
+        future: Future[int] = Future()
+        self._queue.put((request, future))
+        return future
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="enqueue-commit", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_delay_sec
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self._queue.get(timeout=timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: list[tuple[dict[str, Any], Future[int]]]) -> None:
+        try:
+            # 整批一个事务；同一部剧互相包含的路径在这里合并（见 dba.insert_tasks）
+            ids = dba.insert_tasks([request for request, _ in batch]).value
+        except Exception as e:
+            if len(batch) == 1:
+                LOGGER.exception("入队失败")
+                batch[0][1].set_exception(e)
+                return
+            # 整批回滚了，逐个重新提交，只让出错的请求失败
+            LOGGER.exception(f"批量入队失败，{len(batch)} 个请求改为逐个提交")
+            for item in batch:
+                self._commit([item])
+            return
+
+        for (_, future), task_id in zip(batch, ids):
+            future.set_result(task_id)
+        self.stats["requests"] += len(batch)
+        self.stats["commits"] += 1
+        LOGGER.info(f"任务已添加到数据库，ID: {ids}")
+        if self.on_commit is not None:
+            try:
+                self.on_commit(ids)
+            except Exception:
+                LOGGER.exception("入队回调出错")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = 10.0
+
+    def handle(self) -> None:
+        line = self.rfile.readline(MAX_LINE)
+        if not line:
+            return
+        server: _ServerMixin = self.server  # type: ignore[assignment]
+        try:
+            request = validate(json.loads(line))
+            task_id = server.committer.submit(request).result(server.commit_timeout_sec)
+            response: dict[str, Any] = {"ok": True, "id": task_id}
+        except (ValueError, TypeError, KeyError, OSError, sqlite3.Error) as e:
+            # 请求不合法、写库超时（TimeoutError）或出错；其它异常由 socketserver 记录，
+            # 客户端收不到响应会改为直接写库
+            response = {"ok": False, "error": str(e) or type(e).__name__}
+        self.wfile.write(
+            json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n"
+        )
+
+
+class _ServerMixin:
+    committer: GroupCommitter
+    commit_timeout_sec: float
+
+
+class _TCPServer(_ServerMixin, socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(_ServerMixin, socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class EnqueueServer:
+    def __init__(
+        self,
+        addr: str | None = None,
+        *,
+        on_commit: Callable[[list[int]], None] | None = None,
+        max_batch: int = 64,
+        max_delay_sec: float = 0.005,
+        commit_timeout_sec: float = COMMIT_TIMEOUT_SEC,
+    ) -> None:
+        self.addr = addr or enqueue_addr()
+        self.committer = GroupCommitter(
+            max_batch=max_batch, max_delay_sec=max_delay_sec, on_commit=on_commit
+        )
+        self.commit_timeout_sec = commit_timeout_sec
+        self._server: socketserver.BaseServer | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "EnqueueServer":
+        """绑定地址并开始服务；地址被占用（比如另一个 worker 已经在服务）时抛 OSError。"""
+        _, address = parse_addr(self.addr)
+        server: _TCPServer | _UnixServer
+        if isinstance(address, tuple):
+            server = _TCPServer(address, _Handler)
+        else:
+            self._remove_stale_socket(address)
+            server = _UnixServer(address, _Handler)
+        server.committer = self.committer
+        server.commit_timeout_sec = self.commit_timeout_sec
+
+        self.committer.start()
+        self._server = server
+        self._thread = threading.Thread(
+            target=server.serve_forever,
+            kwargs={"poll_interval": 0.2},
+            name="enqueue-server",
+            daemon=True,
+        )
+        self._thread.start()
+        LOGGER.info(f"入队服务已启动: {self.address}")
+        return self
+
+    @property
+    def address(self) -> str:
+        if self._server is None:
+            return self.addr
+        address = self._server.server_address  # type: ignore[attr-defined]
+        if isinstance(address, tuple):
+            return f"{address[0]}:{address[1]}"
+        return f"unix:{address}"
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        # 已经收下的请求写完再退出
+        self.committer.stop()
+        family, address = parse_addr(self.addr)
+        if family != socket.AF_INET:
+            try:
+                os.unlink(address)  # type: ignore[arg-type]
+            except FileNotFoundError:
+                pass
+        self._server = None
+        self._thread = None
+
+    def _remove_stale_socket(self, path: str) -> None:
+        if not os.path.exists(path):
+            return
+        try:
+            connect(self.addr, timeout=0.5).close()
+        except OSError:
+            os.unlink(path)  # 上次没正常退出留下的
+            return
+        raise OSError(errno.EADDRINUSE, "入队服务已在运行", path)
@@ -0,0 +1,32 @@
+from typing import Any
+
+from tools import dba
+from tools.share import LOGGER
+
+"""
+入队。qBittorrent 每完成一个种子就启动一次 enqueue.py，只需要往 task 表插一行：
+这里只依赖 dba，不要导入 service / requests / 移动规则，保持冷启动快。
+"""
+
+
+def enqueue(
+    name: str,
+    category: str,
+    tags: dict[str, Any],
+    content_path: str,
+):
+    LOGGER.debug(
+        f"入队信息, name: {name}, category: {category}, tags: {tags}, content_path: {content_path}"
+    )
+    # 与已有的未开始任务重复时返回那个任务的 ID
+    [task_id] = dba.insert_tasks(
+        [
+            {
+                "name": name,
+                "category": category,
+                "tags": tags,
+                "content_path": content_path,
+            }
+        ]
+    ).value
+    LOGGER.info(f"任务已添加到数据库，ID: {task_id}")
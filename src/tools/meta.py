@@ -41,6 +41,9 @@ class Task:
     status: int
     created_at: int
     updated_at: int
+    worker_id: str | None = None
+    lease_expires_at: int | None = None
+    attempts: int = 0
 
     @classmethod
     def from_dict(cls, data: dict[str, Any] | sqlite3.Row) -> "Task":
@@ -53,6 +56,9 @@ class Task:
             status=data["status"],
             created_at=data["created_at"],
             updated_at=data["updated_at"],
+            worker_id=data["worker_id"],
+            lease_expires_at=data["lease_expires_at"],
+            attempts=data["attempts"],
         )
 
     @classmethod
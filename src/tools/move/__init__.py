@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 
-from tools.move.implementations import factory
+from tools.move.implementations import factory, mover_from_cfg
+
+__all__ = ["MOVE_FACTORY", "MoveFunctionNotFound", "mover_from_cfg"]
 
 MOVE_FACTORY = factory
 
@@ -0,0 +1,149 @@
+import re
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from re import Pattern
+
+from tools.move.rules import CompiledRule, fold
+
+"""
+给一个文件名，一次找出它属于哪些已注册的规则（tmdb-<id>-s<season>）。
+
+1. 所有规则的必现字面量合成一个正则，对文件名扫一遍就得到候选规则
+   （区分大小写 / 不区分大小写的规则各一个正则）
+2. 只对候选规则跑各自编译好的完整正则确认
+3. 同一个文件命中多条规则时按 priority 高 -> 约束多（季标记/排除）-> tmdb_id、season 小 排序
+
+注册到 MOVE_FACTORY 的 mover 用 ClassifiedRule 匹配：同一部剧的几季规则都命中一个文件时，
+更优先的那一季认领它（比如合集里的 S02 文件不会再被第一季的规则链接一遍）。
+不同剧之间以任务的 tmdb 标签为准，不在这里裁决。
+"""
+
+
+@dataclass(frozen=True)
+class _LiteralIndex:
+    pattern: Pattern[str] | None
+    # 命中的字面量 -> 所有以它为前缀的字面量对应的规则下标（见 build）
+    owners: dict[str, frozenset[int]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, literal_owners: dict[str, set[int]]) -> "_LiteralIndex":
+        if not literal_owners:
+            return cls(pattern=None)
+        # 长的在前：同一位置上正则总是取最长的那个字面量，
+        # 比它短、又是它前缀的字面量在这个位置也一定出现，合并进 owners
+        literals = sorted(literal_owners, key=lambda lit: (-len(lit), lit))
+        owners = {
+            lit: frozenset(
+                i
+                for other, indexes in literal_owners.items()
+                if lit.startswith(other)
+                for i in indexes
+            )
+            for lit in literals
+        }
+        alternation = "|".join(re.escape(lit) for lit in literals)
+        return cls(pattern=re.compile(f"(?=({alternation}))"), owners=owners)
+
+    def candidates(self, text: str) -> set[int]:
+        found: set[int] = set()
+        if self.pattern is None:
+            return found
+        for match in self.pattern.finditer(text):
+            found |= self.owners[match.group(1)]
+        return found
+
+
+def _rank(rule: CompiledRule) -> tuple[int, int, int, int]:
+    r = rule.rule
+    specificity = int(r.season_marker) + int(bool(r.exclude))
+    return (-r.priority, -specificity, r.tmdb_id, r.season)
+
+
+class Classifier:
+    def __init__(self, rules: Iterable[CompiledRule]) -> None:
+        self.rules = sorted(rules, key=_rank)
+        self._seasons = Counter(rule.rule.tmdb_id for rule in self.rules)
+
+        sensitive: dict[str, set[int]] = {}
+        insensitive: dict[str, set[int]] = {}
+        # 提不出字面量的规则每次都要跑完整正则
+        self._always: set[int] = set()
+        for i, rule in enumerate(self.rules):
+            if rule.literals is None:
+                self._always.add(i)
+                continue
+            target = insensitive if rule.rule.ignore_case else sensitive
+            for lit in rule.literals:
+                target.setdefault(lit, set()).add(i)
+
+        self._sensitive = _LiteralIndex.build(sensitive)
+        self._insensitive = _LiteralIndex.build(insensitive)
+
+    def candidates(self, name: str) -> list[CompiledRule]:
+        indexes = self._always | self._sensitive.candidates(name)
+        if self._insensitive.pattern is not None:
+            indexes |= self._insensitive.candidates(fold(name))
+        return [self.rules[i] for i in sorted(indexes)]
+
+    def classify(self, name: str) -> list[str]:
+        """命中的规则 key，最优先的在前。"""
+        return [rule.key for rule in self.candidates(name) if rule.pattern.search(name)]
+
+    def best(self, name: str) -> str | None:
+        for rule in self.candidates(name):
+            if rule.pattern.search(name):
+                return rule.key
+        return None
+
+    def owns(self, rule: CompiledRule, name: str) -> bool:
+        """
+        已知 name 命中 rule：同一部剧里没有更优先（priority 更高或约束更多）的规则也命中 name。
+        只是季号不同、写法一样的几条规则分不出来，以任务的季标签为准。
+        """
+        tmdb_id = rule.rule.tmdb_id
+        if self._seasons[tmdb_id] <= 1:
+            return True
+        rank = _rank(rule)[:2]
+        for other in self.candidates(name):
+            if _rank(other)[:2] >= rank:
+                return True
+            if other.rule.tmdb_id == tmdb_id and other.pattern.search(name):
+                return False
+        return True
+
+
+@dataclass(frozen=True)
+class ClassifiedRule:
+    """给 RuleMover 用的匹配器：rule 命中、并且同一部剧里没有排在它前面的规则也命中。"""
+
+    rule: CompiledRule
+    classifier: Classifier = field(repr=False)
+
+    @property
+    def key(self) -> str:
+        return self.rule.key
+
+    def search(self, name: str) -> re.Match[str] | None:
+        match = self.rule.search(name)
+        if match is None or not self.classifier.owns(self.rule, name):
+            return None
+        return match
+
+
+_classifier: Classifier | None = None
+
+
+def get_classifier() -> Classifier:
+    """注册到 MOVE_FACTORY 的 mover 共用的那一个（由 rules.toml 里的全部规则构建）。"""
+    global _classifier
+    if _classifier is None:
+        # implementations 导入时要用到本模块，这里用到时再导入
+        from tools.move.implementations import CLASSIFIER
+
+        _classifier = CLASSIFIER
+    return _classifier
+
+
+def classify(name: str) -> list[str]:
+    return get_classifier().classify(name)
@@ -1,4 +1,39 @@
+from collections.abc import Iterator
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable
+from typing import Literal, Protocol
 
-Mover = Callable[[Path, Path], None]
+# linked: 新建了链接；skipped: 目标已经是同一个文件（重跑时）；conflict: 目标已存在但是别的文件
+LinkStatus = Literal["linked", "skipped", "conflict"]
+
+
+@dataclass(frozen=True)
+class LinkOp:
+    """计划中的一次链接操作。strategy 是按设备对预估的方式，实际以执行结果为准。"""
+
+    source: Path
+    destination: Path
+    strategy: str | None = None
+
+
+@dataclass(frozen=True)
+class LinkResult:
+    source: Path
+    destination: Path
+    status: LinkStatus
+    # 实际使用的方式（hardlink/reflink/copy/symlink），skipped/conflict 时为 None
+    strategy: str | None = None
+
+
+class Mover(Protocol):
+    def iter_plan(self, where: Path, to: Path) -> Iterator[LinkOp]:
+        """边遍历边产出要做的链接，顺序为遍历顺序。"""
+        ...
+
+    def plan(self, where: Path, to: Path) -> list[LinkOp]:
+        """只计算要做哪些链接，不碰文件系统（除了列目录）。"""
+        ...
+
+    def __call__(self, where: Path, to: Path) -> list[LinkResult]:
+        """计划并立即执行。"""
+        ...
@@ -0,0 +1,176 @@
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from tools import dba
+from tools.move.interfaces import LinkOp, LinkResult, Mover
+from tools.move.linking import is_already_linked, link_many, log_link_results
+from tools.share import LOGGER
+
+"""
+链接计划日志（link_plan 表）：先把要做的链接写进表里，再逐条执行并记录结果。
+- 流水线：遍历目录时每攒够一批就写入并开始执行，内存占用与文件总数无关
+- 崩溃后重跑：沿用已有的计划，先执行没做完的，再补上计划里没有的文件
+- 预演：只计算计划并打印，不写表、不碰文件
+- 回滚：删掉这个任务新建的链接（已存在跳过的、冲突的不动）
+- fencing：传入 series 锁的 lease 时，每批写表（计划和结果）都在同一个事务里检查锁没被接管，否则抛 LeaseLostError
+"""
+
+PENDING = 0
+LINKED = 1
+SKIPPED = 2
+CONFLICT = 3
+ROLLED_BACK = 4
+
+STATUS_NAMES = {
+    PENDING: "待执行",
+    LINKED: "已链接",
+    SKIPPED: "已存在跳过",
+    CONFLICT: "冲突",
+    ROLLED_BACK: "已回滚",
+}
+RESULT_STATUS = {"linked": LINKED, "skipped": SKIPPED, "conflict": CONFLICT}
+
+# 每批写入的计划条数和执行结果条数，一批一个事务
+PLAN_BATCH = 256
+
+
+def plan_links(
+    task_id: int,
+    mover: Mover,
+    where: Path,
+    to: Path,
+    batch_size: int | None = None,  # 默认 PLAN_BATCH
+    lease: dba.Lease | None = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    边遍历边按批写入计划（seq 为遍历顺序），每写完一批就产出这一批待执行的操作，
+    交给 execute_plan 链接的同时遍历继续，不用等整个目录走完。
+    任务已有计划时（崩溃后续跑）先产出其中待执行的，再继续遍历补上计划里还没有的文件。
+    """
+    batch_size = batch_size or PLAN_BATCH
+    planned: set[str] = set()
+    existing = dba.get_link_plan(task_id).value
+    if existing:
+        done = sum(1 for op in existing if op["status"] != PENDING)
+        LOGGER.info(
+            f"任务 {task_id} 已有链接计划，共 {len(existing)} 条，已执行 {done} 条，继续执行"
+        )
+        planned = {op["source"] for op in existing}
+        yield from (op for op in existing if op["status"] == PENDING)
+        del existing
+
+    total = 0
+    batch: list[dict[str, Any]] = []
+    for op in mover.iter_plan(where, to):
+        if str(op.source) in planned:
+            continue
+        batch.append(
+            {
+                "source": str(op.source),
+                "destination": str(op.destination),
+                "strategy": op.strategy,
+            }
+        )
+        if len(batch) >= batch_size:
+            total += len(batch)
+            yield from _append(task_id, batch, lease)
+            batch = []
+    if batch:
+        total += len(batch)
+        yield from _append(task_id, batch, lease)
+    if total:
+        LOGGER.info(f"任务 {task_id} 的链接计划已写入，新增 {total} 条")
+
+
+def _append(
+    task_id: int, batch: list[dict[str, Any]], lease: dba.Lease | None
+) -> list[dict[str, Any]]:
+    seqs = dba.append_link_plan(task_id, batch, lease).value
+    return [{**op, "seq": seq, "status": PENDING} for op, seq in zip(batch, seqs)]
+
+
+def execute_plan(
+    task_id: int,
+    ops: Iterable[dict[str, Any]] | None = None,
+    lease: dba.Lease | None = None,
+) -> list[LinkResult]:
+    """
+    并发执行待执行的操作，结果按完成顺序攒够 PLAN_BATCH 条记一次（一个事务）。
+    ops 一般是 plan_links 的生成器（边计划边执行）；不传时执行表里已有的待执行操作。
+    崩溃时最后一批结果可能没记上，重跑时这些操作会因为目标已链接而跳过。
+    lease 被接管后不再开始新的链接，已提交的链接做完后抛 LeaseLostError（结果不再记录，新持有者重跑时会跳过）。
+    """
+    if ops is None:
+        ops = (op for op in dba.get_link_plan(task_id).value if op["status"] == PENDING)
+    seqs: dict[LinkOp, int] = {}
+    done: list[tuple[int, int, str | None]] = []
+
+    def link_ops() -> Iterator[LinkOp]:
+        for op in ops:
+            # 只看内存里的标记（续期失败时置位），数据库里的检查每批写结果时做一次
+            if lease is not None and lease.lost.is_set():
+                raise dba.LeaseLostError(lease.name, lease.fence)
+            link_op = LinkOp(Path(op["source"]), Path(op["destination"]))
+            seqs[link_op] = op["seq"]
+            yield link_op
+
+    def flush() -> None:
+        dba.update_link_ops(task_id, done, lease)
+        done.clear()
+
+    results: list[LinkResult] = []
+    # link_many 在当前线程取 ops，写库（含 plan_links 写计划）都在当前线程做，链接在线程池里做
+    try:
+        for op, result in link_many(link_ops()):
+            done.append((seqs.pop(op), RESULT_STATUS[result.status], result.strategy))
+            results.append(result)
+            if len(done) >= PLAN_BATCH:
+                flush()
+    finally:
+        # 出错时也把已完成的记上，锁已被接管时不记
+        if lease is None or not lease.lost.is_set():
+            flush()
+    log_link_results(results)
+    return results
+
+
+def rollback(task_id: int) -> int:
+    """删除任务新建的链接，返回删除的数量。目标已经被换成别的文件时不删。"""
+    removed = 0
+    rolled_back: list[tuple[int, int, str | None]] = []
+    for op in dba.get_link_plan(task_id).value:
+        if op["status"] != LINKED:
+            continue
+        source, destination = Path(op["source"]), Path(op["destination"])
+        if is_already_linked(source, destination):
+            destination.unlink()
+            removed += 1
+        elif destination.exists() or destination.is_symlink():
+            LOGGER.warning(f"目标已不是当初创建的链接，不删除: {destination}")
+            continue
+        rolled_back.append((op["seq"], ROLLED_BACK, None))
+    dba.update_link_ops(task_id, rolled_back)
+    LOGGER.info(f"任务 {task_id} 已回滚，删除 {removed} 个链接")
+    return removed
+
+
+def format_plan(ops: list[LinkOp] | list[dict[str, Any]]) -> str:
+    lines = []
+    for op in ops:
+        if isinstance(op, LinkOp):
+            status, source, destination, strategy = (
+                "预演",
+                op.source,
+                op.destination,
+                op.strategy,
+            )
+        else:
+            status = STATUS_NAMES.get(op["status"], str(op["status"]))
+            source, destination, strategy = (
+                op["source"],
+                op["destination"],
+                op["strategy"],
+            )
+        lines.append(f"[{status}] ({strategy or '-'}) {source} -> {destination}")
+    return "\n".join(lines)
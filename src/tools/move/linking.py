@@ -0,0 +1,372 @@
+import errno
+import os
+import shutil
+import threading
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Literal, get_args
+
+from dotenv import load_dotenv
+
+from tools.move.interfaces import LinkOp, LinkResult
+from tools.share import LOGGER
+
+load_dotenv()
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+"""
+把一个文件“放”到媒体库里的几种方式，按顺序尝试：
+    hardlink -> reflink(FICLONE) -> copy(copy_file_range/sendfile 零拷贝) -> symlink
+源文件和目标目录分属不同设备时硬链接必然失败，所以按 (源设备, 目标设备) 缓存第一个成功的方式，
+同一对设备只探测一次，之后的文件直接用。
+
+用哪些方式、顺序如何由 MY_QB_TOOLS_LINK_STRATEGIES 配置（逗号分隔），默认不包含 symlink。
+"""
+
+Strategy = Literal["hardlink", "reflink", "copy", "symlink"]
+
+STRATEGIES: tuple[Strategy, ...] = get_args(Strategy)
+DEFAULT_STRATEGIES: tuple[Strategy, ...] = ("hardlink", "reflink", "copy")
+
+
+def parse_strategies(value: str) -> tuple[Strategy, ...]:
+    """解析逗号分隔的方式列表；写错了在导入时就报错，而不是链接到一半才发现。"""
+    known: dict[str, Strategy] = {strategy: strategy for strategy in STRATEGIES}
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(
+            f"MY_QB_TOOLS_LINK_STRATEGIES 包含未知的方式 {unknown}，可选: {', '.join(STRATEGIES)}"
+        )
+    if not names:
+        raise ValueError("MY_QB_TOOLS_LINK_STRATEGIES 至少要有一种方式")
+    return tuple(known[name] for name in dict.fromkeys(names))
+
+
+LINK_STRATEGIES = parse_strategies(
+    os.getenv("MY_QB_TOOLS_LINK_STRATEGIES", ",".join(DEFAULT_STRATEGIES))
+)
+
+# 同时进行的链接数；遍历目录和链接是重叠进行的，最多预取 2 倍于此的待链接文件
+LINK_WORKERS = int(os.getenv("MY_QB_TOOLS_LINK_WORKERS", "4"))
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# 这些错误说明“这对设备不支持这种方式”，换下一种，并记住这对设备以后直接用能成功的方式
+CAPABILITY_ERRNOS = frozenset(
+    {
+        errno.EXDEV,
+        errno.EOPNOTSUPP,
+        errno.ENOTSUP,
+        errno.ENOTTY,
+        errno.EINVAL,
+        errno.ENOSYS,
+        errno.EBADF,
+    }
+)
+# 只是这个文件不行（比如文件不属于当前用户，硬链接被 fs.protected_hardlinks 拒绝），
+# 这个文件换下一种，不影响同一对设备上的其它文件
+PER_FILE_ERRNOS = frozenset({errno.EPERM})
+# 以外的错误原样抛出
+UNSUPPORTED_ERRNOS = CAPABILITY_ERRNOS | PER_FILE_ERRNOS
+
+# reflink / copy 保留了 mtime，但 FAT、SMB 之类的文件系统只精确到 2 秒
+MTIME_TOLERANCE_NS = 2_000_000_000
+
+
+def _hardlink(source: Path, destination: Path) -> None:
+    os.link(source, destination)
+
+
+def _part_path(destination: Path) -> Path:
+    return destination.with_name(f".{destination.name}.{os.getpid()}.part")
+
+
+def _publish(part: Path, source: Path, destination: Path) -> None:
+    """先写临时文件，完成后再改名，中途崩溃不会留下半个文件。"""
+    try:
+        shutil.copystat(source, part)  # 保留 mtime，重跑时据此判断是否已经复制过
+        if destination.exists():
+            raise FileExistsError(errno.EEXIST, "目标已存在", str(destination))
+        os.replace(part, destination)
+    finally:
+        part.unlink(missing_ok=True)
+
+
+def _reflink(source: Path, destination: Path) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "当前平台不支持 FICLONE")
+    part = _part_path(destination)
+    try:
+        with open(source, "rb") as src, open(part, "xb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        part.unlink(missing_ok=True)
+        raise
+    _publish(part, source, destination)
+
+
+def _zero_copy(src: int, dst: int, size: int) -> None:
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src, dst, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return
+        except OSError as e:
+            if copied or e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            while copied < size:
+                n = os.sendfile(dst, src, copied, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return
+        except OSError as e:
+            if copied or e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+    with open(src, "rb", closefd=False) as fsrc, open(dst, "wb", closefd=False) as fdst:
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+
+def _copy(source: Path, destination: Path) -> None:
+    part = _part_path(destination)
+    try:
+        with open(source, "rb") as src, open(part, "xb") as dst:
+            _zero_copy(src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size)
+    except OSError:
+        part.unlink(missing_ok=True)
+        raise
+    _publish(part, source, destination)
+
+
+def _symlink(source: Path, destination: Path) -> None:
+    os.symlink(source.resolve(), destination)
+
+
+STRATEGY_FUNCS: dict[str, Callable[[Path, Path], None]] = {
+    "hardlink": _hardlink,
+    "reflink": _reflink,
+    "copy": _copy,
+    "symlink": _symlink,
+}
+
+
+_pair_strategy: dict[tuple[int, int, tuple[str, ...]], str] = {}
+_pair_lock = threading.Lock()
+
+
+def clear_strategy_cache() -> None:
+    with _pair_lock:
+        _pair_strategy.clear()
+
+
+def _device(path: Path) -> int:
+    """预演时目标目录可能还没创建，用最近一个已存在的上级目录所在的设备。"""
+    for candidate in (path, *path.parents):
+        try:
+            return candidate.stat().st_dev
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(path)
+
+
+def predict_strategy(
+    source: Path, to: Path, strategies: Sequence[str] | None = None
+) -> str | None:
+    """不实际操作，预估 source -> to 会用哪种方式（用于计划/预演）。"""
+    strategies = tuple(strategies or LINK_STRATEGIES)
+    try:
+        pair = (source.stat().st_dev, _device(to), strategies)
+    except FileNotFoundError:
+        return strategies[0] if strategies else None
+    with _pair_lock:
+        cached = _pair_strategy.get(pair)
+    if cached is not None:
+        return cached
+    for name in strategies:
+        if name == "hardlink" and pair[0] != pair[1]:
+            continue
+        return name
+    return None
+
+
+def is_already_linked(source: Path, destination: Path) -> bool:
+    """目标已经是 source 的链接/副本（上次跑过）。"""
+    try:
+        dst = destination.lstat()
+        src = source.stat()
+    except FileNotFoundError:
+        return False
+    if destination.is_symlink():
+        return destination.resolve() == source.resolve()
+    if (dst.st_dev, dst.st_ino) == (src.st_dev, src.st_ino):
+        return True
+    # reflink / copy 会保留 mtime；mtime 被目标文件系统截断过（差在精度以内）时再比较内容
+    if dst.st_size != src.st_size:
+        return False
+    if dst.st_mtime_ns == src.st_mtime_ns:
+        return True
+    if abs(dst.st_mtime_ns - src.st_mtime_ns) > MTIME_TOLERANCE_NS:
+        return False
+    return _same_content(source, destination)
+
+
+def _same_content(a: Path, b: Path, chunk: int = 1024 * 1024) -> bool:
+    # 不用 filecmp.cmp：它按 (大小, mtime) 缓存结果，正好是这里分辨不了的情况
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            block = fa.read(chunk)
+            if block != fb.read(chunk):
+                return False
+            if not block:
+                return True
+
+
+def link_file(
+    source: Path, to: Path, strategies: Sequence[str] | None = None
+) -> LinkResult:
+    """
+    把 source 放到 to 目录下（同名）。目标已存在时：是同一个文件就跳过，否则记为冲突，不覆盖。
+    """
+    strategies = tuple(strategies or LINK_STRATEGIES)
+    destination = to.joinpath(source.name)
+    if destination.exists() or destination.is_symlink():
+        return _existing(source, destination)
+
+    pair = (source.stat().st_dev, to.stat().st_dev, strategies)
+    with _pair_lock:
+        cached = _pair_strategy.get(pair)
+    if cached is None:
+        return _probe(source, destination, pair, strategies, cache=True)
+
+    try:
+        STRATEGY_FUNCS[cached](source, destination)
+    except FileExistsError:
+        return _existing(source, destination)
+    except OSError as e:
+        if e.errno not in UNSUPPORTED_ERRNOS:
+            raise
+        capability = e.errno in CAPABILITY_ERRNOS
+        if capability:
+            # 缓存的方式失效了（比如挂载点变了），重新探测
+            with _pair_lock:
+                _pair_strategy.pop(pair, None)
+        others = tuple(name for name in strategies if name != cached)
+        return _probe(source, destination, pair, others, cache=capability)
+    return LinkResult(source, destination, "linked", cached)
+
+
+def _probe(
+    source: Path,
+    destination: Path,
+    pair: tuple[int, int, tuple[str, ...]],
+    candidates: Sequence[str],
+    *,
+    cache: bool,
+) -> LinkResult:
+    """
+    按顺序尝试，用第一个成功的方式。
+    前面的方式都是因为设备不支持而失败时才记到这对设备上；有 EPERM 之类只针对这个文件的失败就不记。
+    """
+    errors: list[str] = []
+    for name in candidates:
+        try:
+            STRATEGY_FUNCS[name](source, destination)
+        except FileExistsError:
+            return _existing(source, destination)
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+            errors.append(f"{name}: {e}")
+            cache = cache and e.errno in CAPABILITY_ERRNOS
+            continue
+
+        if cache:
+            with _pair_lock:
+                _pair_strategy[pair] = name
+            LOGGER.info(f"设备 {pair[0]} -> {pair[1]} 使用 {name}")
+        elif errors:
+            LOGGER.info(f"{source.name} 改用 {name} ({', '.join(errors)})")
+        return LinkResult(source, destination, "linked", name)
+
+    raise OSError(
+        errno.EOPNOTSUPP,
+        f"没有可用的链接方式 ({', '.join(errors)})",
+        str(destination),
+    )
+
+
+def link_many(
+    ops: Iterable[LinkOp], workers: int | None = None
+) -> Iterator[tuple[LinkOp, LinkResult]]:
+    """
+    边从 ops 里取边链接，按完成顺序产出 (op, result)。
+    ops 可以是边遍历目录边产出的生成器：同一时间最多只有 2 * workers 个操作在排队，内存占用与文件总数无关。
+    某个操作出错时不再取新的，等已提交的做完（结果照常产出）后再把第一个错误抛出。
+    """
+    workers = LINK_WORKERS if workers is None else workers
+    if workers <= 1:
+        for op in ops:
+            yield op, link_file(op.source, op.destination.parent)
+        return
+
+    window = workers * 2
+    it = iter(ops)
+    exhausted = False
+    error: BaseException | None = None
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="link") as pool:
+        pending: dict[Future[LinkResult], LinkOp] = {}
+        while True:
+            while not exhausted and len(pending) < window:
+                item = next(it, None)
+                if item is None:
+                    exhausted = True
+                    break
+                pending[
+                    pool.submit(link_file, item.source, item.destination.parent)
+                ] = item
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                op = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:  # noqa: BLE001 - 先记下，等已提交的做完再抛出
+                    if error is None:
+                        error = e
+                    exhausted = True
+                    continue
+                yield op, result
+    if error is not None:
+        raise error
+
+
+def _existing(source: Path, destination: Path) -> LinkResult:
+    if is_already_linked(source, destination):
+        return LinkResult(source, destination, "skipped")
+    LOGGER.warning(f"目标已存在且不是同一个文件，跳过: {destination}")
+    return LinkResult(source, destination, "conflict")
+
+
+def log_link_results(results: list[LinkResult]) -> None:
+    counts = Counter(result.status for result in results)
+    strategies = Counter(r.strategy for r in results if r.strategy is not None)
+    LOGGER.info(
+        f"链接完成: 新建 {counts['linked']} {dict(strategies)}，"
+        f"已存在跳过 {counts['skipped']}，冲突 {counts['conflict']}"
+    )
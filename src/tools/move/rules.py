@@ -0,0 +1,318 @@
+import re
+import threading
+import tomllib
+from dataclasses import dataclass, field
+from pathlib import Path
+from re import Pattern
+from typing import Any
+
+from tools.share import LOGGER
+
+try:
+    # 私有模块，只用来给预筛提取字面量；以后的 Python 改了它也只是不做预筛
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:
+    sre_parse = None
+
+"""
+声明式的 mover 规则：规则是数据（rules.toml 或 cfg 表里的 "mover" 字段），
+加载时一次性编译成正则，匹配时不再重复拼接/编译。
+"""
+
+RULES_FILE = Path(__file__).with_name("rules.toml")
+DEFAULT_SEP = r"[\s._-]*"
+
+# 季号 -> (序数词, 英文, 罗马数字, 中文/日文数字字符类)
+SEASON_WORDS: dict[int, tuple[str, str, str, str]] = {
+    1: ("1st", "First", "I", "[一壹]"),
+    2: ("2nd", "Second", "II", "[贰貳弐二ニ]"),
+    3: ("3rd", "Third", "III", "[叁參叄三]"),
+    4: ("4th", "Fourth", "IV", "[肆四]"),
+    5: ("5th", "Fifth", "V", "[伍五]"),
+    6: ("6th", "Sixth", "VI", "[陆陸六]"),
+    7: ("7th", "Seventh", "VII", "[柒七]"),
+    8: ("8th", "Eighth", "VIII", "[捌八]"),
+    9: ("9th", "Ninth", "IX", "[玖九]"),
+    10: ("10th", "Tenth", "X", "[十拾]"),
+}
+
+
+def season_tokens(season: int, sep: str = DEFAULT_SEP) -> list[str]:
+    """某一季在文件名里的常见写法：S02 / Season 2 / 2nd Season / 第二季 / 第2期 / 2期 / ２季 ..."""
+    full_width = "".join(chr(0xFF10 + int(d)) for d in str(season))
+    tokens = [
+        rf"(?<!\d)S0?{season}(?!\d)",
+        rf"Season{sep}0?{season}(?!\d)",
+        rf"第{sep}?0?{season}{sep}?[季期]",
+    ]
+    if season in SEASON_WORDS:
+        ordinal, word, roman, cjk = SEASON_WORDS[season]
+        tokens += [
+            rf"Season{sep}{roman}\b",
+            rf"{ordinal}{sep}Season",
+            rf"{word}{sep}Season",
+            rf"第{sep}?{cjk}{sep}?[季期]",
+            rf"{cjk}{sep}?期",
+            rf"{cjk}{sep}?季",
+        ]
+    tokens += [
+        rf"{season}{sep}?期",
+        rf"{season}{sep}?季",
+        rf"{full_width}{sep}?期",
+        rf"{full_width}{sep}?季",
+    ]
+    return tokens
+
+
+@dataclass(frozen=True)
+class Rule:
+    tmdb_id: int
+    season: int
+    aliases: tuple[str, ...]
+    title: str = ""
+    season_marker: bool = False
+    exclude: tuple[str, ...] = ()
+    ignore_case: bool = True
+    sep: str = DEFAULT_SEP
+    priority: int = 0
+
+    @property
+    def key(self) -> str:
+        return f"tmdb-{self.tmdb_id}-s{self.season}"
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, Any], alias_groups: dict[str, list[str]] | None = None
+    ) -> "Rule":
+        data = dict(data)
+        aliases = list(data.pop("aliases", []))
+        group = data.pop("alias_group", None)
+        if group is not None:
+            if alias_groups is None or group not in alias_groups:
+                raise ValueError(f"规则引用了不存在的 alias_group: {group!r}")
+            aliases = [*alias_groups[group], *aliases]
+        if not aliases:
+            raise ValueError(f"规则至少需要一个别名: {data}")
+
+        known = {f for f in cls.__dataclass_fields__ if f != "aliases"}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"规则里有未知字段: {sorted(unknown)}")
+
+        exclude = tuple(data.pop("exclude", ()))
+        return cls(aliases=tuple(aliases), exclude=exclude, **data)
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    rule: Rule
+    pattern: Pattern[str] = field(repr=False)
+    # 文件名里至少要出现其中一个（ignore_case 时已转小写，见 fold）；None 表示提不出来
+    literals: tuple[str, ...] | None = None
+    # checked: 调用 search 的次数；skipped: 被字面量预筛直接排除、没有跑正则的次数
+    # 多个线程会同时用同一条规则（并行遍历目录），改和读都要拿 _stats_lock
+    stats: dict[str, int] = field(
+        default_factory=lambda: {"checked": 0, "skipped": 0, "matched": 0},
+        compare=False,
+        repr=False,
+    )
+    _stats_lock: threading.Lock = field(
+        default_factory=threading.Lock, compare=False, repr=False
+    )
+
+    @property
+    def key(self) -> str:
+        return self.rule.key
+
+    def fold(self, name: str) -> str:
+        """把文件名转成和 literals 同一种大小写形式。"""
+        return fold(name) if self.rule.ignore_case else name
+
+    def search(self, name: str) -> re.Match[str] | None:
+        """
+        和 pattern.search 一样，但先做子串预筛：
+        季规则是好几个 .* 前瞻，每个前瞻都要把整个文件名扫一遍，预筛能挡掉绝大部分无关文件。
+        """
+        if self.literals is not None:
+            folded = self.fold(name)
+            if not any(lit in folded for lit in self.literals):
+                self._count(skipped=1)
+                return None
+        match = self.pattern.search(name)
+        self._count(matched=int(match is not None))
+        return match
+
+    def _count(self, skipped: int = 0, matched: int = 0) -> None:
+        with self._stats_lock:
+            self.stats["checked"] += 1
+            self.stats["skipped"] += skipped
+            self.stats["matched"] += matched
+
+    def snapshot(self) -> dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+
+# re.IGNORECASE 下 ſ 和 s、ı 和 i 互相匹配，但 str.lower() 不会把它们转成 ASCII
+_FOLD_TABLE = str.maketrans({"ſ": "s", "ı": "i"})
+
+
+def fold(text: str) -> str:
+    return text.lower().translate(_FOLD_TABLE)
+
+
+def _is_foldable(char: str) -> bool:
+    # 只有 ASCII 和不分大小写的字符（中日文等）做子串比较时才和 IGNORECASE 等价
+    return char.isascii() or char.lower() == char.upper()
+
+
+# 字符类展开的上限：[学學] 这种小字符类展开成多个字面量，太大的就当作断开
+MAX_CLASS_SIZE = 4
+MAX_LITERAL_ALTERNATIVES = 16
+
+
+def _class_chars(av: Any, ignore_case: bool) -> list[str] | None:
+    chars: list[str] = []
+    for op, value in av:
+        if op is not sre_parse.LITERAL:
+            return None  # 取反、范围、\s 之类
+        chars.append(chr(value))
+    if len(chars) > MAX_CLASS_SIZE:
+        return None
+    if ignore_case and not all(_is_foldable(c) for c in chars):
+        return None
+    return chars
+
+
+def _best_run(items: Any, ignore_case: bool) -> tuple[str, ...] | None:
+    """
+    一个正则序列里一定会出现的一段连续字面量，小字符类会展开成多个候选（出现任意一个即可）。
+    零宽断言不打断连续性；其它节点（可选、重复、大字符类...）都当作断开。
+    取最短候选最长的一段。
+    """
+    runs: list[tuple[str, ...]] = []
+    current: list[str] = [""]
+
+    def flush() -> None:
+        nonlocal current
+        if current[0]:
+            runs.append(tuple(current))
+        current = [""]
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            char = chr(av)
+            if ignore_case and not _is_foldable(char):
+                flush()
+                continue
+            current = [prefix + char for prefix in current]
+        elif op is sre_parse.IN:
+            chars = _class_chars(av, ignore_case)
+            if chars is None or len(current) * len(chars) > MAX_LITERAL_ALTERNATIVES:
+                flush()
+                continue
+            current = [prefix + char for prefix in current for char in chars]
+        elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            continue
+        elif op is sre_parse.SUBPATTERN and av[-1] is not None:
+            flush()
+            inner = _literal_alternatives(av[-1], ignore_case)
+            if inner is not None:
+                runs.append(inner)
+        else:
+            flush()
+    flush()
+    if not runs:
+        return None
+    return max(runs, key=lambda run: (min(map(len, run)), -len(run)))
+
+
+def _literal_alternatives(items: Any, ignore_case: bool) -> tuple[str, ...] | None:
+    if len(items) == 1 and items[0][0] is sre_parse.BRANCH:
+        result: list[str] = []
+        for branch in items[0][1][1]:
+            inner = _literal_alternatives(branch, ignore_case)
+            if inner is None:
+                return None
+            result.extend(inner)
+        return tuple(result)
+    return _best_run(items, ignore_case)
+
+
+def required_literals(rule: Rule) -> tuple[str, ...] | None:
+    """
+    规则命中时文件名里必然出现的字面量（出现任意一个即可）。
+    每个别名取一段必现字面量；有任何一个别名提不出来就返回 None（不做预筛）。
+    """
+    if sre_parse is None:
+        return None
+    flags = re.IGNORECASE if rule.ignore_case else 0
+    literals: list[str] = []
+    for alias in rule.aliases:
+        try:
+            parsed = sre_parse.parse(alias.replace("{sep}", rule.sep), flags)
+            found = _literal_alternatives(parsed.data, rule.ignore_case)
+        except (re.error, AttributeError, TypeError, ValueError, IndexError) as e:
+            # 解析树的结构随 Python 版本变化，提取失败就不做预筛，规则照常可用
+            LOGGER.warning(f"规则 {rule.key} 提取预筛字面量失败，不做预筛: {e!r}")
+            return None
+        if found is None:
+            return None
+        literals.extend(fold(lit) if rule.ignore_case else lit for lit in found)
+    # 包含了另一个字面量的可以去掉：它出现时短的那个也一定出现
+    unique = list(dict.fromkeys(literals))
+    return tuple(
+        lit for lit in unique if not any(o != lit and o in lit for o in unique)
+    )
+
+
+def compile_rule(rule: Rule) -> CompiledRule:
+    sep = rule.sep
+
+    def alternation(parts: list[str] | tuple[str, ...]) -> str:
+        return "|".join(p.replace("{sep}", sep) for p in parts)
+
+    base = alternation(rule.aliases)
+    if not rule.season_marker and not rule.exclude:
+        source = f"(?:{base})"
+    else:
+        source = f"^(?=.*(?:{base}))"
+        if rule.season_marker:
+            source += f"(?=.*(?:{alternation(season_tokens(rule.season, sep))}))"
+        if rule.exclude:
+            source += f"(?!.*(?:{alternation(rule.exclude)}))"
+        source += ".*"
+
+    flags = re.IGNORECASE if rule.ignore_case else 0
+    return CompiledRule(
+        rule=rule, pattern=re.compile(source, flags), literals=required_literals(rule)
+    )
+
+
+def parse_rules(data: dict[str, Any]) -> list[Rule]:
+    alias_groups: dict[str, list[str]] = data.get("alias_groups", {})
+    rules = [Rule.from_dict(item, alias_groups) for item in data.get("rule", [])]
+
+    seen: set[str] = set()
+    for rule in rules:
+        if rule.key in seen:
+            raise ValueError(f"规则重复: {rule.key}")
+        seen.add(rule.key)
+    return rules
+
+
+def prefilter_stats(rules: list[CompiledRule]) -> dict[str, int]:
+    total = {"checked": 0, "skipped": 0, "matched": 0}
+    for rule in rules:
+        for name, value in rule.snapshot().items():
+            total[name] += value
+    return total
+
+
+def format_prefilter_stats(stats: dict[str, int]) -> str:
+    return f"检查 {stats['checked']} 个文件，预筛跳过 {stats['skipped']} 个，命中 {stats['matched']} 个"
+
+
+def load_rules(path: Path | str = RULES_FILE) -> list[Rule]:
+    with open(path, "rb") as file:
+        return parse_rules(tomllib.load(file))
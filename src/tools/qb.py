@@ -1,5 +1,6 @@
 import os
-from typing import Any, Mapping
+from collections.abc import Mapping
+from typing import Any
 
 from dotenv import load_dotenv
 from qbittorrent import Client  # type: ignore[import]
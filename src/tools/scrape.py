@@ -0,0 +1,134 @@
+import re
+import xml.etree.ElementTree as ET
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from tools.share import LOGGER
+
+"""
+进程内刮削：只给本次任务链接进库的视频写 NFO（Kodi/Jellyfin/Emby 通用格式）。
+- <视频文件名>.nfo：单集信息（episodedetails）
+- Season N/season.nfo：季信息
+季和集的数据来自 TMDB 的 tv/{id}/season/{n}，每季请求一次（有缓存）。已存在的 NFO 不覆盖。
+"""
+
+VIDEO_SUFFIXES = frozenset(
+    {".mkv", ".mp4", ".avi", ".ts", ".m2ts", ".mov", ".wmv", ".flv", ".webm", ".rmvb"}
+)
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# 按顺序尝试，先命中的为准
+EPISODE_PATTERNS = [
+    re.compile(r"S\d{1,2}\s*E(\d{1,4})", re.IGNORECASE),
+    re.compile(r"第\s*(\d{1,4})\s*[话話集回]"),
+    re.compile(r"(?<![A-Za-z])EP?\s*(\d{1,4})(?![\dA-Za-z])", re.IGNORECASE),
+    re.compile(r"\[(\d{1,4})(?:v\d)?(?:\s*END)?\]", re.IGNORECASE),
+    re.compile(r"\s-\s(\d{1,4})(?:v\d)?(?![\dA-Za-z])"),
+    # 兜底：独立的 2~3 位数字，排除 1080p、x264、10bit 之类
+    re.compile(r"(?<![\dA-Za-z])(\d{2,3})(?:v\d)?(?![\dA-Za-z])"),
+]
+NOT_EPISODES = frozenset({264, 265})
+
+
+def is_video(path: Path) -> bool:
+    return path.suffix.lower() in VIDEO_SUFFIXES
+
+
+def parse_episode(filename: str) -> int | None:
+    stem = Path(filename).stem
+    for pattern in EPISODE_PATTERNS:
+        for match in pattern.finditer(stem):
+            episode = int(match.group(1))
+            if episode not in NOT_EPISODES:
+                return episode
+    return None
+
+
+def _to_xml(tag: str, fields: dict[str, Any], uniqueid: Any) -> str:
+    root = ET.Element(tag)
+    for name, value in fields.items():
+        if value not in (None, ""):
+            ET.SubElement(root, name).text = str(value)
+    if uniqueid is not None:
+        ET.SubElement(root, "uniqueid", type="tmdb", default="true").text = str(
+            uniqueid
+        )
+    ET.indent(root)
+    return XML_HEADER + ET.tostring(root, encoding="unicode") + "\n"
+
+
+def _write(path: Path, content: str) -> bool:
+    if path.exists():
+        return False
+    path.write_text(content, encoding="utf-8", newline="\n")
+    return True
+
+
+def season_nfo(season: int, data: dict[str, Any]) -> str:
+    return _to_xml(
+        "season",
+        {
+            "title": data.get("name"),
+            "plot": data.get("overview"),
+            "premiered": data.get("air_date"),
+            "seasonnumber": season,
+        },
+        data.get("id"),
+    )
+
+
+def episode_nfo(season: int, episode: dict[str, Any]) -> str:
+    return _to_xml(
+        "episodedetails",
+        {
+            "title": episode.get("name"),
+            "season": season,
+            "episode": episode.get("episode_number"),
+            "plot": episode.get("overview"),
+            "aired": episode.get("air_date"),
+            "runtime": episode.get("runtime"),
+            "rating": episode.get("vote_average"),
+        },
+        episode.get("id"),
+    )
+
+
+def write_nfos(
+    files: Iterable[Path], season: int, data: dict[str, Any]
+) -> dict[str, int]:
+    """
+    给 files 里的视频写 NFO。data 是 TMDB tv/{id}/season/{n} 的响应。
+    返回各类计数：written / exists / unmatched（识别不出集数或 TMDB 上没有这一集）。
+    """
+    episodes = {ep.get("episode_number"): ep for ep in data.get("episodes", [])}
+    counts = {"written": 0, "exists": 0, "unmatched": 0}
+    season_dirs: set[Path] = set()
+
+    for path in files:
+        if not is_video(path):
+            continue
+        season_dirs.add(path.parent)
+
+        number = parse_episode(path.name)
+        episode = episodes.get(number)
+        if episode is None:
+            LOGGER.warning(
+                f"无法确定集数或 TMDB 上没有这一集({number})，跳过: {path.name}"
+            )
+            counts["unmatched"] += 1
+            continue
+
+        if _write(path.with_suffix(".nfo"), episode_nfo(season, episode)):
+            counts["written"] += 1
+        else:
+            counts["exists"] += 1
+
+    for directory in season_dirs:
+        _write(directory / "season.nfo", season_nfo(season, data))
+
+    LOGGER.info(
+        f"刮削完成: 写入 {counts['written']}，已存在 {counts['exists']}，未识别 {counts['unmatched']}"
+    )
+    return counts
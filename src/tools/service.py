@@ -1,104 +1,153 @@
 import json
 import os
-from dataclasses import dataclass
+import socket
+import time
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 import requests
 from dotenv import load_dotenv
 
-from tools import dba
+from tools import dba, scrape
 from tools.meta import Cfg, Task
-from tools.move import MOVE_FACTORY, MoveFunctionNotFound
+from tools.move import MOVE_FACTORY, MoveFunctionNotFound, journal, mover_from_cfg
+from tools.move.interfaces import LinkOp, Mover
 from tools.share import LOGGER, UnknownKeyError
 from tools.share.result import Err, Ok, Result
+from tools.tmdb import TMDB_CACHE, CacheKey, get_client
 
-BASE = "https://api.themoviedb.org/3"
+TASK_LEASE_SEC = 1800
+MAX_TASK_ATTEMPTS = 5  # 失败这么多次后不再重试，任务改为已失败
+TASK_RETRY_BASE_SEC = (
+    60  # 第 n 次失败后等 TASK_RETRY_BASE_SEC * 2^(n-1) 秒再重试，最多 TASK_LEASE_SEC
+)
+# series 锁由 dba.hold_lock 在后台续期，ttl 只决定持有者崩溃后多久能被接管
+SERIES_LOCK_TTL = 120
 
 
 load_dotenv()
 
 
 def fetch_tmdb():
-    session = requests.Session()
-    session.headers.update({"Accept": "application/json"})
+    client = get_client()
 
     def _(kind: str, tmdb_id: int, **kwargs) -> dict[str, Any]:
-        token = os.getenv("TMDB_API_TOKEN", None)
-        response = session.get(
-            f"{BASE}/{kind}/{tmdb_id}",
-            params={
-                "language": "zh-CN",
-                **kwargs,
-            },
-            headers={"Authorization": f"Bearer {token}"},
-        )
-        response.raise_for_status()
-        return response.json()
+        params = {"language": "zh-CN", **kwargs}
+
+        def send(headers: dict[str, str]) -> requests.Response:
+            return client.get(f"{kind}/{tmdb_id}", params=params, headers=headers)
+
+        return TMDB_CACHE.fetch(CacheKey.build(kind, tmdb_id, params), send)
 
     return _
 
 
+# append_to_response 的档位：热路径只取基础字段，响应体小、解析快
+FetchProfile = Literal["minimal", "naming", "full"]
+
+TV_FETCH_PROFILES: dict[str, tuple[str, ...]] = {
+    "minimal": (),
+    "naming": ("alternative_titles", "translations", "external_ids"),
+    "full": (
+        "alternative_titles",
+        "credits",
+        "images",
+        "keywords",
+        "content_ratings",
+        "recommendations",
+        "similar",
+        "videos",
+        "external_ids",
+        "watch/providers",
+        "translations",
+    ),
+}
+
+MOVIE_FETCH_PROFILES: dict[str, tuple[str, ...]] = {
+    "minimal": (),
+    "naming": ("alternative_titles", "translations", "external_ids"),
+    "full": (
+        "alternative_titles",
+        "credits",
+        "images",
+        "keywords",
+        "release_dates",
+        "recommendations",
+        "similar",
+        "videos",
+        "external_ids",
+        "watch/providers",
+        "translations",
+    ),
+}
+
+
+def profile_params(
+    profiles: dict[str, tuple[str, ...]], profile: str, watch_region: str
+) -> dict[str, str]:
+    if profile not in profiles:
+        raise ValueError(f"未知的 fetch profile: {profile!r}. 可选: {sorted(profiles)}")
+
+    appends = profiles[profile]
+    params: dict[str, str] = {}
+    if appends:
+        params["append_to_response"] = ",".join(appends)
+    if "watch/providers" in appends:
+        # watch_region 只影响 watch/providers，其他档位不带，缓存 key 也更稳定
+        params["watch_region"] = watch_region
+    return params
+
+
 def fetch_tvshows(
-    tmdb_id: int, language: str = "zh-CN", watch_region: str = "CN", **kwargs
+    tmdb_id: int,
+    language: str = "zh-CN",
+    watch_region: str = "CN",
+    profile: FetchProfile = "full",
+    **kwargs,
 ) -> dict[str, Any]:
-    TV_APPENDS = ",".join(
-        [
-            "alternative_titles",
-            "credits",
-            "images",
-            "keywords",
-            "content_ratings",
-            "recommendations",
-            "similar",
-            "videos",
-            "external_ids",
-            "watch/providers",
-            "translations",
-        ]
-    )
-
     fetcher = fetch_tmdb()
     return fetcher(
         "tv",
         tmdb_id,
         language=language,
-        watch_region=watch_region,
-        append_to_response=TV_APPENDS,
+        **profile_params(TV_FETCH_PROFILES, profile, watch_region),
         **kwargs,
     )
 
 
 def fetch_movie(
-    tmdb_id: int, language: str = "zh-CN", watch_region: str = "CN", **kwargs
+    tmdb_id: int,
+    language: str = "zh-CN",
+    watch_region: str = "CN",
+    profile: FetchProfile = "full",
+    **kwargs,
 ) -> dict[str, Any]:
-    MOVIE_APPENDS = ",".join(
-        [
-            "alternative_titles",
-            "credits",
-            "images",
-            "keywords",
-            "release_dates",
-            "recommendations",
-            "similar",
-            "videos",
-            "external_ids",
-            "watch/providers",
-            "translations",
-        ]
-    )
-
     fetcher = fetch_tmdb()
     return fetcher(
         "movie",
         tmdb_id,
         language=language,
-        watch_region=watch_region,
-        append_to_response=MOVIE_APPENDS,
+        **profile_params(MOVIE_FETCH_PROFILES, profile, watch_region),
         **kwargs,
     )
 
 
+def fetch_season(tmdb_id: int, season: int, language: str = "zh-CN") -> dict[str, Any]:
+    """tv/{id}/season/{n}：季信息和每一集的标题、简介、播出日期。"""
+    client = get_client()
+    params = {"language": language}
+
+    def send(headers: dict[str, str]) -> requests.Response:
+        return client.get(
+            f"tv/{tmdb_id}/season/{season}", params=params, headers=headers
+        )
+
+    return TMDB_CACHE.fetch(
+        CacheKey.build(f"tv/season/{season}", tmdb_id, params), send
+    )
+
+
 @dataclass
 class CfgNotFoundException(Exception):
     task: Task
@@ -122,12 +171,18 @@ def get_cfg(task: Task) -> Cfg:
 
 
 def create_task(name: str, category: str, tags: dict, content_path: str) -> int:
-    result = dba.insert_task(name, category, tags, content_path)
-    if result.value is None:
-        LOGGER.error("意外错误，插入不可能失败")
-        raise RuntimeError("创建任务时发现返回的 row id 是 None，非期望值")
-
-    return result.value
+    # 与已有的未开始任务重复时返回那个任务的 ID，见 dba.insert_tasks
+    [task_id] = dba.insert_tasks(
+        [
+            {
+                "name": name,
+                "category": category,
+                "tags": tags,
+                "content_path": content_path,
+            }
+        ]
+    ).value
+    return task_id
 
 
 @dataclass(eq=False)
@@ -147,40 +202,85 @@ def get_task(id: int) -> Result[Task, TaskNotFoundException]:
     return Ok(result.value)
 
 
-def pop_task() -> Result[Task, TaskNotFoundException]:
-    task = dba.get_least_task().value
+def default_worker_id() -> str:
+    # 放在函数里取 pid，fork 出来的子进程会得到自己的 id
+    return f"{socket.gethostname()}-{os.getpid()}"
 
-    if task is None:
-        return Err(TaskNotFoundException({"args": "pop"}))
 
-    return Ok(task)
+def claim_tasks(
+    limit: int = 1, worker_id: str | None = None, lease_sec: int = TASK_LEASE_SEC
+) -> list[Task]:
+    return dba.claim_tasks(worker_id or default_worker_id(), limit, lease_sec).value
 
 
-def change_task_staus_doing(task: Task):
-    dba.update_task_status(task.id, 1)
+def series_lock_name(task: Task) -> str:
+    return dba.series_lock_name(task.tags.tmdb.id, task.tags.season)
 
 
-def change_task_status_done(task: Task):
-    dba.update_task_status(task.id, 2)
-    LOGGER.info("本次硬链接+重命名任务完成")
+def release_tasks(tasks: list[Task], worker_id: str | None = None) -> None:
+    dba.release_tasks([task.id for task in tasks], worker_id or default_worker_id())
 
 
-def move_file(task: Task, cfg: Cfg) -> None:
-    LOGGER.info("开始硬链接到指定位置")
-    category_mapping = cfg.cfg["category_mapping"]
-    assert isinstance(category_mapping, dict), (
-        "配置有错误，类目映射文件夹应该是一个dict类型"
-    )
+def renew_tasks(
+    tasks: list[Task], worker_id: str | None = None, lease_sec: int = TASK_LEASE_SEC
+) -> list[int]:
+    return dba.renew_task_leases(
+        [task.id for task in tasks], worker_id or default_worker_id(), lease_sec
+    ).value
 
-    root_dir = category_mapping.get(task.category)
-    assert isinstance(root_dir, str), f"路径一定是字符串: {root_dir}"
 
-    tmdb_id = cfg.tmdb_id
-    tv_show_name = get_tv_show_name_by_id(tmdb_id)
+def fail_task(task: Task, worker_id: str | None = None) -> None:
+    """处理失败：没到 MAX_TASK_ATTEMPTS 次就退避后重试，到了就标记为已失败。"""
+    failed = dba.fail_task(
+        task.id,
+        worker_id or default_worker_id(),
+        MAX_TASK_ATTEMPTS,
+        TASK_RETRY_BASE_SEC,
+        TASK_LEASE_SEC,
+    ).value
+    if failed is None:
+        LOGGER.warning(f"任务已不归本 worker 所有，不记录失败, ID: {task.id}")
+    elif failed.status == 4:
+        LOGGER.error(f"任务已失败 {failed.attempts} 次，不再重试, ID: {task.id}")
+    else:
+        delay = (failed.lease_expires_at or 0) - int(time.time())
+        LOGGER.warning(
+            f"任务第 {failed.attempts} 次失败，{delay}s 后重试, ID: {task.id}"
+        )
+
+
+def pop_task(worker_id: str | None = None) -> Result[Task, TaskNotFoundException]:
+    """领取一个任务，领取即置为进行中，并发的 worker 不会拿到同一个任务。"""
+    tasks = claim_tasks(1, worker_id)
+
+    if not tasks:
+        return Err(TaskNotFoundException({"args": "pop"}))
+
+    return Ok(tasks[0])
 
-    season = f"Season {task.tags.season}"
 
-    destination = Path(root_dir).joinpath(tv_show_name).joinpath(season)
+def change_task_status_done(task: Task, lease: dba.Lease | None = None):
+    dba.update_task_status(task.id, 2, lease)
+    LOGGER.info("本次硬链接+重命名任务完成")
+
+
+def process_task(task: Task, lease: dba.Lease | None = None) -> None:
+    """
+    已领取任务的完整处理流程：取配置 -> 链接 -> 刮削 -> 标记完成。
+    lease 是这部剧的 series 锁：被接管后抛 dba.LeaseLostError，不再写库里的文件和数据库。
+    """
+    cfg = get_cfg(task)
+    move_file(task, cfg, lease)
+    if lease is not None:
+        dba.ensure_lease(lease)
+    scrape_task(task, cfg)
+    change_task_status_done(task, lease)
+
+
+def move_file(task: Task, cfg: Cfg, lease: dba.Lease | None = None) -> None:
+    LOGGER.info("开始链接到指定位置")
+    show_dir = resolve_show_dir(cfg.tmdb_id, task.category, category_root(task, cfg))
+    destination = season_dir(show_dir, task)
     LOGGER.debug(f"目标地址: {destination}")
 
     if destination.exists() and not destination.is_dir():
@@ -188,20 +288,98 @@ def move_file(task: Task, cfg: Cfg) -> None:
 
     destination.mkdir(parents=True, exist_ok=True)
 
-    ensure_tvshow_nfo_in_dir(
-        Path(root_dir).joinpath(tv_show_name), tmdb_id, tv_show_name
-    )
+    ensure_tvshow_nfo_in_dir(show_dir, cfg.tmdb_id, show_dir.name)
 
     content_path = Path(task.content_path)
     if not content_path.exists():
         raise RuntimeError(f"task 对应的文件路径并不存在, path: {content_path}")
 
+    # 边遍历边按批把计划写进 link_plan 表并执行；崩溃后重跑从没做完的继续
+    mover = resolve_mover(task, cfg)
+    ops = journal.plan_links(task.id, mover, content_path, destination, lease=lease)
+    journal.execute_plan(task.id, ops, lease)
+
+
+def dry_run_move(task: Task) -> list[LinkOp]:
+    """只计算任务会做哪些链接：不建目录、不写 link_plan / show_dir / cfg 表、不碰文件。"""
+    cfg = dba.get_cfg(task).value or replace(
+        Cfg.get_default_cfg(), season=task.tags.season, tmdb_id=task.tags.tmdb.id
+    )
+    show_dir = resolve_show_dir(
+        cfg.tmdb_id, task.category, category_root(task, cfg), register=False
+    )
+    return resolve_mover(task, cfg).plan(
+        Path(task.content_path), season_dir(show_dir, task)
+    )
+
+
+def category_root(task: Task, cfg: Cfg) -> str:
+    category_mapping = cfg.cfg["category_mapping"]
+    assert isinstance(category_mapping, dict), (
+        "配置有错误，类目映射文件夹应该是一个dict类型"
+    )
+
+    root_dir = category_mapping.get(task.category)
+    assert isinstance(root_dir, str), f"路径一定是字符串: {root_dir}"
+    return root_dir
+
+
+def season_dir(show_dir: Path, task: Task) -> Path:
+    return show_dir.joinpath(f"Season {task.tags.season}")
+
+
+def resolve_mover(task: Task, cfg: Cfg) -> Mover:
+    # cfg 里自带规则时优先使用，否则用 rules.toml 里注册好的
+    rule = cfg.cfg.get("mover")
+    if isinstance(rule, dict):
+        return mover_from_cfg(cfg.tmdb_id, task.tags.season, rule)
     try:
-        mover = MOVE_FACTORY.create(f"tmdb-{tmdb_id}-s{task.tags.season}")
-        mover(content_path, destination)
+        return MOVE_FACTORY.create(f"tmdb-{cfg.tmdb_id}-s{task.tags.season}")
     except UnknownKeyError:
         LOGGER.error("没有找到对应的实现，请检查参数是否正确")
-        raise MoveFunctionNotFound(task.tags.season, tmdb_id)
+        raise MoveFunctionNotFound(task.tags.season, cfg.tmdb_id)
+
+
+def resolve_show_dir(
+    tmdb_id: int, category: str, root_dir: Path | str, register: bool = True
+) -> Path:
+    """
+    剧集在库里的根目录。第一次处理时用 TMDB 的剧名确定并登记到 show_dir 表，
+    之后一直复用登记的目录：不再请求 TMDB，TMDB 改了剧名也不会多出第二个文件夹。
+    register=False 时只计算不登记（预演用）。
+    """
+    root = Path(root_dir)
+    stored = dba.get_show_dir(tmdb_id, category).value
+    if stored is not None:
+        directory = Path(stored)
+        if directory.parent == root:
+            return directory
+
+        # 分类根目录换过了：沿用登记的文件夹名，同样不需要请求 TMDB
+        moved = root / directory.name
+        if register:
+            LOGGER.warning(f"分类根目录已变更，剧集目录 {directory} -> {moved}")
+            dba.set_show_dir(tmdb_id, category, str(moved))
+        return moved
+
+    tv_show_name = get_tv_show_name_by_id(tmdb_id)
+    if not register:
+        return root / tv_show_name
+    # 并发时以先登记的为准
+    return Path(
+        dba.register_show_dir(tmdb_id, category, str(root / tv_show_name)).value
+    )
+
+
+def refresh_show_dir(tmdb_id: int, category: str, root_dir: Path | str) -> Path:
+    """按 TMDB 当前的剧名重新登记目录（不会移动已有文件）。"""
+    TMDB_CACHE.invalidate("tv", tmdb_id)
+    directory = Path(root_dir) / get_tv_show_name_by_id(tmdb_id)
+    dba.set_show_dir(tmdb_id, category, str(directory))
+    LOGGER.info(
+        f"已重新登记剧集目录: tmdb={tmdb_id}, category={category} -> {directory}"
+    )
+    return directory
 
 
 def ensure_tvshow_nfo_in_dir(
@@ -258,7 +436,8 @@ class TVShowNameNotFound(Exception):
 def get_tv_show_name_by_id(
     tmdb_id: int,
 ) -> str:
-    tv_show = fetch_tvshows(tmdb_id=tmdb_id)
+    # 只需要 name，用 minimal 档位，不带任何 append_to_response
+    tv_show = fetch_tvshows(tmdb_id=tmdb_id, profile="minimal")
     title = tv_show.get("name") or tv_show.get("original_name")
     assert title is not None, (
         "剧名不可能查不到，通过tmdb的api如果没有查到http会直接报错。如果真的有一天走到这里，就快点确认tmdb是不是改了什么东西。"
@@ -267,28 +446,20 @@ def get_tv_show_name_by_id(
     return title
 
 
-def get_tmm_cmd() -> Path | None:
-    """
-    自用工具，处于开发成本考虑，暂时就只去支持Windows, 后续支持根据 Path 找命令
-    """
-    local = Path("C:/Users/Herman/AppData/Local/Programs/")
-    tmm_command = Path(local) / "tinyMediaManagerV5" / "tinyMediaManagerCMD.exe"
-    if tmm_command.exists():
-        return tmm_command
-    raise RuntimeError("tmm 命令没有找到。暂时只支持Windows。")
-
-
-def scrape_and_rename():
-    LOGGER.info("开始刮削&&重命名")
-    tmm_cmd = get_tmm_cmd()
-
-    step1 = [str(tmm_cmd), "tvshow", "-u", "--scrapeUnscraped", "-r"]
-    # step2 = [str(tmm_cmd), "tvshow", "--scrapeAll"]
-
-    # return_code = subprocess.run(step1, check=False)
-    # LOGGER.info(f"tmm 程序退出码: {return_code}")
-    LOGGER.warning(f"暂时不实现了，手动刮一阵子先 {step1}")
-    # subprocess.run(step2, check=False)
+def scrape_task(task: Task, cfg: Cfg) -> dict[str, int]:
+    """只刮削本任务链接进库的文件（含续跑时已存在跳过的），按季请求一次 TMDB。"""
+    LOGGER.info("开始刮削")
+    files = [
+        Path(op["destination"])
+        for op in dba.get_link_plan(task.id).value
+        if op["status"] in (journal.LINKED, journal.SKIPPED)
+    ]
+    if not any(scrape.is_video(path) for path in files):
+        LOGGER.info("本次没有新的视频文件，跳过刮削")
+        return {"written": 0, "exists": 0, "unmatched": 0}
+
+    season = task.tags.season
+    return scrape.write_nfos(files, season, fetch_season(cfg.tmdb_id, season))
 
 
 def create_cfg(season: int, tmdb_id: int, cfg: dict[str, Any] | None = None):
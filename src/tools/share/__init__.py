@@ -1,31 +1,27 @@
 from __future__ import annotations
 
+import atexit
 import logging
-import logging.config
 import logging.handlers
 import os
+import queue
 import re
 import sqlite3
 import sys
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from re import Pattern
 from typing import (
     Any,
-    Callable,
     Generic,
-    Iterable,
-    Iterator,
-    Optional,
-    Pattern,
-    Sequence,
+    Protocol,
     TypeVar,
-    Union,
 )
 
-from dotenv import load_dotenv
-
-from tools.share.tg_bot import TelegramHandler
-
 # LOGGING = {
 #     "version": 1,
 #     "disable_existing_loggers": False,
@@ -51,19 +47,73 @@ from tools.share.tg_bot import TelegramHandler
 # logging.config.dictConfig(LOGGING)
 
 
-def setup_logging():
-    root = logging.getLogger()
-    root.setLevel(logging.INFO)
+LOGGER = logging.getLogger(__name__)
+
+LOG_FORMAT = "[%(levelname)s]-[%(asctime)s]-[%(name)s=>%(funcName)s, %(filename)s:%(lineno)d]: %(message)s"
+
+_listener: logging.handlers.QueueListener | None = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(*, network: bool = True) -> logging.Logger:
+    """
+    由入口脚本在 main() 里调用一次（重复调用无效）。
+    真正的 handler（控制台、文件、TG）都挂在 QueueListener 的后台线程里，
+    root 上只有一个 QueueHandler：业务代码打日志只是往队列里放一条记录，不做 I/O。
+    network=False：不挂 TG 相关的 handler（enqueue 这种只插一行就退出的进程用）。
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return LOGGER
+
+        warnings: list[str] = []
+        handlers = _build_handlers(network, warnings)
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        _listener.start()
+        # 比 logging 自己的 atexit 后注册，先执行：先把队列里的记录交给 handler，再关闭 handler
+        atexit.register(_stop_listener)
+
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    for warning in warnings:
+        LOGGER.warning(warning)
+
+    # 避免 requests 自身日志回流触发推送（可选）
+    logging.getLogger("requests").setLevel(logging.WARNING)
+
+    # 捕获未处理异常到日志
+    def _excepthook(exc_type, exc, tb):
+        LOGGER.exception("未捕获异常", exc_info=(exc_type, exc, tb))
+
+    sys.excepthook = _excepthook
+
+    return LOGGER
+
+
+def _stop_listener() -> None:
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
 
+
+def _build_handlers(network: bool, warnings: list[str]) -> list[logging.Handler]:
     # 你之前要的格式：等级 + 时间 + 模块>函数 @ 文件:行 + 消息
-    fmt = "[%(levelname)s]-[%(asctime)s]-[%(name)s=>%(funcName)s, %(filename)s:%(lineno)d]: %(message)s"
-    formatter = logging.Formatter(fmt=fmt, datefmt="%Y-%m-%d %H:%M:%S")
+    formatter = logging.Formatter(fmt=LOG_FORMAT, datefmt="%Y-%m-%d %H:%M:%S")
+    handlers: list[logging.Handler] = []
 
     # 控制台
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
     ch.setFormatter(formatter)
-    root.addHandler(ch)
+    handlers.append(ch)
 
     # 文件日志（默认写入项目根下 log/app.log；也支持通过环境变量指定文件路径）
     try:
@@ -84,17 +134,31 @@ def setup_logging():
         )
         fh.setLevel(logging.DEBUG)
         fh.setFormatter(formatter)
-        root.addHandler(fh)
-    except Exception as e:
-        # 文件日志失败不应阻塞主流程
-        logging.getLogger(__name__).warning("文件日志初始化失败: %s", e)
+        handlers.append(fh)
+    except OSError as e:
+        # 文件日志失败（目录不可写、磁盘满等）不应阻塞主流程
+        warnings.append(f"文件日志初始化失败: {e}")
+
+    if not network:
+        return handlers
+
+    from dotenv import load_dotenv
 
     load_dotenv()
     # Telegram（从环境变量读，避免泄漏）
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     chat_id = os.getenv("TELEGRAM_CHAT_ID")
     if token and chat_id:
-        tg = TelegramHandler(token, chat_id, level=logging.INFO)
+        # outbox（默认）：只写进 app.db，由 worker / notifier.py 里的发送者推送，进程退出不等网络
+        # direct：本进程直接推送（旧行为，退出时最多等 5 秒）
+        if os.getenv("MY_QB_TOOLS_TG_DELIVERY", "outbox") == "direct":
+            from tools.share.tg_bot import TelegramHandler
+
+            tg: logging.Handler = TelegramHandler(token, chat_id, level=logging.INFO)
+        else:
+            from tools.share.outbox import OutboxHandler
+
+            tg = OutboxHandler(level=logging.INFO)
         tg.setFormatter(formatter)
 
         # 如果只想发“恰好 INFO”（不包括 WARNING/ERROR），取消注释下面两行
@@ -102,35 +166,14 @@ def setup_logging():
         #     def filter(self, record): return record.levelno == logging.INFO
         # tg.addFilter(OnlyInfo())
 
-        root.addHandler(tg)
+        handlers.append(tg)
     else:
-        logging.getLogger(__name__).warning(
-            "未设置 TELEGRAM_BOT_TOKEN/TELEGRAM_CHAT_ID，已禁用 TG 推送。"
-        )
-
-    # 避免 requests 自身日志回流触发推送（可选）
-    logging.getLogger("requests").setLevel(logging.WARNING)
-
-    # 捕获未处理异常到日志
-    def _excepthook(exc_type, exc, tb):
-        logging.getLogger(__name__).exception(
-            "未捕获异常", exc_info=(exc_type, exc, tb)
-        )
-
-    try:
-        sys.excepthook = _excepthook
-    except Exception:
-        pass
-
-    return logging.getLogger(__name__)
-
-
-LOGGER = setup_logging()
+        warnings.append("未设置 TELEGRAM_BOT_TOKEN/TELEGRAM_CHAT_ID，已禁用 TG 推送。")
+    return handlers
 
 
 def sqlite_row_to_dict(cursor: sqlite3.Cursor, data: tuple[Any, ...]) -> dict[str, Any]:
-    row = sqlite3.Row(cursor, data)
-    return {key: row[key] for key in row.keys()}
+    return {column[0]: value for column, value in zip(cursor.description, data)}
 
 
 def format_timestamp(ts: int) -> str:
@@ -142,6 +185,8 @@ def format_timestamp(ts: int) -> str:
 
 T = TypeVar("T", bound=Callable)
 E = TypeVar("E")
+K = TypeVar("K")
+V = TypeVar("V")
 Builder = Callable[..., E]  # 负责“构建实例”的可调用，比如类本身或函数
 
 
@@ -153,7 +198,7 @@ class UnknownKeyError(KeyError):
 class Factory(Generic[T]):
     def __init__(self) -> None:
         self._registry: dict[str, T] = {}
-        self._default: Optional[T] = None
+        self._default: T | None = None
 
     def register(self, name: str):
         key = name.lower()
@@ -187,27 +232,79 @@ class Factory(Generic[T]):
         return sorted(self._registry.keys())
 
 
+class LRUCache(Generic[K, V]):
+    """线程安全的定长 LRU，满了淘汰最久没用过的。"""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class Matcher(Protocol):
+    """有 search 方法的对象都可以代替编译好的正则（例如带预筛的 CompiledRule）。"""
+
+    def search(self, string: str, /) -> Any: ...
+
+
+def walk_workers() -> int:
+    """列目录的并发数；库在 SMB 之类高延迟的网络盘上时调大，本地盘保持 1（串行）。
+    用到时才读环境变量：.env 由用到它的模块加载，tools.share 本身不依赖 dotenv。"""
+    return int(os.getenv("MY_QB_TOOLS_WALK_WORKERS", "1"))
+
+
 def iter_files_by_regex(
-    root: Union[str, Path],
-    pattern: Union[str, Pattern[str]],
+    root: str | Path,
+    pattern: str | Pattern[str] | Matcher,
     *,
     match_on: str = "name",  # "name" | "relative" | "path"
     flags: int = 0,  # re.IGNORECASE 等
-    ignore_dirs: Sequence[Union[str, Pattern[str]]] = (),
+    ignore_dirs: Sequence[str | Pattern[str]] = (),
     follow_symlinks: bool = False,
     return_str: bool = False,
     normalize_posix: bool = True,  # 将路径统一为 / 便于写正则
-) -> Iterator[Union[Path, str]]:
+    workers: int | None = None,
+) -> Iterator[Path | str]:
     """
     遍历 root 下所有文件，返回满足正则的文件路径（生成器）。
-    - pattern: 正则字符串或已编译的 Pattern
+    - pattern: 正则字符串、已编译的 Pattern 或任何有 search 方法的对象
     - match_on:
         "name"     -> 仅匹配文件名
         "relative" -> 匹配相对 root 的路径
         "path"     -> 匹配绝对路径
     - ignore_dirs: 要忽略的目录名称/正则（仅对目录名生效）
+    - workers: 同时列目录的线程数，默认 MY_QB_TOOLS_WALK_WORKERS；大于 1 时结果顺序不固定
+
+    基于 os.scandir：用目录项自带的类型判断文件/目录（大多数平台不需要额外 stat），
+    用字符串做匹配，只给命中的文件构造 Path。
     """
-    root = Path(root)
+    if match_on not in ("name", "relative", "path"):
+        raise ValueError("match_on 必须是 'name' | 'relative' | 'path'")
 
     regex = re.compile(pattern, flags) if isinstance(pattern, str) else pattern
 
@@ -218,30 +315,72 @@ def iter_files_by_regex(
     def ignored(dirname: str) -> bool:
         return any(r.search(dirname) for r in compiled_ignores)
 
-    for dirpath, dirnames, filenames in os.walk(
-        root, topdown=True, onerror=lambda e: None, followlinks=follow_symlinks
-    ):
-        # 修剪需要忽略的目录
-        dirnames[:] = [d for d in dirnames if not ignored(d)]
+    top = os.fspath(Path(root))
+    prefix_len = len(top) if top.endswith(os.sep) else len(top) + 1
+    to_posix = normalize_posix and os.sep != "/"
+
+    def scan(dirpath: str) -> tuple[list[str], list[str]]:
+        """列一个目录，返回 (命中的文件, 需要继续往下走的子目录)。"""
+        hits: list[str] = []
+        subdirs: list[str] = []
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            return hits, subdirs  # 和 os.walk(onerror=忽略) 一样，读不了的目录直接跳过
+
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # 指向目录的符号链接不算文件；只有 follow_symlinks 时才进去
+                if (follow_symlinks or not entry.is_symlink()) and not ignored(
+                    entry.name
+                ):
+                    subdirs.append(entry.path)
+                continue
 
-        for fname in filenames:
-            p = Path(dirpath) / fname
             if match_on == "name":
-                target = fname
-            elif match_on == "relative":
-                rel = p.relative_to(root)
-                target = rel.as_posix() if normalize_posix else str(rel)
-            elif match_on == "path":
-                target = p.as_posix() if normalize_posix else str(p)
+                target = entry.name
             else:
-                raise ValueError("match_on 必须是 'name' | 'relative' | 'path'")
-
+                target = (
+                    entry.path[prefix_len:] if match_on == "relative" else entry.path
+                )
+                if to_posix:
+                    target = target.replace(os.sep, "/")
             if regex.search(target):
-                yield str(p) if return_str else p
+                hits.append(entry.path)
+        return hits, subdirs
+
+    def emit(hits: list[str]) -> Iterator[Path | str]:
+        for hit in hits:
+            yield hit if return_str else Path(hit)
+
+    workers = walk_workers() if workers is None else workers
+    if workers <= 1:
+        # 和 os.walk(topdown=True) 顺序一致：先当前目录的文件，再依次进入子目录
+        stack = [top]
+        while stack:
+            hits, subdirs = scan(stack.pop())
+            yield from emit(hits)
+            stack.extend(reversed(subdirs))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk") as pool:
+        pending = {pool.submit(scan, top)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                hits, subdirs = future.result()
+                pending.update(pool.submit(scan, d) for d in subdirs)
+                yield from emit(hits)
 
 
 def find_files_by_regex(
-    root: Union[str, Path], pattern: Union[str, Pattern[str]], **kwargs
+    root: str | Path, pattern: str | Pattern[str] | Matcher, **kwargs
 ) -> list[Path]:
     """便捷版：一次性返回列表（基于上面的生成器）。"""
+    kwargs["return_str"] = False
     return [Path(path) for path in iter_files_by_regex(root, pattern, **kwargs)]
@@ -0,0 +1,209 @@
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Protocol
+
+from tools.share.tg_bot import TelegramSender, chunk, pack
+
+"""
+通知发件箱（app.db 的 outbox 表）：
+- 产生通知的进程（enqueue/execute 等短命进程）只把消息写进 outbox，退出时不碰网络
+- 常驻的发送者（worker 进程里的线程，或单独的 notifier.py）领取并发送，失败按退避重试
+- 进程被杀、网络不通时消息留在表里，重启后继续发
+
+emit 里不直接写库：日志可能在迁移事务里或调用方持有写事务时产生，同步写库会互相等待。
+emit 只放进内存队列，由后台线程批量写入。
+"""
+
+# 本模块自己的日志不进发件箱，避免发送失败的告警再生成新的待发送消息
+_LOGGER = logging.getLogger(__name__)
+
+CHUNK_CHARS = 3500
+
+
+class Sender(Protocol):
+    def send(self, text: str) -> bool: ...
+
+
+class OutboxHandler(logging.Handler):
+    def __init__(
+        self,
+        level: int = logging.INFO,
+        *,
+        chunk_chars: int = CHUNK_CHARS,
+        flush_interval_sec: float = 0.2,
+        close_timeout_sec: float = 2.0,
+    ) -> None:
+        super().__init__(level)
+        self.chunk_chars = chunk_chars
+        self.flush_interval_sec = flush_interval_sec
+        self.close_timeout_sec = close_timeout_sec
+        self.addFilter(lambda record: not record.name.startswith(__name__))
+
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._writer = threading.Thread(
+            target=self._run, name="outbox-writer", daemon=True
+        )
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = self.format(record)
+            for part in chunk(msg, self.chunk_chars):
+                self._queue.put(part)
+        except Exception:  # noqa: BLE001 - logging.Handler 的约定：出错交给 handleError
+            self.handleError(record)
+
+    def close(self) -> None:
+        # 只等本地写库，最多 close_timeout_sec 秒
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(self.close_timeout_sec)
+        super().close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            stop = item is None
+            texts: list[str] = [] if item is None else [item]
+            # 攒一小会儿，一个事务写入多条
+            deadline = time.monotonic() + self.flush_interval_sec
+            while not stop:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    texts.append(item)
+            if texts:
+                self._write(texts)
+            if stop:
+                return
+
+    @staticmethod
+    def _write(texts: list[str]) -> None:
+        # dba 依赖 tools.share，只能在这里导入
+        from tools import dba
+
+        try:
+            dba.insert_outbox(texts)
+        except (sqlite3.Error, OSError) as e:
+            print(f"写入发件箱失败，丢弃 {len(texts)} 条通知: {e!r}", file=sys.stderr)
+
+
+class OutboxSender:
+    """从 outbox 领取消息并发送。多个发送者同时运行也不会重复发（领取时带租约）。"""
+
+    def __init__(
+        self,
+        sender: Sender,
+        *,
+        chunk_chars: int = CHUNK_CHARS,
+        batch: int = 50,
+        poll_interval_sec: float = 2.0,
+        lease_sec: int = 120,
+        max_backoff_sec: int = 600,
+        retention_sec: int = 7 * 24 * 3600,
+    ) -> None:
+        self.sender = sender
+        self.chunk_chars = chunk_chars
+        self.batch = batch
+        self.poll_interval_sec = poll_interval_sec
+        self.lease_sec = lease_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.retention_sec = retention_sec
+        self.stats = {"sent": 0, "messages": 0, "failed": 0}
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_purge = 0.0
+
+    def drain_once(self) -> int:
+        """领取一批到期的消息，合并成尽量少的请求发送，返回发送成功的条数。"""
+        from tools import dba
+
+        rows = dba.claim_outbox(self.batch, self.lease_sec).value
+        if not rows:
+            return 0
+
+        texts = {row["id"]: row["text"] for row in rows}
+        attempts = {row["id"]: row["attempts"] for row in rows}
+        groups = list(pack(texts.items(), self.chunk_chars, key=lambda item: item[1]))
+        sent = 0
+        for i, group in enumerate(groups):
+            ids = [id_ for id_, _ in group]
+            if self.sender.send("\n".join(text for _, text in group)):
+                dba.mark_outbox_sent(ids)
+                sent += len(ids)
+                self.stats["sent"] += 1
+                self.stats["messages"] += len(ids)
+                continue
+
+            # 失败：这一组和后面的都推迟，保持消息顺序
+            rest = ids + [id_ for later in groups[i + 1 :] for id_, _ in later]
+            delay = min(
+                self.max_backoff_sec, 5 * 2 ** (max(attempts[j] for j in ids) - 1)
+            )
+            dba.defer_outbox(rest, delay)
+            self.stats["failed"] += 1
+            _LOGGER.warning(f"通知发送失败，{len(rest)} 条 {delay}s 后重试")
+            break
+        return sent
+
+    def run(self) -> None:
+        _LOGGER.info("通知发送者启动")
+        while not self._stop.is_set():
+            try:
+                sent = self.drain_once()
+                self._purge()
+            except Exception:
+                _LOGGER.exception("发送通知出错")
+                sent = 0
+            if sent == 0:
+                self._stop.wait(self.poll_interval_sec)
+        # 退出前把已经到期的再发一轮
+        try:
+            self.drain_once()
+        except Exception:
+            _LOGGER.exception("发送通知出错")
+
+    def start(self) -> "OutboxSender":
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="outbox-sender", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        from tools import dba
+
+        dba.purge_outbox(self.retention_sec)
+
+
+def sender_from_env() -> OutboxSender | None:
+    """按 TELEGRAM_BOT_TOKEN / TELEGRAM_CHAT_ID 创建发送者，未配置时返回 None。"""
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    chat_id = os.getenv("TELEGRAM_CHAT_ID")
+    if not (token and chat_id):
+        return None
+    return OutboxSender(TelegramSender(token, chat_id))
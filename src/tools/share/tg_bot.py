@@ -3,17 +3,112 @@ import logging
 import queue
 import threading
 import time
-from typing import Iterable
+from collections.abc import Callable, Iterable, Iterator
+from typing import TypeVar
 
 import requests
 
 TELEGRAM_API = "https://api.telegram.org/bot{token}/sendMessage"
 SENTINEL = object()
 
+T = TypeVar("T")
+
+
+class TelegramSender:
+    """发一条 Telegram 消息：429 按 retry_after 等待后重试，5xx / 网络错误指数退避。"""
+
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        *,
+        timeout_sec: float = 4.0,
+        rate_limit_sec: float = 0.1,
+        max_retries: int = 3,
+        max_retry_after_sec: float = 60.0,
+        session: requests.Session | None = None,
+    ):
+        self.url = TELEGRAM_API.format(token=token)
+        self.chat_id = chat_id
+        self.timeout_sec = timeout_sec
+        self.rate_limit_sec = rate_limit_sec
+        self.max_retries = max_retries
+        self.max_retry_after_sec = max_retry_after_sec
+        self.session = session or requests.Session()
+        self.stats = {"rate_limited": 0}
+
+    def send(self, text: str) -> bool:
+        """发送一条消息，成功返回 True；重试用尽或 4xx 返回 False。"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(
+                    self.url,
+                    data={"chat_id": self.chat_id, "text": text},
+                    timeout=self.timeout_sec,
+                )
+            except requests.RequestException:
+                delay = min(self.max_retry_after_sec, 0.5 * (2**attempt))
+            else:
+                if response.status_code == 429:
+                    self.stats["rate_limited"] += 1
+                    delay = self._retry_after(response)
+                elif response.status_code >= 500:
+                    delay = min(self.max_retry_after_sec, 0.5 * (2**attempt))
+                else:
+                    # 4xx（除 429）重试也没用，直接算发送结束
+                    if self.rate_limit_sec > 0:
+                        time.sleep(self.rate_limit_sec)
+                    return response.ok
+
+            if attempt >= self.max_retries:
+                return False
+            time.sleep(delay)
+        return False
+
+    def _retry_after(self, response: requests.Response) -> float:
+        retry_after: object = None
+        try:
+            retry_after = response.json().get("parameters", {}).get("retry_after")
+        except ValueError:
+            pass
+        if retry_after is None:
+            retry_after = response.headers.get("Retry-After")
+        try:
+            delay = float(retry_after)  # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            delay = 1.0
+        return min(self.max_retry_after_sec, max(0.0, delay))
+
+
+def chunk(s: str, n: int) -> Iterable[str]:
+    if len(s) <= n:
+        return [s]
+    return (s[i : i + n] for i in range(0, len(s), n))
+
+
+def pack(
+    items: Iterable[T], limit: int, key: Callable[[T], str] = str
+) -> Iterator[list[T]]:
+    """按顺序把多条文本分组，每组用换行拼起来不超过 limit（单条本身超长的单独成组）。"""
+    group: list[T] = []
+    size = 0
+    for item in items:
+        length = len(key(item))
+        extra = length + (1 if group else 0)
+        if group and size + extra > limit:
+            yield group
+            group, size, extra = [], 0, length
+        group.append(item)
+        size += extra
+    if group:
+        yield group
+
 
 class TelegramHandler(logging.Handler):
     """把日志发到 Telegram。内部用队列+后台线程，避免阻塞主流程。
     支持优雅退出：close()/logging.shutdown() 时会阻塞直至把队列里的消息发完。
+    后台线程在 flush_window_sec 内把排队的多条日志合并成尽量少的消息（每条不超过 chunk_chars），
+    遇到 429 按返回的 retry_after 等待后重试。发送情况见 stats。
     """
 
     def __init__(
@@ -27,40 +122,56 @@ class TelegramHandler(logging.Handler):
         timeout_sec: float = 4.0,  # 单次请求超时
         rate_limit_sec: float = 0.1,  # 轻微限速，防止触发 TG 限流
         drop_oldest_on_full: bool = True,
+        flush_window_sec: float = 1.0,  # 收到第一条后最多再等这么久，把后面的合并进同一条消息
+        max_retries: int = 3,  # 429 / 网络错误的重试次数，用尽后丢弃
+        max_retry_after_sec: float = 60.0,
     ):
         super().__init__(level)
-        self.token = token
-        self.chat_id = chat_id
         self.chunk_chars = chunk_chars
-        self.timeout_sec = timeout_sec
-        self.rate_limit_sec = rate_limit_sec
         self.drop_oldest_on_full = drop_oldest_on_full
+        self.flush_window_sec = flush_window_sec
+        self.sender = TelegramSender(
+            token,
+            chat_id,
+            timeout_sec=timeout_sec,
+            rate_limit_sec=rate_limit_sec,
+            max_retries=max_retries,
+            max_retry_after_sec=max_retry_after_sec,
+        )
 
-        self._q: "queue.Queue[object]" = queue.Queue(max_queue)
+        # sent: 发出的消息数；records: 送达的日志条数（按分块计）；
+        # batched: 和别的日志合并发送的条数；dropped: 队列满或重试用尽丢弃的条数；
+        # rate_limited: 收到 429 的次数
+        self._stats = {"sent": 0, "records": 0, "batched": 0, "dropped": 0}
+        self._stats_lock = threading.Lock()
+        self._carry: str | None = None  # 上一批放不下、留到下一批的那条
+
+        self._q: queue.Queue[object] = queue.Queue(max_queue)
         self._stop = threading.Event()
         self._worker = threading.Thread(
             target=self._run, daemon=True, name="TelegramHandlerWorker"
         )
-        self._session = requests.Session()
         self._worker.start()
 
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {**self._stats, "rate_limited": self.sender.stats["rate_limited"]}
+
     # ---------- logging.Handler 接口 ----------
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
             msg = self.format(record)  # 用外部设置的 Formatter
-            for chunk in self._chunk(msg, self.chunk_chars):
-                self._enqueue(chunk)
-        except Exception:
+            for part in chunk(msg, self.chunk_chars):
+                self._enqueue(part)
+        except Exception:  # noqa: BLE001
             # 不要在这里 logging，避免递归；交给父类做标准错误处理
             self.handleError(record)
 
     def flush(self) -> None:  # type: ignore[override]
         """阻塞直到队列中的消息全部发送完成。"""
-        try:
-            self._q.join()
-        except Exception:
-            pass
+        self._q.join()
 
     def close(self) -> None:  # type: ignore[override]
         try:
@@ -70,8 +181,8 @@ class TelegramHandler(logging.Handler):
             # 投递哨兵让工作线程优雅退出；同时设停止标志
             try:
                 self._q.put_nowait(SENTINEL)
-            except Exception:
-                pass
+            except queue.Full:
+                pass  # 队列满时工作线程靠 _stop 退出
             self._stop.set()
             if self._worker.is_alive():
                 # 等一会，防止网络抖动导致收尾太慢（可按需调小/调大）
@@ -80,10 +191,15 @@ class TelegramHandler(logging.Handler):
 
     # ---------- 内部实现 ----------
 
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
     def _enqueue(self, item: object) -> None:
         try:
             self._q.put_nowait(item)
         except queue.Full:
+            self._count("dropped")
             if self.drop_oldest_on_full:
                 # 丢弃最旧的一条，确保 put 不阻塞；注意要配对 task_done 以免 join() 卡住
                 try:
@@ -95,40 +211,69 @@ class TelegramHandler(logging.Handler):
                     self._q.put_nowait(item)
                 except queue.Full:
                     # 如果还满，干脆丢弃本条
-                    pass
-            else:
-                # 直接丢弃本条
-                pass
+                    self._count("dropped")
+            # 否则直接丢弃本条
+
+    def _next_batch(self) -> tuple[list[str], bool]:
+        """
+        取一批能合并成一条消息的日志，返回 (批次, 是否收到退出哨兵)。
+        从第一条开始最多等 flush_window_sec；放不下的那条留到下一批。
+        """
+        batch: list[str] = []
+        size = 0
+        if self._carry is not None:
+            batch.append(self._carry)
+            size = len(self._carry)
+            self._carry = None
+        deadline = time.monotonic() + self.flush_window_sec
 
-    def _run(self):
-        url = TELEGRAM_API.format(token=self.token)
         while True:
-            try:
-                item = self._q.get(timeout=0.5)
-            except queue.Empty:
-                # 若已请求停止且队列为空，允许线程退出
-                if self._stop.is_set():
-                    break
-                continue
+            if batch:
+                timeout = 0.0 if self._stop.is_set() else deadline - time.monotonic()
+                if timeout <= 0:
+                    # 窗口到了，只把已经在队列里的捞出来
+                    try:
+                        item = self._q.get_nowait()
+                    except queue.Empty:
+                        return batch, False
+                else:
+                    try:
+                        item = self._q.get(timeout=timeout)
+                    except queue.Empty:
+                        return batch, False
+            else:
+                try:
+                    item = self._q.get(timeout=0.5)
+                except queue.Empty:
+                    # 若已请求停止且队列为空，允许线程退出
+                    return batch, self._stop.is_set()
+                deadline = time.monotonic() + self.flush_window_sec
 
             if item is SENTINEL:
                 self._q.task_done()
-                break
+                return batch, True
 
             text = str(item)
-            try:
-                self._session.post(
-                    url,
-                    data={"chat_id": self.chat_id, "text": text},
-                    timeout=self.timeout_sec,
-                )
-                if self.rate_limit_sec > 0:
-                    time.sleep(self.rate_limit_sec)
-            finally:
-                self._q.task_done()
+            if batch and size + 1 + len(text) > self.chunk_chars:
+                self._carry = text
+                return batch, False
+            batch.append(text)
+            size += len(text) + (1 if len(batch) > 1 else 0)
 
-    @staticmethod
-    def _chunk(s: str, n: int) -> Iterable[str]:
-        if len(s) <= n:
-            return [s]
-        return (s[i : i + n] for i in range(0, len(s), n))
+    def _run(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                try:
+                    if self.sender.send("\n".join(batch)):
+                        self._count("sent")
+                        self._count("records", len(batch))
+                        if len(batch) > 1:
+                            self._count("batched", len(batch))
+                    else:
+                        self._count("dropped", len(batch))
+                finally:
+                    for _ in batch:
+                        self._q.task_done()
+            if stop and self._carry is None:
+                break
@@ -0,0 +1,366 @@
+import json
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from tools import dba
+from tools.share import LOGGER, LRUCache
+
+# 下面的配置在导入时读取；dba 不再加载 .env
+load_dotenv()
+
+"""
+TMDB 访问层。
+- TMDBClient：进程内共享的 HTTP 客户端，长连接池 + 超时 + 重试（遵守 Retry-After）+ 令牌桶限速
+- TMDBCache：内存 LRU 在前，sqlite（tmdb_cache 表）持久化在后
+    - 每条缓存有自己的过期时间，过期后带 ETag / Last-Modified 做条件请求，304 直接续期
+    - 404 也会缓存（负缓存），避免对不存在的 id 反复请求
+    - 返回的 dict 在进程内共享，调用方只读，不要修改
+"""
+
+BASE = "https://api.themoviedb.org/3"
+
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", "3.05"))
+TMDB_READ_TIMEOUT = float(os.getenv("TMDB_READ_TIMEOUT", "10"))
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "4"))
+# Retry-After 要求等得比这更久就不重试了，直接返回那次的响应，不让 worker 线程一直睡着
+TMDB_MAX_RETRY_AFTER = float(os.getenv("TMDB_MAX_RETRY_AFTER", "60"))
+# TMDB 的限制大约是每秒 40~50 个请求，默认留足余量
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "20"))
+
+TMDB_CACHE_TTL = int(os.getenv("TMDB_CACHE_TTL", str(24 * 3600)))
+TMDB_CACHE_NEGATIVE_TTL = int(os.getenv("TMDB_CACHE_NEGATIVE_TTL", str(3600)))
+
+
+@dataclass(frozen=True, slots=True)
+class CacheKey:
+    kind: str
+    tmdb_id: int
+    language: str
+    appends: str
+    params: str
+
+    @classmethod
+    def build(cls, kind: str, tmdb_id: int, params: dict[str, Any]) -> "CacheKey":
+        rest = dict(params)
+        language = str(rest.pop("language", ""))
+        appends = str(rest.pop("append_to_response", ""))
+        return cls(
+            kind=kind,
+            tmdb_id=tmdb_id,
+            language=language,
+            # append_to_response 的顺序不影响响应内容
+            appends=",".join(sorted(a for a in appends.split(",") if a)),
+            params=json.dumps(rest, sort_keys=True, ensure_ascii=False),
+        )
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    status: int
+    payload: dict[str, Any] | None
+    etag: str | None
+    last_modified: str | None
+    fetched_at: int
+    expires_at: int
+
+    def is_fresh(self, now: float) -> bool:
+        return self.expires_at > now
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "CacheEntry":
+        payload = row["payload"]
+        return cls(
+            status=row["status"],
+            payload=json.loads(payload) if payload is not None else None,
+            etag=row["etag"],
+            last_modified=row["last_modified"],
+            fetched_at=row["fetched_at"],
+            expires_at=row["expires_at"],
+        )
+
+    def to_row(self) -> dict[str, Any]:
+        row = asdict(self)
+        if self.payload is not None:
+            row["payload"] = json.dumps(self.payload, ensure_ascii=False)
+        return row
+
+
+@dataclass(eq=False)
+class TMDBNotFoundError(Exception):
+    kind: str
+    tmdb_id: int
+
+    def __str__(self) -> str:
+        return f"TMDB 上不存在该条目: {self.kind}/{self.tmdb_id}"
+
+
+Send = Callable[[dict[str, str]], requests.Response]
+
+
+class TMDBCache:
+    def __init__(
+        self,
+        *,
+        ttl: int = TMDB_CACHE_TTL,
+        negative_ttl: int = TMDB_CACHE_NEGATIVE_TTL,
+        maxsize: int = 256,
+        persist: bool = True,
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.persist = persist
+        self._memory: LRUCache[CacheKey, CacheEntry] = LRUCache(maxsize)
+        self.stats = {"memory": 0, "db": 0, "revalidated": 0, "fetched": 0}
+
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        entry = self._memory.get(key)
+        if entry is not None or not self.persist:
+            return entry
+
+        row = dba.get_tmdb_cache(asdict(key)).value
+        if row is None:
+            return None
+        entry = CacheEntry.from_row(row)
+        self._memory.put(key, entry)
+        return entry
+
+    def put(self, key: CacheKey, entry: CacheEntry) -> None:
+        self._memory.put(key, entry)
+        if self.persist:
+            dba.upsert_tmdb_cache(asdict(key), entry.to_row())
+
+    def invalidate(self, kind: str, tmdb_id: int) -> None:
+        self._memory.clear()  # 内存里按 kind/id 挑出来删不划算，直接清空
+        if self.persist:
+            dba.delete_tmdb_cache(kind, tmdb_id)
+
+    def fetch(
+        self, key: CacheKey, send: Send, ttl: int | None = None
+    ) -> dict[str, Any]:
+        """
+        命中未过期的缓存直接返回；否则调用 send(headers) 请求 TMDB。
+        send 只负责发请求，条件请求头由这里决定。
+        """
+        now = time.time()
+        from_memory = self._memory.get(key) is not None
+        entry = self.get(key)
+        if entry is not None and entry.is_fresh(now):
+            self.stats["memory" if from_memory else "db"] += 1
+            return self._unwrap(key, entry)
+
+        headers: dict[str, str] = {}
+        if entry is not None and entry.status == 200:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = send(headers)
+        now = time.time()
+
+        if response.status_code == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            entry.fetched_at = int(now)
+            entry.expires_at = int(now) + (ttl or self.ttl)
+            self.put(key, entry)
+            return self._unwrap(key, entry)
+
+        self.stats["fetched"] += 1
+        if response.status_code == 404:
+            LOGGER.warning(
+                f"TMDB 返回 404，负缓存 {self.negative_ttl}s: {key.kind}/{key.tmdb_id}"
+            )
+            entry = CacheEntry(
+                status=404,
+                payload=None,
+                etag=None,
+                last_modified=None,
+                fetched_at=int(now),
+                expires_at=int(now) + self.negative_ttl,
+            )
+            self.put(key, entry)
+            return self._unwrap(key, entry)
+
+        response.raise_for_status()
+        entry = CacheEntry(
+            status=200,
+            payload=response.json(),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=int(now),
+            expires_at=int(now) + (ttl or self.ttl),
+        )
+        self.put(key, entry)
+        return self._unwrap(key, entry)
+
+    @staticmethod
+    def _unwrap(key: CacheKey, entry: CacheEntry) -> dict[str, Any]:
+        if entry.status == 404 or entry.payload is None:
+            raise TMDBNotFoundError(key.kind, key.tmdb_id)
+        return entry.payload
+
+
+TMDB_CACHE = TMDBCache()
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个，最多攒 capacity 个用于突发。"""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """取一个令牌，不够时阻塞等待，返回等待的秒数。"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class TMDBClient:
+    """进程内共享一个实例（见 get_client），复用 keep-alive 连接。"""
+
+    def __init__(
+        self,
+        token: str | None = None,
+        *,
+        base: str = BASE,
+        connect_timeout: float = TMDB_CONNECT_TIMEOUT,
+        read_timeout: float = TMDB_READ_TIMEOUT,
+        max_retries: int = TMDB_MAX_RETRIES,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_retry_after: float = TMDB_MAX_RETRY_AFTER,
+        rate_limit: float = TMDB_RATE_LIMIT,
+        pool_size: int = 10,
+        session: requests.Session | None = None,
+    ) -> None:
+        self.base = base.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.bucket = TokenBucket(rate_limit)
+
+        if session is None:
+            session = requests.Session()
+            # 重试由这里自己做（要处理 Retry-After 和限速），urllib3 层不重试
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size, max_retries=0
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        session.headers.update({"Accept": "application/json"})
+        if token:
+            session.headers.update({"Authorization": f"Bearer {token}"})
+        self.session = session
+
+    def get(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> requests.Response:
+        """
+        返回最后一次的响应（可能是 4xx/5xx，由调用方决定怎么处理）；
+        重试用尽后网络异常原样抛出。Retry-After 超过 max_retry_after 时不再重试，直接返回。
+        """
+        url = f"{self.base}/{path.lstrip('/')}"
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                LOGGER.warning(
+                    f"TMDB 请求失败，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries}): {e}"
+                )
+            else:
+                if (
+                    response.status_code not in RETRY_STATUS
+                    or attempt >= self.max_retries
+                ):
+                    return response
+                # 服务端给了 Retry-After 就至少等这么久，不受 max_backoff 限制；
+                # 但要等的太久就放弃，由调用方按失败处理（任务退避后重试）
+                retry_after = self._retry_after(response)
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    LOGGER.warning(
+                        f"TMDB 返回 {response.status_code}，要求 {retry_after:.0f}s 后重试，"
+                        f"超过上限 {self.max_retry_after:.0f}s，不再重试"
+                    )
+                    return response
+                delay = self._backoff(attempt) if retry_after is None else retry_after
+                LOGGER.warning(
+                    f"TMDB 返回 {response.status_code}，{delay:.1f}s 后重试 ({attempt + 1}/{self.max_retries})"
+                )
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # 指数退避 + 抖动，避免多个线程同时重试
+        delay = min(self.max_backoff, self.backoff * (2**attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_after(self, response: requests.Response) -> float | None:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return max(0.0, delay)
+
+
+_client: TMDBClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> TMDBClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TMDBClient(os.getenv("TMDB_API_TOKEN", None))
+    return _client
@@ -0,0 +1,289 @@
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from types import FrameType
+
+from tools import dba
+from tools.dba import Lease, LeaseLostError, hold_lock
+from tools.enqueue_server import EnqueueServer
+from tools.meta import Task
+from tools.service import (
+    SERIES_LOCK_TTL,
+    TASK_LEASE_SEC,
+    claim_tasks,
+    default_worker_id,
+    fail_task,
+    process_task,
+    release_tasks,
+    renew_tasks,
+    series_lock_name,
+)
+from tools.share import LOGGER
+from tools.share.outbox import OutboxSender, sender_from_env
+from tools.share.result import Err
+
+
+class Worker:
+    """
+    常驻的 worker：一次唤醒把队列里的任务全部处理完，队列空了就休眠等待新任务。
+    - 并发：不同剧（tmdb_id, season）的任务在线程池里并行；同一部剧由 series 锁串行
+    - 唤醒：定期检查 PRAGMA data_version，别的连接提交过写入才会去领任务
+    - 退出：stop() 后处理完手上的任务再退出，已领取未开始的任务放回队列
+    - 租约：领取后没处理完的任务（含排队等 series 锁的）每 lease_sec/3 续租一次，处理再久也不会被别人领走
+    - 入队：传 listen 时在本进程开入队服务（见 tools.enqueue_server），新任务写库后立即唤醒
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 4,
+        poll_interval: float = 2.0,
+        rescan_interval: float = 60.0,  # 没有新写入也定期领一次，回收过期租约
+        idle_exit: float | None = None,  # 空闲多久后自动退出，None 表示一直常驻
+        worker_id: str | None = None,
+        notifier: OutboxSender | None = None,  # 顺带发送 outbox 里的通知
+        listen: str | None = None,  # 入队服务地址，None 表示不开
+        lease_sec: int = TASK_LEASE_SEC,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError(f"concurrency 至少为 1: {concurrency}")
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.idle_exit = idle_exit
+        self.worker_id = worker_id or default_worker_id()
+        self.notifier = notifier
+        self.listen = listen
+        self.lease_sec = lease_sec
+        self.server: EnqueueServer | None = None
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        # 每部剧一个待处理队列，同一部剧同一时刻只有一个线程在处理
+        self._series: dict[str, deque[Task]] = {}
+        self._inflight: set[Future[None]] = set()
+        # 已领取、还没处理完或放回的任务，续租用
+        self._held: dict[int, Task] = {}
+        self._renewed_at = 0.0
+        self._executor: ThreadPoolExecutor | None = None
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def drain(self) -> int:
+        """处理队列直到为空（或收到停止信号），返回本轮领取的任务数。"""
+        claimed = 0
+        while not self._stop.is_set():
+            free = self.concurrency - len(self._inflight)
+            self._renew_leases()
+            tasks = (
+                claim_tasks(free, self.worker_id, self.lease_sec) if free > 0 else []
+            )
+            with self._lock:
+                self._held.update((task.id, task) for task in tasks)
+            for task in tasks:
+                self._dispatch(task)
+            claimed += len(tasks)
+
+            if not tasks and not self._inflight:
+                break
+            if tasks and len(self._inflight) < self.concurrency:
+                continue  # 还有空闲线程，继续领
+
+            done, _ = wait(
+                self._inflight, timeout=self.poll_interval, return_when=FIRST_COMPLETED
+            )
+            self._inflight -= done
+            for future in done:
+                if (error := future.exception()) is not None:
+                    LOGGER.error(f"worker 线程异常: {error!r}")
+        return claimed
+
+    def run(self) -> int:
+        LOGGER.info(f"worker 启动: {self.worker_id}, 并发: {self.concurrency}")
+        idle_since = time.monotonic()
+        if self.notifier is not None:
+            self.notifier.start()
+        self.server = self._start_server()
+
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="worker") as pool:
+            self._executor = pool
+            while not self._stop.is_set():
+                # 先记下版本再领任务，领取过程中新提交的任务下一次轮询就能发现
+                last_version = self._data_version()
+                last_scan = time.monotonic()
+                if self.drain() > 0:
+                    idle_since = time.monotonic()
+
+                while not self._stop.is_set():
+                    woken = self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+
+                    now = time.monotonic()
+                    if (
+                        self.idle_exit is not None
+                        and now - idle_since >= self.idle_exit
+                    ):
+                        LOGGER.info(f"空闲超过 {self.idle_exit}s，worker 退出")
+                        self._stop.set()
+                        break
+
+                    version = self._data_version()
+                    if woken or version != last_version:
+                        break
+                    if now - last_scan >= self.rescan_interval:
+                        break
+            # 退出 with 时等待正在处理的任务完成
+
+        LOGGER.info(f"worker 退出: 成功 {self.processed} 个, 失败 {self.failed} 个")
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        if self.notifier is not None:
+            self.notifier.stop()
+        dba.POOL.close_all()
+        return self.processed
+
+    def _renew_leases(self) -> None:
+        now = time.monotonic()
+        if now - self._renewed_at < self.lease_sec / 3:
+            return
+        self._renewed_at = now
+        with self._lock:
+            held = list(self._held.values())
+        if not held:
+            return
+        renewed = set(renew_tasks(held, self.worker_id, self.lease_sec))
+        lost = [task.id for task in held if task.id not in renewed]
+        if lost:
+            # 大多是刚处理完（状态已改）；真的过期被别人领走时，对方会重新处理
+            LOGGER.debug(f"续租时已不再持有的任务: {lost}")
+
+    def _forget(self, tasks: list[Task]) -> None:
+        with self._lock:
+            for task in tasks:
+                self._held.pop(task.id, None)
+
+    def _start_server(self) -> EnqueueServer | None:
+        if self.listen is None:
+            return None
+        server = EnqueueServer(self.listen, on_commit=lambda ids: self.wake())
+        try:
+            return server.start()
+        except OSError as e:
+            # 多半是另一个 worker 已经在服务；入队客户端会发给它，这里照常轮询数据库
+            LOGGER.warning(f"入队服务未启动({self.listen}): {e}")
+            return None
+
+    def install_signal_handlers(self) -> None:
+        """只能在主线程调用。"""
+
+        def _handler(signum: int, frame: FrameType | None) -> None:
+            LOGGER.info(f"收到信号 {signum}，处理完当前任务后退出")
+            self.stop()
+
+        for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                signal.signal(signum, _handler)
+
+    def _dispatch(self, task: Task) -> None:
+        key = series_lock_name(task)
+        with self._lock:
+            queue = self._series.get(key)
+            if queue is not None:
+                # 这部剧已经有线程在处理，排到它后面
+                queue.append(task)
+                return
+            self._series[key] = deque([task])
+
+        assert self._executor is not None, "run() 之外不能派发任务"
+        self._inflight.add(self._executor.submit(self._run_series, key))
+
+    def _run_series(self, key: str) -> None:
+        # 锁在后台续期，处理再久也不会过期；本进程崩溃的话一个 ttl 后别人可以接管
+        with hold_lock(key, ttl=SERIES_LOCK_TTL) as result:
+            if isinstance(result, Err):
+                # 另一个进程正在处理这部剧
+                with self._lock:
+                    tasks = list(self._series.pop(key))
+                LOGGER.info(
+                    f"{key} 正在被处理，{len(tasks)} 个任务放回队列: {result.error}"
+                )
+                release_tasks(tasks, self.worker_id)
+                self._forget(tasks)
+                return
+
+            lease = result.value
+            while True:
+                with self._lock:
+                    queue = self._series[key]
+                    if not queue or self._stop.is_set() or lease.lost.is_set():
+                        del self._series[key]
+                        leftover = list(queue)
+                        break
+                    task = queue.popleft()
+                self._process(task, lease)
+
+            if lease.lost.is_set() and leftover:
+                LOGGER.warning(f"{key} 的锁已被接管，{len(leftover)} 个任务放回队列")
+            if leftover:
+                release_tasks(leftover, self.worker_id)
+                self._forget(leftover)
+
+    def _process(self, task: Task, lease: Lease) -> None:
+        try:
+            process_task(task, lease)
+        except LeaseLostError as e:
+            # 这部剧已被别的进程接管：放弃这个任务，放回队列由新的持有者处理
+            self._forget([task])
+            LOGGER.warning(f"任务中止, ID: {task.id}: {e}")
+            release_tasks([task], self.worker_id)
+        except Exception:
+            # 先停止续租，再把租约改成退避时间（或标记为已失败）
+            self._forget([task])
+            with self._lock:
+                self.failed += 1
+            LOGGER.exception(f"任务处理失败, ID: {task.id}")
+            fail_task(task, self.worker_id)
+        else:
+            self._forget([task])
+            with self._lock:
+                self.processed += 1
+
+    @staticmethod
+    def _data_version() -> int:
+        # 只有其他连接提交了写入，data_version 才会变化，查询几乎没有开销
+        with dba.get_connection(None) as conn:
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def run_worker(
+    *,
+    concurrency: int = 4,
+    poll_interval: float = 2.0,
+    idle_exit: float | None = None,
+    listen: str | None = None,
+) -> int:
+    worker = Worker(
+        concurrency=concurrency,
+        poll_interval=poll_interval,
+        idle_exit=idle_exit,
+        notifier=sender_from_env(),
+        listen=listen,
+    )
+    worker.install_signal_handlers()
+    return worker.run()
@@ -0,0 +1,43 @@
+import argparse
+
+from tools.enqueue_client import enqueue_addr
+from tools.share import setup_logging
+from tools.worker import run_worker
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="常驻 worker：持续处理队列中的任务")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="同时处理的剧集数，同一部剧始终串行",
+    )
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument(
+        "--idle-exit",
+        type=float,
+        default=None,
+        help="空闲多少秒后退出，不传则一直常驻",
+    )
+    parser.add_argument(
+        "--listen",
+        default=enqueue_addr(),
+        help="入队服务地址（host:port 或 unix:路径），默认取 MY_QB_TOOLS_ENQUEUE_ADDR",
+    )
+    parser.add_argument(
+        "--no-listen", action="store_true", help="不开入队服务，只轮询数据库"
+    )
+    args = parser.parse_args()
+
+    run_worker(
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        idle_exit=args.idle_exit,
+        listen=None if args.no_listen or not args.listen else args.listen,
+    )
+
+
+if __name__ == "__main__":
+    main()
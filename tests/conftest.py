@@ -1,9 +1,23 @@
 import sys
+import tempfile
 from pathlib import Path
 
+import pytest
 
 # 将源码目录加入 sys.path，便于测试直接导入 src 下的包
 SRC = Path(__file__).resolve().parents[1] / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
+
+from tools import dba
+
+
+@pytest.fixture()
+def temp_pool(monkeypatch):
+    """用临时目录里的库替换 dba.POOL，每个测试一个全新的库。"""
+    with tempfile.TemporaryDirectory() as td:
+        pool = dba.ConnectionPool(Path(td) / "app.db")
+        monkeypatch.setattr(dba, "POOL", pool)
+        yield pool
+        pool.close_all()
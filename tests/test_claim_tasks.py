@@ -0,0 +1,60 @@
+import threading
+import time
+
+from tools import dba
+
+
+def _insert(n: int) -> list[int]:
+    tags = {"season": 1, "tmdb": {"id": 424242, "name": "Claim"}}
+    return [
+        dba.insert_task(f"claim-{i}", "test", tags, f"/tmp/claim-{i}").value
+        for i in range(n)
+    ]
+
+
+def test_claim_tasks_leases_oldest_first(temp_pool):
+    ids = _insert(3)
+
+    first = dba.claim_tasks("w1", limit=2).value
+    assert [t.id for t in first] == ids[:2]
+    assert all(t.status == 1 and t.worker_id == "w1" for t in first)
+    assert all(t.lease_expires_at and t.lease_expires_at > time.time() for t in first)
+
+    second = dba.claim_tasks("w2", limit=2).value
+    assert [t.id for t in second] == ids[2:]
+
+    assert dba.claim_tasks("w3").value == []
+
+
+def test_claim_tasks_reclaims_expired_lease(temp_pool):
+    [task_id] = _insert(1)
+
+    [task] = dba.claim_tasks("crashed", lease_sec=-1).value
+    assert task.id == task_id
+
+    [again] = dba.claim_tasks("alive").value
+    assert again.id == task_id and again.worker_id == "alive"
+    assert dba.renew_task_leases([task_id], "crashed").value == []
+    assert dba.renew_task_leases([task_id], "alive").value == [task_id]
+
+
+def test_concurrent_claims_never_overlap(temp_pool):
+    ids = _insert(20)
+    claimed: list[int] = []
+    lock = threading.Lock()
+
+    def _worker(worker_id: str):
+        while True:
+            tasks = dba.claim_tasks(worker_id, limit=3).value
+            if not tasks:
+                return
+            with lock:
+                claimed.extend(t.id for t in tasks)
+
+    threads = [threading.Thread(target=_worker, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == sorted(ids), "每个任务应恰好被领取一次"
@@ -0,0 +1,93 @@
+from tools.move import MOVE_FACTORY
+from tools.move.classifier import ClassifiedRule, Classifier, classify
+from tools.move.implementations import RULES
+from tools.move.rules import compile_rule, parse_rules
+
+
+def test_overlapping_rules_are_ordered():
+    name = "[字幕组] 凡人修仙传 - 120 [1080p].mkv"
+    assert classify(name) == ["tmdb-243224-s1", "tmdb-106449-s1"]
+
+
+def test_immortal_ascension_goes_to_243224():
+    # entry/script.txt 里的测试种子：目录名和其中的文件名都应归到 243224
+    names = [
+        (
+            "【测试脚本专用】凡人修仙传[60帧率版本][高码版][第27集][国语配音+中文字幕]"
+            ".2025.2160p.WEB-DL.H265.HQ.60fps.AAC-ColorTV"
+        ),
+        "凡人修仙传.The.Immortal.Ascension.S01E27.2025.2160p.WEB-DL.H265.HQ.60fps.AAC-ColorTV.mp4",
+    ]
+    for name in names:
+        assert classify(name)[0] == "tmdb-243224-s1", name
+
+
+def test_season_rule_beats_plain_rule():
+    keys = classify("My Hero Academia - S02E03.mkv")
+    assert keys[0] == "tmdb-65930-s2"
+    assert "tmdb-65930-s1" in keys
+    assert classify("Totally Unrelated Show - 01.mkv") == []
+
+
+def test_same_result_as_running_every_rule():
+    names = [
+        "[Nekomoe] SPY×FAMILY - 05 [1080p].mkv",
+        "Spy.x.Family.S02E01.mkv",
+        "我的英雄学院之非法英雄.S01E03.mkv",
+        "Dr.STONE S04E01.mkv",
+        "dr.stone S04E01.mkv",
+        "献鱼 第01集.mp4",
+        "ABO.mkv",
+    ]
+    for name in names:
+        brute = {rule.key for rule in RULES if rule.pattern.search(name)}
+        assert set(classify(name)) == brute, name
+
+
+def test_priority_and_rules_without_literals():
+    rules = parse_rules(
+        {
+            "rule": [
+                {"tmdb_id": 2, "season": 1, "aliases": ["Show"]},
+                {"tmdb_id": 1, "season": 1, "aliases": ["[Ss]how"], "priority": 1},
+                {"tmdb_id": 3, "season": 1, "aliases": ["Show{sep}Extra"]},
+            ]
+        }
+    )
+    classifier = Classifier(compile_rule(rule) for rule in rules)
+    assert classifier.classify("show extra 01.mkv") == [
+        "tmdb-1-s1",
+        "tmdb-2-s1",
+        "tmdb-3-s1",
+    ]
+    assert classifier.best("nothing.mkv") is None
+
+
+def test_mover_leaves_files_of_a_more_specific_season():
+    rules = parse_rules(
+        {
+            "rule": [
+                {"tmdb_id": 1, "season": 1, "aliases": ["Show"]},
+                {"tmdb_id": 1, "season": 2, "aliases": ["Show"], "season_marker": True},
+                {"tmdb_id": 1, "season": 3, "aliases": ["Show"]},
+                {"tmdb_id": 2, "season": 1, "aliases": ["Show"], "priority": 1},
+            ]
+        }
+    )
+    compiled = [compile_rule(rule) for rule in rules]
+    classifier = Classifier(compiled)
+    s1, s2, s3, other = (ClassifiedRule(rule, classifier) for rule in compiled)
+
+    assert s2.search("Show S02E01.mkv") and not s1.search("Show S02E01.mkv")
+    # 写法一样的两季分不出来，按任务的季标签；别的剧不参与裁决
+    assert s1.search("Show 01.mkv") and s3.search("Show 01.mkv")
+    assert other.search("Show S02E01.mkv")
+
+
+def test_registered_movers_use_the_classifier():
+    mover = MOVE_FACTORY.create("tmdb-65930-s1")
+    assert isinstance(mover.matcher, ClassifiedRule)
+    assert not mover.matcher.search("My Hero Academia - S02E03.mkv")
+    assert MOVE_FACTORY.create("tmdb-65930-s2").matcher.search(
+        "My Hero Academia - S02E03.mkv"
+    )
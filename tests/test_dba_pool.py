@@ -0,0 +1,63 @@
+import tempfile
+import threading
+from pathlib import Path
+
+from tools.dba import ConnectionPool
+from tools.meta import Task
+
+
+def test_pool_reuses_connection_per_thread():
+    with tempfile.TemporaryDirectory() as td:
+        pool = ConnectionPool(Path(td) / "data" / "app.db")
+        try:
+            with pool.connection() as c1:
+                pass
+            with pool.connection() as c2:
+                pass
+            assert c1 is c2, "同一线程应复用同一条连接"
+
+            others: list[object] = []
+
+            def _worker():
+                with pool.connection() as c3:
+                    others.append(c3)
+
+            t = threading.Thread(target=_worker)
+            t.start()
+            t.join()
+            assert others and others[0] is not c1, "不同线程不应共享连接"
+        finally:
+            pool.close_all()
+
+
+def test_pool_row_factory_and_rollback():
+    with tempfile.TemporaryDirectory() as td:
+        pool = ConnectionPool(Path(td) / "app.db")
+        try:
+            with pool.connection() as conn:
+                conn.execute(
+                    "INSERT INTO task (name, tags, content_path) VALUES (?, ?, ?)",
+                    ("ok", '{"season": 1, "tmdb": {"id": 1, "name": "x"}}', "/tmp/a"),
+                )
+
+            try:
+                with pool.connection() as conn:
+                    conn.execute(
+                        "INSERT INTO task (name, tags, content_path) VALUES (?, ?, ?)",
+                        ("rollback", "{}", "/tmp/b"),
+                    )
+                    raise RuntimeError("boom")
+            except RuntimeError:
+                pass
+
+            with pool.connection(Task.format_for_sqlite) as conn:
+                tasks = conn.execute("SELECT * FROM task").fetchall()
+            assert [t.name for t in tasks] == ["ok"], "异常退出应回滚"
+            assert isinstance(tasks[0], Task)
+
+            # row_factory 用完后恢复，不影响下一次借出
+            with pool.connection() as conn:
+                row = conn.execute("SELECT name FROM task").fetchone()
+            assert row == {"name": "ok"}
+        finally:
+            pool.close_all()
@@ -0,0 +1,147 @@
+import inspect
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from tools import dba
+from tools.enqueue_client import EnqueueRejected, send_enqueue
+from tools.enqueue_server import EnqueueServer, GroupCommitter
+
+
+def request(i: int) -> dict:
+    return {
+        "name": f"ipc-{i}",
+        "category": "test",
+        "tags": {"season": 1, "tmdb": {"id": 616161, "name": "IPC"}},
+        "content_path": f"/tmp/ipc-{i}",
+    }
+
+
+def test_concurrent_requests_are_group_committed(temp_pool):
+    committed: list[list[int]] = []
+    server = EnqueueServer(
+        "127.0.0.1:0", on_commit=committed.append, max_delay_sec=0.05
+    ).start()
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            ids = list(
+                pool.map(lambda i: send_enqueue(request(i), server.address), range(16))
+            )
+    finally:
+        server.stop()
+
+    assert len(set(ids)) == 16
+    assert sorted(i for batch in committed for i in batch) == sorted(ids)
+    # 同时到达的请求合并提交
+    assert server.committer.stats["commits"] < 16
+    for i, task_id in enumerate(ids):
+        task = dba.get_task_by_id(task_id).value
+        assert task is not None and task.name == f"ipc-{i}"
+
+
+def test_invalid_request_is_rejected(temp_pool):
+    server = EnqueueServer("127.0.0.1:0").start()
+    try:
+        with pytest.raises(EnqueueRejected):
+            send_enqueue({"name": "x"}, server.address)
+    finally:
+        server.stop()
+
+
+@pytest.mark.parametrize(
+    "tags",
+    [
+        {"season": 1},
+        {"season": "1", "tmdb": {"id": 1, "name": "x"}},
+        {"season": 1, "tmdb": {"name": "x"}},
+        {"season": 1, "tmdb": {"id": "1", "name": "x"}},
+    ],
+)
+def test_malformed_tags_are_rejected(temp_pool, tags):
+    server = EnqueueServer("127.0.0.1:0").start()
+    try:
+        with pytest.raises(EnqueueRejected):
+            send_enqueue({**request(0), "tags": tags}, server.address)
+    finally:
+        server.stop()
+    assert server.committer.stats["commits"] == 0
+
+
+def test_bad_request_does_not_fail_its_batch(temp_pool):
+    committer = GroupCommitter()
+    good = [(request(i), Future()) for i in range(3)]
+    bad = ({**request(9), "tags": {"season": 1}}, Future())
+    committer._commit([good[0], bad, good[1], good[2]])
+
+    with pytest.raises(KeyError):
+        bad[1].result(0)
+    ids = [future.result(0) for _, future in good]
+    assert [dba.get_task_by_id(i).value.name for i in ids] == [
+        "ipc-0",
+        "ipc-1",
+        "ipc-2",
+    ]
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix socket")
+def test_unix_socket_and_stale_socket_file(temp_pool):
+    with tempfile.TemporaryDirectory() as td:
+        addr = f"unix:{td}/enqueue.sock"
+        Path(td, "enqueue.sock").touch()  # 上次异常退出留下的
+
+        server = EnqueueServer(addr).start()
+        try:
+            assert send_enqueue(request(0), addr) > 0
+            # 已经有服务在跑时，第二个启动失败
+            with pytest.raises(OSError):
+                EnqueueServer(addr).start()
+        finally:
+            server.stop()
+        assert not Path(td, "enqueue.sock").exists()
+
+
+def test_client_raises_when_service_is_down():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(OSError):
+        send_enqueue(request(0), f"127.0.0.1:{port}", timeout=1.0)
+
+
+def test_worker_wakes_on_enqueue(temp_pool, monkeypatch):
+    from tools import worker
+
+    seen = threading.Event()
+
+    def fake_process(task, lease=None) -> None:
+        dba.update_task_status(task.id, 2)
+        seen.set()
+
+    monkeypatch.setattr(worker, "process_task", fake_process)
+    # 轮询间隔很长：能及时处理只能是被入队服务唤醒的
+    w = worker.Worker(poll_interval=30, rescan_interval=60, listen="127.0.0.1:0")
+    t = threading.Thread(target=w.run)
+    t.start()
+    try:
+        deadline = time.monotonic() + 5
+        while w.server is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert w.server is not None
+        send_enqueue(request(0), w.server.address)
+        assert seen.wait(5)
+    finally:
+        w.stop()
+        t.join(10)
+    assert not t.is_alive()
+
+
+def test_client_waits_longer_than_the_server_commit():
+    # 客户端先超时会改为直接写库，而服务端随后可能也写成功，导致重复入队
+    default = inspect.signature(send_enqueue).parameters["timeout"].default
+    server = inspect.signature(EnqueueServer).parameters["commit_timeout_sec"].default
+    assert default > server
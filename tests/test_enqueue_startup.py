@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+# qBittorrent 每完成一个种子就启动一次 enqueue.py，冷启动的导入时间不能回退
+BUDGET_MS = float(os.getenv("MY_QB_TOOLS_ENQUEUE_IMPORT_BUDGET_MS", "150"))
+
+# 入队用不到的重模块
+FORBIDDEN = (
+    "requests",
+    "dotenv",
+    "tools.service",
+    "tools.tmdb",
+    "tools.move",
+    "tools.commands",
+    "tools.enqueue_server",
+    "tools.share.tg_bot",
+    "tools.share.outbox",
+)
+
+
+def import_times(module: str) -> dict[str, int]:
+    """python -X importtime 的结果：模块名 -> 累计导入耗时（微秒）。"""
+    with tempfile.TemporaryDirectory() as td:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=td,
+            env={**os.environ, "PYTHONPATH": str(SRC)},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # import time:  self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_enqueue_imports_only_what_it_needs():
+    times = import_times("enqueue")
+    assert "tools.enqueue_client" in times
+    # 入队服务不可用时才导入 dba 直接写库
+    assert "tools.dba" not in times
+    loaded = sorted(name for name in times if name.startswith(FORBIDDEN))
+    assert loaded == []
+
+
+def test_enqueue_cold_start_within_budget():
+    # 取三次里最快的一次，减少机器抖动的影响
+    best = min(import_times("enqueue")["enqueue"] for _ in range(3)) / 1000
+    assert best < BUDGET_MS, f"enqueue 导入耗时 {best:.1f}ms，超过预算 {BUDGET_MS}ms"
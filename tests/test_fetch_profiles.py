@@ -0,0 +1,42 @@
+import pytest
+
+from tools import service
+
+
+def test_fetch_tvshows_profiles_control_appends(monkeypatch):
+    captured: list[tuple[str, int, dict]] = []
+
+    def fake_fetch_tmdb():
+        def _(kind: str, tmdb_id: int, **kwargs):
+            captured.append((kind, tmdb_id, kwargs))
+            return {"name": "x"}
+
+        return _
+
+    monkeypatch.setattr(service, "fetch_tmdb", fake_fetch_tmdb)
+
+    service.fetch_tvshows(1, profile="minimal")
+    service.fetch_tvshows(1, profile="naming")
+    service.fetch_tvshows(1)
+    service.fetch_movie(2, profile="minimal")
+
+    minimal, naming, full, movie = (kwargs for _, _, kwargs in captured)
+    assert minimal == {"language": "zh-CN"}
+    assert (
+        naming["append_to_response"] == "alternative_titles,translations,external_ids"
+    )
+    assert "watch_region" not in naming
+    assert "credits" in full["append_to_response"] and full["watch_region"] == "CN"
+    assert movie == {"language": "zh-CN"}
+
+    with pytest.raises(ValueError):
+        service.fetch_tvshows(1, profile="huge")  # type: ignore[arg-type]
+
+
+def test_show_name_lookup_uses_minimal_profile(monkeypatch):
+    def fake_fetch_tvshows(tmdb_id: int, **kwargs):
+        assert kwargs.get("profile") == "minimal"
+        return {"name": "Fake Show"}
+
+    monkeypatch.setattr(service, "fetch_tvshows", fake_fetch_tvshows)
+    assert service.get_tv_show_name_by_id(7) == "Fake Show"
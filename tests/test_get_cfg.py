@@ -12,7 +12,7 @@ def test_get_cfg_roundtrip():
     assert task_id is not None
 
     # 插入 cfg，与上述 tmdb/season 对应
-    default_cfg = {"category_mapping": {"电视剧": str("/tmp/library")}}
+    default_cfg = {"category_mapping": {"电视剧": "/tmp/library"}}
     dba.insert_cfg(season=1, tmdb_id=987654, cfg=default_cfg)
 
     # Act: 读取任务，调用 get_cfg
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+from tools import dba
+from tools.dba import normalize_content_path, path_contains
+
+
+def task(
+    path: str, tmdb_id: int = 243224, season: int = 1, category: str = "电视剧"
+) -> dict:
+    return {
+        "name": Path(path.replace("\\", "/")).name,
+        "category": category,
+        "tags": {"season": season, "tmdb": {"id": tmdb_id, "name": "凡人修仙传"}},
+        "content_path": path,
+    }
+
+
+def statuses() -> dict[int, int]:
+    with dba.get_connection() as conn:
+        return {
+            row["id"]: row["status"]
+            for row in conn.execute("SELECT id, status FROM task")
+        }
+
+
+FOLDER = r"Y:\Downloader\Downloads\电视剧\凡人修仙传[第27集]"
+FILE = FOLDER + r"\凡人修仙传.S01E27.mp4"
+
+
+def test_normalize_and_contains():
+    assert normalize_content_path("Y:\\a\\\\b\\") == "y:/a/b"
+    # Windows 上路径不分大小写，也可能混用 / 和 \\
+    assert normalize_content_path("Y:/A\\.\\c\\..\\B") == "y:/a/b"
+    assert normalize_content_path("/a/./c/../B/") == "/a/B"
+    assert normalize_content_path("\\\\nuc\\d\\x") == "//nuc/d/x"
+    assert normalize_content_path("/") == "/"
+    assert path_contains("/a/b", "/a/b/c.mkv")
+    assert path_contains("/a/b", "/a/b")
+    assert not path_contains("/a/b", "/a/bc")
+
+
+def test_file_inside_pending_folder_is_collapsed(temp_pool):
+    [folder] = dba.insert_tasks([task(FOLDER)]).value
+    # 同一个种子先触发目录再触发其中的文件（entry/script.txt 里的用法）
+    assert dba.insert_tasks([task(FILE), task(FOLDER + "\\")]).value == [folder, folder]
+    assert statuses() == {folder: 0}
+
+
+def test_folder_cancels_pending_file(temp_pool):
+    [file_task] = dba.insert_tasks([task(FILE)]).value
+    [folder] = dba.insert_tasks([task(FOLDER)]).value
+    assert statuses() == {file_task: 3, folder: 0}
+
+
+def test_collapse_within_one_batch(temp_pool):
+    ids = dba.insert_tasks([task(FILE), task(FOLDER), task(FILE)]).value
+    assert len(set(ids)) == 1
+    assert statuses() == {ids[0]: 0}
+
+
+def test_other_series_and_non_pending_tasks_are_kept(temp_pool):
+    [done] = dba.insert_tasks([task(FOLDER)]).value
+    dba.update_task_status(done, 2)
+
+    ids = dba.insert_tasks(
+        [task(FILE), task(FILE, season=2), task(FILE, tmdb_id=1)]
+    ).value
+    assert len(set(ids)) == 3 and done not in ids
+    assert statuses() == {done: 2, **{i: 0 for i in ids}}
+    for i, expected in zip(ids, ("凡人修仙传.S01E27.mp4",) * 3):
+        found = dba.get_task_by_id(i).value
+        assert found is not None and found.name == expected
+
+
+def test_windows_paths_match_regardless_of_case(temp_pool):
+    [folder] = dba.insert_tasks([task(FOLDER)]).value
+    assert dba.insert_tasks([task(FILE.upper().replace("Y:", "y:"))]).value == [folder]
+
+
+def test_other_category_is_not_a_duplicate(temp_pool):
+    [file_task] = dba.insert_tasks([task(FILE)]).value
+    [folder] = dba.insert_tasks([task(FOLDER, category="动漫")]).value
+    assert folder != file_task
+    assert statuses() == {file_task: 0, folder: 0}
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from pathlib import Path
+
+from tools.share import find_files_by_regex, iter_files_by_regex
+
+
+def make_tree(root: Path) -> None:
+    for rel in [
+        "Show - 01.mkv",
+        "Show - 01.ass",
+        "Season 1/Show - 02.mkv",
+        "Season 1/extras/Show - NCOP.mkv",
+        "Season 2/deep/er/Show - 13.mkv",
+        "@eaDir/Show - 01.mkv",
+    ]:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+    os.symlink(root / "Season 2", root / "link-to-season-2")
+
+
+def walk_reference(root: Path, regex: str) -> list[Path]:
+    import re
+
+    result = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "@eaDir"]
+        for fname in filenames:
+            if re.search(regex, fname):
+                result.append(Path(dirpath) / fname)
+    return result
+
+
+def test_same_order_as_os_walk():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root)
+
+        found = find_files_by_regex(
+            root, r"\.mkv$", ignore_dirs=["^@eaDir$"], workers=1
+        )
+        assert found == walk_reference(root, r"\.mkv$")
+        assert len(found) == 4  # 符号链接指向的目录不进入
+
+
+def test_parallel_walk_and_match_on():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root)
+
+        serial = set(iter_files_by_regex(root, r"\.mkv$", workers=1))
+        parallel = set(iter_files_by_regex(root, r"\.mkv$", workers=4))
+        assert serial == parallel
+
+        relative = set(
+            iter_files_by_regex(
+                root,
+                r"^Season 1/.*\.mkv$",
+                match_on="relative",
+                return_str=True,
+                workers=4,
+            )
+        )
+        assert relative == {
+            str(root / "Season 1" / "Show - 02.mkv"),
+            str(root / "Season 1" / "extras" / "Show - NCOP.mkv"),
+        }
+
+        followed = find_files_by_regex(root, r"13\.mkv$", follow_symlinks=True)
+        assert len(followed) == 2
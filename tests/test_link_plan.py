@@ -0,0 +1,168 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tools import dba
+from tools.move import journal, linking
+from tools.move.implementations import default_move
+
+
+@pytest.fixture()
+def dirs():
+    with tempfile.TemporaryDirectory() as td:
+        src = Path(td) / "src"
+        dst = Path(td) / "dst"
+        src.mkdir()
+        dst.mkdir()
+        for i in range(1, 4):
+            (src / f"Show - 0{i}.mkv").write_text(str(i))
+        (src / "readme.txt").write_text("x")
+        yield src, dst
+
+
+def test_crashed_run_resumes_from_first_undone(temp_pool, dirs, monkeypatch):
+    src, dst = dirs
+    mover = default_move(r"\.mkv$")
+
+    plan = list(journal.plan_links(1, mover, src, dst))
+    assert len(plan) == 3
+    assert all(op["status"] == journal.PENDING for op in plan)
+
+    real_link_file = linking.link_file
+    calls = []
+
+    def crash_on_second(source, to, strategies=None):
+        calls.append(source.name)
+        if source.name == "Show - 02.mkv":
+            raise RuntimeError("进程被杀")
+        return real_link_file(source, to, strategies)
+
+    monkeypatch.setattr(linking, "link_file", crash_on_second)
+    with pytest.raises(RuntimeError):
+        journal.execute_plan(1)
+    monkeypatch.setattr(linking, "link_file", real_link_file)
+
+    # 出错前已经提交的操作照常做完并记录，只有出错的那条还是待执行
+    statuses = {op["source"]: op["status"] for op in dba.get_link_plan(1).value}
+    assert statuses[str(src / "Show - 02.mkv")] == journal.PENDING
+    pending = sum(1 for status in statuses.values() if status == journal.PENDING)
+
+    # 重跑：沿用已有计划，只执行剩下的；重新遍历时已在计划里的文件不会再追加
+    resumed = list(journal.plan_links(1, mover, src, dst))
+    assert resumed == [
+        op for op in dba.get_link_plan(1).value if op["status"] == journal.PENDING
+    ]
+    assert len(dba.get_link_plan(1).value) == 3
+    results = journal.execute_plan(1, resumed)
+    assert len(results) == pending
+    assert [op["status"] for op in dba.get_link_plan(1).value] == [journal.LINKED] * 3
+    assert {op["strategy"] for op in dba.get_link_plan(1).value} == {"hardlink"}
+
+
+def test_rollback_only_removes_links_created_by_task(temp_pool, dirs):
+    src, dst = dirs
+    (dst / "Show - 01.mkv").write_text("别的文件")
+
+    journal.execute_plan(7, journal.plan_links(7, default_move(r"\.mkv$"), src, dst))
+    statuses = sorted(op["status"] for op in dba.get_link_plan(7).value)
+    assert statuses == [journal.LINKED, journal.LINKED, journal.CONFLICT]
+
+    assert journal.rollback(7) == 2
+    assert sorted(os.listdir(dst)) == ["Show - 01.mkv"]
+    assert (dst / "Show - 01.mkv").read_text() == "别的文件"
+    assert "已回滚" in journal.format_plan(dba.get_link_plan(7).value)
+
+
+def test_dry_run_plan_does_not_touch_anything(temp_pool, dirs):
+    src, dst = dirs
+    target = dst / "Show" / "Season 1"
+
+    ops = default_move(r"\.mkv$").plan(src, target)
+    assert [op.destination for op in ops] == [
+        target / f"Show - 0{i}.mkv" for i in range(1, 4)
+    ]
+    assert not target.exists()
+    assert dba.get_link_plan(1).value == []
+    assert "预演" in journal.format_plan(ops)
+
+
+def test_move_file_streams_plan_in_batches(temp_pool, monkeypatch):
+    from tools import service
+    from tools.meta import TMDB, Cfg, Tags, Task
+    from tools.move.implementations import RuleMover
+
+    monkeypatch.setattr(journal, "PLAN_BATCH", 2)
+    monkeypatch.setattr(service, "get_tv_show_name_by_id", lambda tmdb_id: "Show")
+    monkeypatch.setattr(service, "ensure_tvshow_nfo_in_dir", lambda *args: None)
+
+    def no_full_plan(self, where, to):
+        raise AssertionError("move_file 不应等整个目录走完再计划")
+
+    monkeypatch.setattr(RuleMover, "plan", no_full_plan)
+
+    planned_at_first_link: list[int] = []
+    real_link_file = linking.link_file
+
+    def record(source, to, strategies=None):
+        if not planned_at_first_link:
+            planned_at_first_link.append(len(dba.get_link_plan(3).value))
+        return real_link_file(source, to, strategies)
+
+    monkeypatch.setattr(linking, "link_file", record)
+
+    with tempfile.TemporaryDirectory() as td:
+        src, library = Path(td) / "src", Path(td) / "library"
+        src.mkdir()
+        for i in range(40):
+            (src / f"Show - {i:02d}.mkv").write_text(str(i))
+        task = Task(
+            id=3,
+            name="Show",
+            category="test",
+            tags=Tags(season=1, tmdb=TMDB(id=99, name="Show")),
+            content_path=str(src),
+            status=1,
+            created_at=0,
+            updated_at=0,
+        )
+        cfg = Cfg(
+            id=0,
+            season=1,
+            tmdb_id=99,
+            cfg={
+                "category_mapping": {"test": str(library)},
+                "mover": {"aliases": ["Show"]},
+            },
+        )
+
+        service.move_file(task, cfg)
+
+        plan = dba.get_link_plan(3).value
+        assert [op["seq"] for op in plan] == list(range(40))
+        assert {op["status"] for op in plan} == {journal.LINKED}
+        assert len(list((library / "Show" / "Season 1").iterdir())) == 40
+    # 第一个链接开始时只写入了前面几批计划
+    assert planned_at_first_link[0] < 40
+
+
+def test_results_are_recorded_per_batch(temp_pool, dirs, monkeypatch):
+    src, dst = dirs
+    lease = dba.acquire_lock("series:batch", ttl=60).value
+    monkeypatch.setattr(journal, "PLAN_BATCH", 2)
+    checks = []
+    real_ensure_lease = dba.ensure_lease
+
+    def counting_ensure_lease(held):
+        checks.append(held.name)
+        real_ensure_lease(held)
+
+    monkeypatch.setattr(dba, "ensure_lease", counting_ensure_lease)
+
+    ops = journal.plan_links(1, default_move(r"\.mkv$"), src, dst, lease=lease)
+    assert len(journal.execute_plan(1, ops, lease)) == 3
+
+    # 计划 2 批、结果 2 批，每批一次检查，而不是每个文件一次
+    assert len(checks) == 4
+    assert [op["status"] for op in dba.get_link_plan(1).value] == [journal.LINKED] * 3
@@ -0,0 +1,149 @@
+import errno
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tools.move import linking
+from tools.move.linking import link_file
+
+
+@pytest.fixture
+def dirs():
+    linking.clear_strategy_cache()
+    with tempfile.TemporaryDirectory() as td:
+        src = Path(td) / "src"
+        dst = Path(td) / "dst"
+        src.mkdir()
+        dst.mkdir()
+        yield src, dst
+    linking.clear_strategy_cache()
+
+
+def test_falls_back_and_caches_per_device_pair(dirs, monkeypatch):
+    src, dst = dirs
+    calls: list[str] = []
+
+    def cross_device(source, destination):
+        calls.append("hardlink")
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def no_reflink(source, destination):
+        calls.append("reflink")
+        raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    monkeypatch.setitem(linking.STRATEGY_FUNCS, "hardlink", cross_device)
+    monkeypatch.setitem(linking.STRATEGY_FUNCS, "reflink", no_reflink)
+
+    for name in ("a.mkv", "b.mkv"):
+        (src / name).write_bytes(name.encode() * 1000)
+    results = [
+        link_file(src / n, dst, ("hardlink", "reflink", "copy"))
+        for n in ("a.mkv", "b.mkv")
+    ]
+
+    assert [r.strategy for r in results] == ["copy", "copy"]
+    # 只有第一个文件探测了 hardlink / reflink
+    assert calls == ["hardlink", "reflink"]
+    assert (dst / "b.mkv").read_bytes() == b"b.mkv" * 1000
+    assert not list(dst.glob(".*.part"))
+
+    # 复制的文件保留了 mtime，重跑时识别为已完成
+    assert (
+        link_file(src / "a.mkv", dst, ("hardlink", "reflink", "copy")).status
+        == "skipped"
+    )
+
+
+def test_symlink_strategy_and_rerun(dirs):
+    src, dst = dirs
+    (src / "a.mkv").write_text("a")
+
+    first = link_file(src / "a.mkv", dst, ("symlink",))
+    assert first.status == "linked" and first.strategy == "symlink"
+    assert os.path.islink(dst / "a.mkv")
+    assert link_file(src / "a.mkv", dst, ("symlink",)).status == "skipped"
+
+
+def test_no_strategy_left_raises(dirs, monkeypatch):
+    src, dst = dirs
+    (src / "a.mkv").write_text("a")
+
+    def cross_device(source, destination):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setitem(linking.STRATEGY_FUNCS, "hardlink", cross_device)
+    with pytest.raises(OSError):
+        link_file(src / "a.mkv", dst, ("hardlink",))
+
+
+def test_link_many_streams_with_bounded_window(dirs):
+    src, dst = dirs
+    for i in range(20):
+        (src / f"{i:02d}.mkv").write_text(str(i))
+
+    pulled = 0
+    max_ahead = 0
+    done = 0
+
+    def ops():
+        nonlocal pulled, max_ahead
+        for path in sorted(src.iterdir()):
+            pulled += 1
+            max_ahead = max(max_ahead, pulled - done)
+            yield linking.LinkOp(path, dst / path.name)
+
+    for op, result in linking.link_many(ops(), workers=2):
+        done += 1
+        assert result.status == "linked"
+        assert os.stat(result.destination).st_ino == os.stat(op.source).st_ino
+
+    assert done == 20
+    # 最多只比已完成的多取 2 * workers 个
+    assert max_ahead <= 4 + 1
+
+
+def test_parse_strategies_rejects_unknown_names():
+    assert linking.parse_strategies(" copy, hardlink ,copy,") == ("copy", "hardlink")
+    with pytest.raises(ValueError, match="hardlnk"):
+        linking.parse_strategies("hardlnk,copy")
+    with pytest.raises(ValueError):
+        linking.parse_strategies(" , ")
+
+
+def test_eperm_falls_back_for_that_file_only(dirs, monkeypatch):
+    src, dst = dirs
+    calls: list[str] = []
+    real_hardlink = linking.STRATEGY_FUNCS["hardlink"]
+
+    def not_owner(source, destination):
+        calls.append(source.name)
+        if source.name == "a.mkv":
+            # 比如 fs.protected_hardlinks 拒绝了不属于当前用户的文件
+            raise OSError(errno.EPERM, "Operation not permitted")
+        real_hardlink(source, destination)
+
+    monkeypatch.setitem(linking.STRATEGY_FUNCS, "hardlink", not_owner)
+    for name in ("a.mkv", "b.mkv"):
+        (src / name).write_text(name)
+    strategies = ("hardlink", "copy")
+    results = [link_file(src / n, dst, strategies) for n in ("a.mkv", "b.mkv")]
+
+    # a 改为复制，但这对设备没有被降级，b 照常硬链接
+    assert [r.strategy for r in results] == ["copy", "hardlink"]
+    assert calls == ["a.mkv", "b.mkv"]
+
+
+def test_coarse_mtime_falls_back_to_comparing_content(dirs):
+    src, dst = dirs
+    (src / "a.mkv").write_text("a")
+    (dst / "a.mkv").write_text("a")
+    # FAT / SMB 上 mtime 只精确到 2 秒
+    mtime_ns = (src / "a.mkv").stat().st_mtime_ns
+    os.utime(dst / "a.mkv", ns=(mtime_ns, mtime_ns - mtime_ns % 2_000_000_000))
+
+    assert link_file(src / "a.mkv", dst, ("copy",)).status == "skipped"
+    (dst / "a.mkv").write_text("b")
+    os.utime(dst / "a.mkv", ns=(mtime_ns, mtime_ns - mtime_ns % 2_000_000_000))
+    assert link_file(src / "a.mkv", dst, ("copy",)).status == "conflict"
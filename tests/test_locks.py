@@ -0,0 +1,149 @@
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from tools import dba, worker
+from tools.dba import (
+    LeaseLostError,
+    LockNotExpiredError,
+    acquire_lock,
+    hold_lock,
+    is_current_lease,
+)
+from tools.move import journal
+from tools.move.implementations import default_move
+from tools.share.result import Err, Ok
+
+
+def expire(name: str) -> None:
+    """模拟持有者崩溃：锁还在，但已经过期。"""
+    with dba.get_connection() as conn:
+        conn.execute(
+            "UPDATE locks SET expires_at = 0 WHERE name = ? AND is_locked = 1", (name,)
+        )
+
+
+def test_busy_lock_returns_error_without_leaving_transaction(temp_pool):
+    first = acquire_lock("busy", ttl=60)
+    assert isinstance(first, Ok)
+
+    second = acquire_lock("busy", ttl=60)
+    assert isinstance(second, Err) and isinstance(second.error, LockNotExpiredError)
+    with dba.get_connection() as conn:
+        assert not conn.in_transaction
+
+
+def test_expired_lock_is_taken_over_with_higher_fence(temp_pool):
+    old = acquire_lock("series", ttl=60).value
+    expire("series")
+
+    new = acquire_lock("series", ttl=60)
+    assert isinstance(new, Ok)
+    assert new.value.fence > old.fence
+    assert is_current_lease(new.value)
+    assert not is_current_lease(old)
+    # 旧持有者续期失败
+    assert isinstance(dba.renew_lock(old), Err)
+
+
+def test_heartbeat_keeps_lock_past_ttl(temp_pool):
+    with hold_lock("long", ttl=2) as result:
+        assert isinstance(result, Ok)
+        time.sleep(3)
+        assert isinstance(acquire_lock("long", ttl=2), Err)
+        assert not result.value.lost.is_set()
+    # 退出后已释放
+    assert isinstance(acquire_lock("long", ttl=2), Ok)
+
+
+def test_lost_lease_is_flagged(temp_pool):
+    with hold_lock("lost", ttl=3) as result:
+        lease = result.value  # type: ignore[union-attr]
+        expire("lost")
+        assert isinstance(acquire_lock("lost", ttl=60), Ok)
+        assert lease.lost.wait(5)
+    # 被接管后退出 hold_lock 不会释放新持有者的锁
+    assert isinstance(acquire_lock("lost", ttl=60), Err)
+
+
+def test_expired_series_lock_does_not_block_claim(temp_pool):
+    tags = {"season": 1, "tmdb": {"id": 717171, "name": "Lock"}}
+    task_id = dba.insert_task("lock", "test", tags, "/tmp/lock").value
+    acquire_lock(dba.series_lock_name(717171, 1), ttl=60)
+    assert dba.claim_tasks("w").value == []
+
+    expire(dba.series_lock_name(717171, 1))
+    assert [task.id for task in dba.claim_tasks("w").value] == [task_id]
+
+
+def insert_task(name: str = "fenced") -> int:
+    tags = {"season": 1, "tmdb": {"id": 737373, "name": "Fence"}}
+    task_id = dba.insert_task(name, "test", tags, f"/tmp/{name}").value
+    assert task_id is not None
+    return task_id
+
+
+def take_over(name: str) -> dba.Lease:
+    expire(name)
+    return acquire_lock(name, ttl=60).value  # type: ignore[return-value]
+
+
+def test_stale_lease_cannot_update_task_status(temp_pool):
+    task_id = insert_task()
+    old = acquire_lock("series:fence", ttl=60).value
+    take_over("series:fence")
+
+    with pytest.raises(LeaseLostError):
+        dba.update_task_status(task_id, 2, old)
+    assert old.lost.is_set()
+    assert dba.get_task_by_id(task_id).value.status == 0
+
+
+def test_execute_plan_stops_when_lease_is_taken_over(temp_pool):
+    old = acquire_lock("series:fence", ttl=60).value
+    with tempfile.TemporaryDirectory() as td:
+        src, dst = Path(td) / "src", Path(td) / "dst"
+        src.mkdir()
+        dst.mkdir()
+        for i in range(5):
+            (src / f"Show - {i}.mkv").write_text(str(i))
+        ops = journal.plan_links(1, default_move(r"\.mkv$"), src, dst, lease=old)
+
+        new = take_over("series:fence")
+        with pytest.raises(LeaseLostError):
+            journal.execute_plan(1, ops, old)
+        assert list(dst.iterdir()) == []
+
+        # 新的持有者照常执行
+        ops = journal.plan_links(1, default_move(r"\.mkv$"), src, dst, lease=new)
+        assert len(journal.execute_plan(1, ops, new)) == 5
+
+
+def test_worker_aborts_task_when_series_is_taken_over(temp_pool, monkeypatch):
+    task_id = insert_task()
+    aborted = threading.Event()
+
+    def stalled_process(task, lease) -> None:
+        # 处理过程中卡住太久，锁被别的进程接管
+        take_over(lease.name)
+        try:
+            dba.update_task_status(task.id, 2, lease)
+        finally:
+            aborted.set()
+
+    monkeypatch.setattr(worker, "process_task", stalled_process)
+    w = worker.Worker(poll_interval=0.05, rescan_interval=60)
+    t = threading.Thread(target=w.run)
+    t.start()
+    assert aborted.wait(5)
+    w.stop()
+    t.join(5)
+    assert not t.is_alive()
+
+    task = dba.get_task_by_id(task_id).value
+    # 没有标记完成，放回队列给新的持有者
+    assert task.status == 0 and task.worker_id is None
+    assert w.processed == 0 and w.failed == 0
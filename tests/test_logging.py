@@ -0,0 +1,42 @@
+import logging
+import logging.handlers
+import tempfile
+from pathlib import Path
+
+from tools import share
+
+
+def test_setup_logging_routes_records_through_queue(monkeypatch):
+    root = logging.getLogger()
+    before = list(root.handlers)
+    with tempfile.TemporaryDirectory() as td:
+        log_file = Path(td) / "app.log"
+        monkeypatch.setenv("MY_QB_TOOLS_LOG_FILE", str(log_file))
+        monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "token")
+        monkeypatch.setenv("TELEGRAM_CHAT_ID", "chat")
+        try:
+            share.setup_logging(network=False)
+            share.setup_logging(network=False)  # 重复调用无效
+
+            added = [h for h in root.handlers if h not in before]
+            assert len(added) == 1
+            assert isinstance(added[0], logging.handlers.QueueHandler)
+            # network=False 不挂 TG 相关的 handler
+            assert share._listener is not None
+            assert [type(h).__name__ for h in share._listener.handlers] == [
+                "StreamHandler",
+                "RotatingFileHandler",
+            ]
+
+            share.LOGGER.info("经过队列写入文件")
+        finally:
+            listener = share._listener
+            share._stop_listener()
+            for handler in root.handlers[:]:
+                if handler not in before:
+                    root.removeHandler(handler)
+            if listener is not None:
+                for handler in listener.handlers:
+                    handler.close()
+
+        assert "经过队列写入文件" in log_file.read_text(encoding="utf-8")
@@ -0,0 +1,69 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from tools.dba import SCHEMA, ConnectionPool, execute_statements, schema_version
+
+
+def _index_names(conn: sqlite3.Connection) -> set[str]:
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    return {row[0] for row in rows}
+
+
+def test_fresh_database_is_at_latest_version():
+    with tempfile.TemporaryDirectory() as td:
+        pool = ConnectionPool(Path(td) / "app.db")
+        try:
+            with pool.connection(None) as conn:
+                assert (
+                    conn.execute("PRAGMA user_version").fetchone()[0]
+                    == schema_version()
+                )
+                assert {"idx_task_pending", "ux_cfg_tmdb_season"} <= _index_names(conn)
+        finally:
+            pool.close_all()
+
+
+def test_legacy_database_is_upgraded_and_cfg_deduplicated():
+    with tempfile.TemporaryDirectory() as td:
+        db_file = Path(td) / "app.db"
+
+        # 模拟引入迁移之前的库：user_version = 0，cfg 里有并发插入的重复行
+        legacy = sqlite3.connect(db_file)
+        execute_statements(legacy, SCHEMA)
+        legacy.executemany(
+            "INSERT INTO cfg (season, tmdb_id, cfg) VALUES (?, ?, ?)",
+            [(1, 100, '{"v": "first"}'), (1, 100, '{"v": "dup"}'), (2, 100, "{}")],
+        )
+        legacy.execute(
+            "INSERT INTO task (name, tags, content_path) VALUES ('old', '{}', '/tmp/x')"
+        )
+        legacy.commit()
+        legacy.close()
+
+        pool = ConnectionPool(db_file)
+        try:
+            with pool.connection(None) as conn:
+                assert (
+                    conn.execute("PRAGMA user_version").fetchone()[0]
+                    == schema_version()
+                )
+                rows = conn.execute(
+                    "SELECT season, cfg FROM cfg ORDER BY season, id"
+                ).fetchall()
+                assert rows == [(1, '{"v": "first"}'), (2, "{}")]
+
+                task = conn.execute(
+                    "SELECT name, worker_id, lease_expires_at FROM task"
+                ).fetchone()
+                assert task == ("old", None, None)
+
+                try:
+                    conn.execute(
+                        "INSERT INTO cfg (season, tmdb_id, cfg) VALUES (1, 100, '{}')"
+                    )
+                    raise AssertionError("(tmdb_id, season) 应该唯一")
+                except sqlite3.IntegrityError:
+                    pass
+        finally:
+            pool.close_all()
@@ -2,7 +2,7 @@ import os
 import tempfile
 from pathlib import Path
 
-from tools.move.implementations import hardlink
+from tools.move.implementations import default_move, hardlink
 
 
 def test_hardlink_creates_link():
@@ -27,3 +27,25 @@ def test_hardlink_creates_link():
         dst_stat = os.stat(dst_file)
         assert src_stat.st_ino == dst_stat.st_ino, "不是硬链接（inode 不一致）"
         assert dst_file.read_text(encoding="utf-8") == "hello"
+
+
+def test_hardlink_rerun_skips_existing_and_reports_conflicts():
+    with tempfile.TemporaryDirectory() as td:
+        tmp = Path(td)
+        src_dir = tmp / "src"
+        dst_dir = tmp / "dst"
+        src_dir.mkdir()
+        dst_dir.mkdir()
+        for name in ("a.mkv", "b.mkv", "c.mkv"):
+            (src_dir / name).write_text(name, encoding="utf-8")
+
+        # 模拟上次跑到一半：a 已经链接好，b 的位置被别的文件占了
+        hardlink(src_dir / "a.mkv", dst_dir)
+        (dst_dir / "b.mkv").write_text("other", encoding="utf-8")
+
+        results = default_move(r"\.mkv$")(src_dir, dst_dir)
+
+        status = {r.source.name: r.status for r in results}
+        assert status == {"a.mkv": "skipped", "b.mkv": "conflict", "c.mkv": "linked"}
+        assert (dst_dir / "b.mkv").read_text(encoding="utf-8") == "other"
+        assert os.stat(dst_dir / "c.mkv").st_ino == os.stat(src_dir / "c.mkv").st_ino
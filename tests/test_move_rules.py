@@ -0,0 +1,144 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tools.move import MOVE_FACTORY, mover_from_cfg
+from tools.move.implementations import RULES
+from tools.move.rules import Rule, compile_rule, parse_rules
+
+
+def test_rules_are_registered():
+    keys = {rule.key for rule in RULES}
+    assert "tmdb-65930-s2" in keys
+    for key in keys:
+        assert MOVE_FACTORY.create(key) is not None
+
+
+def test_season_marker_and_exclude():
+    rules = parse_rules(
+        {
+            "alias_groups": {"show": ["Some{sep}Show"]},
+            "rule": [
+                {"tmdb_id": 1, "season": 1, "alias_group": "show", "exclude": ["S0?2"]},
+                {
+                    "tmdb_id": 1,
+                    "season": 2,
+                    "alias_group": "show",
+                    "season_marker": True,
+                },
+            ],
+        }
+    )
+    s1, s2 = (compile_rule(rule).pattern for rule in rules)
+
+    assert s1.search("Some.Show.S01E01.mkv")
+    assert not s1.search("Some.Show.S02E01.mkv")
+    assert s2.search("Some Show 第二季 01.mkv")
+    assert s2.search("Some_Show 2nd Season - 01.mkv")
+    assert not s2.search("Some Show - 01.mkv")
+
+
+def test_rule_validation():
+    with pytest.raises(ValueError):
+        Rule.from_dict({"tmdb_id": 1, "season": 1})
+    with pytest.raises(ValueError):
+        Rule.from_dict({"tmdb_id": 1, "season": 1, "aliases": ["a"], "typo": 1})
+    with pytest.raises(ValueError):
+        parse_rules({"rule": [{"tmdb_id": 1, "season": 1, "aliases": ["a"]}] * 2})
+
+
+def test_mover_from_cfg():
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "src"
+        dst = Path(tmp) / "dst"
+        src.mkdir()
+        dst.mkdir()
+        (src / "小城日常 - 01.mkv").write_text("x")
+        (src / "别的剧 - 01.mkv").write_text("x")
+
+        mover = mover_from_cfg(
+            272118, 1, {"aliases": ["小城日常"], "ignore_case": False}
+        )
+        assert mover is mover_from_cfg(
+            272118, 1, {"ignore_case": False, "aliases": ["小城日常"]}
+        )
+        mover(src, dst)
+
+        assert [p.name for p in dst.iterdir()] == ["小城日常 - 01.mkv"]
+
+
+def test_prefilter_skips_non_candidates():
+    (rule,) = parse_rules(
+        {
+            "rule": [
+                {
+                    "tmdb_id": 1,
+                    "season": 2,
+                    "aliases": ["My{sep}Hero{sep}Academia", "我的英雄[学學]院"],
+                    "season_marker": True,
+                }
+            ]
+        }
+    )
+    compiled = compile_rule(rule)
+    assert compiled.literals == ("academia", "我的英雄学院", "我的英雄學院")
+
+    names = [
+        "MY.HERO.ACADEMIA.S02E01.mkv",
+        "我的英雄學院 第二季 01.mkv",
+        "My Hero Academia S01E01.mkv",
+        "Another Show S02E01.mkv",
+        "readme.txt",
+    ]
+    assert [bool(compiled.search(n)) for n in names] == [
+        True,
+        True,
+        False,
+        False,
+        False,
+    ]
+    for name in names:
+        assert bool(compiled.search(name)) == bool(compiled.pattern.search(name))
+    assert compiled.stats["skipped"] == 4
+    assert compiled.stats["matched"] == 4
+
+
+def test_prefilter_is_disabled_without_literals():
+    rule = Rule.from_dict({"tmdb_id": 1, "season": 1, "aliases": ["\\d+", "Show"]})
+    assert compile_rule(rule).literals is None
+
+
+def test_prefilter_is_disabled_when_regex_parser_fails(monkeypatch):
+    from tools.move import rules
+
+    def broken_parse(*args):
+        raise AttributeError("_parser 的结构变了")
+
+    monkeypatch.setattr(rules.sre_parse, "parse", broken_parse)
+    compiled = compile_rule(
+        Rule.from_dict({"tmdb_id": 1, "season": 1, "aliases": ["Show"]})
+    )
+    assert compiled.literals is None
+    assert compiled.search("Show - 01.mkv")
+
+    monkeypatch.setattr(rules, "sre_parse", None)
+    assert rules.required_literals(compiled.rule) is None
+
+
+def test_prefilter_stats_are_thread_safe():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from tools.move.rules import prefilter_stats
+
+    compiled = compile_rule(
+        Rule.from_dict({"tmdb_id": 1, "season": 1, "aliases": ["Show"]})
+    )
+    names = ["Show - 01.mkv", "Other - 01.mkv"] * 2000
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(compiled.search, names))
+    assert prefilter_stats([compiled]) == {
+        "checked": 4000,
+        "skipped": 2000,
+        "matched": 2000,
+    }
@@ -8,7 +8,7 @@ SRC = Path(__file__).resolve().parents[1] / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
-from tools.move.implementations import factory  # noqa: E402
+from tools.move.implementations import factory
 
 
 def test_mover_tmdb_120089_s1_links_expected_files():
@@ -8,7 +8,7 @@ SRC = Path(__file__).resolve().parents[1] / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
-from tools.move.implementations import factory  # noqa: E402
+from tools.move.implementations import factory
 
 
 def test_mover_tmdb_253093_s1_links_expected_files():
@@ -28,7 +28,7 @@ def test_mover_tmdb_253093_s1_links_expected_files():
             "别的剧.S01E01.mkv": False,
         }
 
-        for name, _ in cases.items():
+        for name in cases:
             (src / name).write_text("x", encoding="utf-8")
 
         mover = factory.create("tmdb-253093-s1")
@@ -47,4 +47,3 @@ def test_mover_tmdb_253093_s1_links_expected_files():
             assert src_stat.st_ino == dst_stat.st_ino, (
                 f"{name} 不是硬链接（inode 不一致）"
             )
-
@@ -3,13 +3,12 @@ import sys
 import tempfile
 from pathlib import Path
 
-
 SRC = Path(__file__).resolve().parents[1] / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
 
-from tools.move.implementations import factory  # noqa: E402
+from tools.move.implementations import factory
 
 
 def test_mover_tmdb_271649_s1_links_expected_files():
@@ -35,7 +34,7 @@ def test_mover_tmdb_271649_s1_links_expected_files():
             "Ruri Jewelers.E01.mkv": False,
         }
 
-        for name, _ in cases.items():
+        for name in cases:
             (src / name).write_text("x", encoding="utf-8")
 
         mover = factory.create("tmdb-271649-s1")
@@ -54,4 +53,3 @@ def test_mover_tmdb_271649_s1_links_expected_files():
             assert src_stat.st_ino == dst_stat.st_ino, (
                 f"{name} 不是硬链接（inode 不一致）"
             )
-
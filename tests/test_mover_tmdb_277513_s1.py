@@ -9,7 +9,7 @@ SRC = Path(__file__).resolve().parents[1] / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
-from tools.move.implementations import factory  # noqa: E402
+from tools.move.implementations import factory
 
 
 def test_mover_tmdb_277513_s1_excludes_v2_and_includes_v20():
@@ -46,7 +46,7 @@ def test_mover_tmdb_277513_s1_excludes_v2_and_includes_v20():
             "[Prejudice-Studio] 我怎么可能成为你的恋人，不行不行！(※不是不可能！？) Watashi ga Koibito ni Nareru Wake Nai jan - 06v3 [WebRip 1080P HEVC 8bit AAC MKV][简繁内封].mkv": False,
         }
 
-        for name, _ in cases.items():
+        for name in cases:
             (src / name).write_text("x", encoding="utf-8")
 
         # 获取并执行 mover
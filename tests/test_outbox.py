@@ -0,0 +1,81 @@
+import logging
+
+from tools import dba
+from tools.share.outbox import OutboxHandler, OutboxSender
+from tools.share.tg_bot import pack
+
+
+class FakeSender:
+    def __init__(self, fail: int = 0):
+        self.fail = fail
+        self.sent: list[str] = []
+
+    def send(self, text: str) -> bool:
+        if self.fail > 0:
+            self.fail -= 1
+            return False
+        self.sent.append(text)
+        return True
+
+
+def pending_count() -> int:
+    with dba.get_connection(None) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL"
+        ).fetchone()[0]
+
+
+def test_handler_writes_to_outbox_without_network(temp_pool):
+    handler = OutboxHandler(flush_interval_sec=0.01)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger = logging.getLogger("test_outbox.handler")
+    logger.setLevel(logging.INFO)  # 不依赖别的测试先配置过根日志器
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        logger.info("第一条")
+        logger.info("第二条")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    rows = dba.claim_outbox(10).value
+    assert [row["text"] for row in rows] == ["第一条", "第二条"]
+
+
+def test_sender_batches_and_marks_sent(temp_pool):
+    dba.insert_outbox(["a", "b", "c"])
+    fake = FakeSender()
+    sender = OutboxSender(fake)
+
+    assert sender.drain_once() == 3
+    assert fake.sent == ["a\nb\nc"]
+    assert pending_count() == 0
+    assert sender.drain_once() == 0
+
+
+def test_failed_send_is_deferred_and_retried(temp_pool):
+    dba.insert_outbox(["a", "b"])
+    fake = FakeSender(fail=1)
+    sender = OutboxSender(fake, chunk_chars=1)
+
+    assert sender.drain_once() == 0
+    assert pending_count() == 2
+    # 推迟后未到期，不会被领取
+    assert dba.claim_outbox(10).value == []
+
+    with dba.get_connection() as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = 0")
+    assert sender.drain_once() == 2
+    assert fake.sent == ["a", "b"]
+
+
+def test_claimed_rows_are_not_claimed_twice(temp_pool):
+    dba.insert_outbox(["a"])
+    assert len(dba.claim_outbox(10, lease_sec=60).value) == 1
+    assert dba.claim_outbox(10).value == []
+
+
+def test_pack_respects_limit():
+    assert list(pack(["aa", "bb", "cccc", "d"], 5)) == [["aa", "bb"], ["cccc"], ["d"]]
+    assert list(pack(["toolong"], 3)) == [["toolong"]]
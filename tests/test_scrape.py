@@ -0,0 +1,103 @@
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from tools import dba, service
+from tools.dba import ConnectionPool
+from tools.move import journal
+from tools.move.implementations import default_move
+from tools.scrape import parse_episode, write_nfos
+
+SEASON = {
+    "id": 9001,
+    "name": "第二季",
+    "overview": "季简介",
+    "air_date": "2024-04-01",
+    "episodes": [
+        {
+            "id": 1,
+            "episode_number": 1,
+            "name": "第一话 <开始> & 结束",
+            "air_date": "2024-04-01",
+        },
+        {"id": 2, "episode_number": 2, "name": "第二话", "overview": "简介"},
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "name, episode",
+    [
+        ("My Hero Academia - S02E03.mkv", 3),
+        ("[Nekomoe] SPY×FAMILY - 05 [1080p].mkv", 5),
+        ("凡人修仙传 第120话 1080P.mp4", 120),
+        ("Show [07v2][1080p].mkv", 7),
+        ("Show.E12.2160p.x265.mkv", 12),
+        ("[LoliHouse] Show - 03 [WebRip 1080p HEVC-10bit AAC].mkv", 3),
+        ("Movie.2024.1080p.H.264.mkv", None),
+    ],
+)
+def test_parse_episode(name, episode):
+    assert parse_episode(name) == episode
+
+
+def test_write_nfos_only_for_given_videos():
+    with tempfile.TemporaryDirectory() as td:
+        season_dir = Path(td) / "Season 2"
+        season_dir.mkdir()
+        files = [
+            season_dir / n
+            for n in (
+                "Show - 01.mkv",
+                "Show - 02.mkv",
+                "Show - 01.ass",
+                "Show - 09.mkv",
+            )
+        ]
+        for f in files:
+            f.write_text("x")
+        (season_dir / "Old - 05.mkv").write_text("x")
+
+        counts = write_nfos(files, 2, SEASON)
+        assert counts == {"written": 2, "exists": 0, "unmatched": 1}
+
+        nfo = (season_dir / "Show - 01.nfo").read_text(encoding="utf-8")
+        assert "<episode>1</episode>" in nfo and "<season>2</season>" in nfo
+        assert "&lt;开始&gt; &amp; 结束" in nfo
+        assert "<seasonnumber>2</seasonnumber>" in (
+            season_dir / "season.nfo"
+        ).read_text(encoding="utf-8")
+        assert not (season_dir / "Old - 05.nfo").exists()
+
+        assert write_nfos(files, 2, SEASON)["exists"] == 2
+
+
+def test_scrape_task_uses_link_plan_and_fetches_season_once(monkeypatch):
+    with tempfile.TemporaryDirectory() as td:
+        pool = ConnectionPool(Path(td) / "app.db")
+        monkeypatch.setattr(dba, "POOL", pool)
+        src, dst = Path(td) / "src", Path(td) / "Season 2"
+        src.mkdir()
+        dst.mkdir()
+        for name in ("Show - 01.mkv", "Show - 02.mkv"):
+            (src / name).write_text("x")
+
+        journal.execute_plan(
+            5, journal.plan_links(5, default_move(r"\.mkv$"), src, dst)
+        )
+
+        calls = []
+
+        def fake_fetch_season(tmdb_id, season, language="zh-CN"):
+            calls.append((tmdb_id, season))
+            return SEASON
+
+        monkeypatch.setattr(service, "fetch_season", fake_fetch_season)
+        task = SimpleNamespace(id=5, tags=SimpleNamespace(season=2))
+        counts = service.scrape_task(task, SimpleNamespace(tmdb_id=42))
+
+        assert counts["written"] == 2
+        assert calls == [(42, 2)]
+        pool.close_all()
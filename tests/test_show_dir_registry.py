@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from tools import service
+
+
+def test_show_dir_is_resolved_once_then_reused(temp_pool, monkeypatch):
+    names = iter(["First Name", "Renamed On TMDB"])
+    calls: list[int] = []
+
+    def fake_name(tmdb_id: int) -> str:
+        calls.append(tmdb_id)
+        return next(names)
+
+    monkeypatch.setattr(service, "get_tv_show_name_by_id", fake_name)
+    root = Path("/library/anime")
+
+    first = service.resolve_show_dir(1001, "动漫", root)
+    again = service.resolve_show_dir(1001, "动漫", root)
+    assert first == again == root / "First Name"
+    assert calls == [1001], "登记后不应再请求 TMDB"
+
+    # 根目录变更时沿用文件夹名，也不请求 TMDB
+    moved = service.resolve_show_dir(1001, "动漫", "/new/anime")
+    assert moved == Path("/new/anime/First Name")
+    assert calls == [1001]
+
+    refreshed = service.refresh_show_dir(1001, "动漫", "/new/anime")
+    assert refreshed == Path("/new/anime/Renamed On TMDB")
+    assert service.resolve_show_dir(1001, "动漫", "/new/anime") == refreshed
+    assert calls == [1001, 1001]
@@ -0,0 +1,76 @@
+import logging
+
+from tools.share.tg_bot import TelegramHandler
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict | None = None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers: dict[str, str] = {}
+        self._body = body or {"ok": self.ok}
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    def __init__(self, responses: list[FakeResponse]):
+        self.responses = responses
+        self.posts: list[str] = []
+
+    def post(self, url, data, timeout):
+        self.posts.append(data["text"])
+        return self.responses.pop(0) if self.responses else FakeResponse(200)
+
+
+def make_handler(session: FakeSession, **kwargs) -> TelegramHandler:
+    handler = TelegramHandler("token", "chat", rate_limit_sec=0, **kwargs)
+    handler.sender.session = session  # type: ignore[assignment]
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+def emit(handler: TelegramHandler, *messages: str) -> None:
+    for msg in messages:
+        handler.emit(logging.LogRecord("t", logging.INFO, __file__, 1, msg, None, None))
+
+
+def test_records_are_coalesced_into_one_message():
+    session = FakeSession([])
+    handler = make_handler(session, flush_window_sec=0.5)
+    emit(handler, *(f"第 {i} 条" for i in range(10)))
+    handler.close()
+
+    assert session.posts == ["\n".join(f"第 {i} 条" for i in range(10))]
+    assert handler.stats["sent"] == 1
+    assert handler.stats["records"] == 10
+    assert handler.stats["batched"] == 10
+
+
+def test_batches_respect_chunk_chars():
+    session = FakeSession([])
+    handler = make_handler(session, flush_window_sec=0.5, chunk_chars=25)
+    emit(handler, *("x" * 10 for _ in range(5)))
+    handler.close()
+
+    assert all(len(post) <= 25 for post in session.posts)
+    assert "".join(session.posts).count("x") == 50
+    assert handler.stats["records"] == 5
+
+
+def test_429_honours_retry_after_then_drops_when_retries_exhausted():
+    limited = {"ok": False, "parameters": {"retry_after": 0}}
+    session = FakeSession([FakeResponse(429, limited), FakeResponse(200)])
+    handler = make_handler(session, flush_window_sec=0)
+    emit(handler, "hello")
+    handler.flush()
+    assert session.posts == ["hello", "hello"]
+    assert handler.stats["rate_limited"] == 1
+    assert handler.stats["sent"] == 1
+
+    session.responses = [FakeResponse(429, limited)] * 3
+    handler.sender.max_retries = 2
+    emit(handler, "lost")
+    handler.close()
+    assert handler.stats["dropped"] == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from tools.tmdb import CacheKey, TMDBCache, TMDBNotFoundError
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+def test_cache_key_ignores_append_order():
+    a = CacheKey.build("tv", 1, {"language": "zh-CN", "append_to_response": "b,a"})
+    b = CacheKey.build("tv", 1, {"append_to_response": "a,b", "language": "zh-CN"})
+    assert a == b
+
+
+def test_fresh_entries_never_touch_network_and_survive_restart(temp_pool):
+    key = CacheKey.build("tv", 42, {"language": "zh-CN"})
+    calls: list[dict] = []
+
+    def send(headers):
+        calls.append(headers)
+        return FakeResponse(200, {"name": "Show"}, {"ETag": '"v1"'})
+
+    cache = TMDBCache(ttl=60)
+    assert cache.fetch(key, send) == {"name": "Show"}
+    assert cache.fetch(key, send) == {"name": "Show"}
+    assert len(calls) == 1 and cache.stats["memory"] == 1
+
+    # 新进程（新的内存 LRU）从 sqlite 读到缓存
+    restarted = TMDBCache(ttl=60)
+    assert restarted.fetch(key, send) == {"name": "Show"}
+    assert len(calls) == 1 and restarted.stats["db"] == 1
+
+
+def test_expired_entry_is_revalidated_with_etag(temp_pool):
+    key = CacheKey.build("tv", 43, {"language": "zh-CN"})
+    cache = TMDBCache(ttl=-1)  # 写入即过期
+    cache.fetch(key, lambda h: FakeResponse(200, {"name": "Old"}, {"ETag": '"v1"'}))
+
+    seen: list[dict] = []
+
+    def send(headers):
+        seen.append(headers)
+        return FakeResponse(304)
+
+    assert cache.fetch(key, send) == {"name": "Old"}
+    assert seen == [{"If-None-Match": '"v1"'}]
+    assert cache.stats["revalidated"] == 1
+
+
+def test_not_found_is_negatively_cached(temp_pool):
+    key = CacheKey.build("tv", 44, {"language": "zh-CN"})
+    calls: list[dict] = []
+
+    def send(headers):
+        calls.append(headers)
+        return FakeResponse(404)
+
+    cache = TMDBCache(negative_ttl=60)
+    for _ in range(2):
+        with pytest.raises(TMDBNotFoundError):
+            cache.fetch(key, send)
+    assert len(calls) == 1
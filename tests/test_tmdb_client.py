@@ -0,0 +1,99 @@
+import time
+
+import pytest
+import requests
+
+from tools.tmdb import TMDBClient, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.headers: dict[str, str] = {}
+        self.calls: list[dict] = []
+
+    def get(self, url, **kwargs):
+        self.calls.append({"url": url, **kwargs})
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _client(session, **kwargs) -> TMDBClient:
+    return TMDBClient(
+        "token",
+        session=session,
+        backoff=0,
+        rate_limit=0,
+        **kwargs,  # type: ignore[arg-type]
+    )
+
+
+def test_client_retries_429_honoring_retry_after():
+    session = FakeSession([FakeResponse(429, {"Retry-After": "0"}), FakeResponse(200)])
+    client = _client(session)
+
+    response = client.get("tv/1", params={"language": "zh-CN"})
+
+    assert response.status_code == 200
+    assert len(session.calls) == 2
+    assert session.calls[0]["url"].endswith("/3/tv/1")
+    assert session.calls[0]["timeout"] == client.timeout
+    assert session.headers["Authorization"] == "Bearer token"
+
+
+def test_retry_after_is_a_minimum_not_capped_by_max_backoff(monkeypatch):
+    slept: list[float] = []
+    monkeypatch.setattr(time, "sleep", slept.append)
+    session = FakeSession([FakeResponse(503, {"Retry-After": "20"}), FakeResponse(200)])
+    client = _client(session, max_backoff=1.0, max_retry_after=60.0)
+
+    assert client.get("tv/1").status_code == 200
+    assert slept == [20.0]
+
+
+def test_retry_after_beyond_the_limit_gives_up(monkeypatch):
+    slept: list[float] = []
+    monkeypatch.setattr(time, "sleep", slept.append)
+    session = FakeSession(
+        [FakeResponse(429, {"Retry-After": "3600"}), FakeResponse(200)]
+    )
+    client = _client(session, max_retry_after=60.0)
+
+    assert client.get("tv/1").status_code == 429
+    assert slept == []
+    assert len(session.calls) == 1
+
+
+def test_client_gives_up_after_max_retries():
+    session = FakeSession([requests.ConnectionError("down")] * 3)
+    client = _client(session, max_retries=2)
+
+    with pytest.raises(requests.ConnectionError):
+        client.get("tv/1")
+    assert len(session.calls) == 3
+
+
+def test_client_does_not_retry_client_errors():
+    session = FakeSession([FakeResponse(404)])
+    assert _client(session).get("tv/1").status_code == 404
+    assert len(session.calls) == 1
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # 第一个令牌立即可用，之后每个约 50ms
+    assert time.monotonic() - start >= 0.18
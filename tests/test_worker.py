@@ -0,0 +1,188 @@
+import threading
+import time
+
+import pytest
+
+from tools import dba, worker
+from tools.meta import Task
+
+
+def _insert(name: str) -> int:
+    tags = {"season": 1, "tmdb": {"id": 515151, "name": "Worker"}}
+    task_id = dba.insert_task(name, "test", tags, f"/tmp/{name}").value
+    assert task_id is not None
+    return task_id
+
+
+def test_worker_drains_queue_and_picks_up_new_work(temp_pool, monkeypatch):
+    seen: list[int] = []
+
+    def fake_process(task: Task, lease=None) -> None:
+        seen.append(task.id)
+        dba.update_task_status(task.id, 2)
+
+    monkeypatch.setattr(worker, "process_task", fake_process)
+
+    first = [_insert(f"w-{i}") for i in range(3)]
+
+    w = worker.Worker(poll_interval=0.05, idle_exit=1.0)
+    t = threading.Thread(target=w.run)
+    t.start()
+
+    # 队列清空后 worker 处于休眠，另一个连接写入新任务应被发现
+    deadline = time.monotonic() + 5
+    while len(seen) < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    late = _insert("w-late")
+
+    t.join(timeout=10)
+    assert not t.is_alive(), "空闲超时后 worker 应退出"
+    assert seen == first + [late]
+    assert w.processed == 4 and w.failed == 0
+
+
+def test_worker_survives_failing_task_and_stops_gracefully(temp_pool, monkeypatch):
+    def boom(task: Task, lease=None) -> None:
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(worker, "process_task", boom)
+    _insert("bad")
+
+    w = worker.Worker(poll_interval=0.05)
+    t = threading.Thread(target=w.run)
+    t.start()
+    time.sleep(0.3)
+    w.stop()
+    t.join(timeout=5)
+
+    assert not t.is_alive()
+    assert w.failed == 1 and w.processed == 0
+
+
+def test_worker_runs_series_in_parallel_but_serializes_same_series(
+    temp_pool, monkeypatch
+):
+    lock = threading.Lock()
+    running: dict[int, int] = {}
+    peak = {"total": 0, "same_series": 0}
+
+    def slow_process(task: Task, lease=None) -> None:
+        tmdb_id = task.tags.tmdb.id
+        with lock:
+            running[tmdb_id] = running.get(tmdb_id, 0) + 1
+            peak["total"] = max(peak["total"], sum(running.values()))
+            peak["same_series"] = max(peak["same_series"], running[tmdb_id])
+        time.sleep(0.2)
+        with lock:
+            running[tmdb_id] -= 1
+        dba.update_task_status(task.id, 2)
+
+    monkeypatch.setattr(worker, "process_task", slow_process)
+
+    for i, tmdb_id in enumerate((1, 1, 1, 2, 3)):
+        tags = {"season": 1, "tmdb": {"id": tmdb_id, "name": f"S{tmdb_id}"}}
+        dba.insert_task(f"p-{tmdb_id}", "test", tags, f"/tmp/p-{i}")
+
+    w = worker.Worker(concurrency=3, poll_interval=0.05, idle_exit=0.5)
+    w.run()
+
+    assert w.processed == 5
+    assert peak["total"] > 1, "不同剧应并行处理"
+    assert peak["same_series"] == 1, "同一部剧应串行处理"
+    with dba.get_connection() as conn:
+        left = conn.execute(
+            "SELECT COUNT(*) AS n FROM task WHERE status != 2"
+        ).fetchone()
+        locked = conn.execute(
+            "SELECT COUNT(*) AS n FROM locks WHERE is_locked = 1"
+        ).fetchone()
+    assert left["n"] == 0 and locked["n"] == 0
+
+
+def test_worker_renews_lease_of_long_running_task(temp_pool, monkeypatch):
+    stolen: list[list[Task]] = []
+
+    def long_process(task: Task, lease=None) -> None:
+        # 处理时间超过租约：不续租的话租约已过期，别的 worker 能领走
+        time.sleep(2.2)
+        stolen.append(dba.claim_tasks("intruder").value)
+        dba.update_task_status(task.id, 2)
+
+    monkeypatch.setattr(worker, "process_task", long_process)
+    _insert("long")
+
+    w = worker.Worker(poll_interval=0.05, idle_exit=0.5, lease_sec=1)
+    t = threading.Thread(target=w.run)
+    t.start()
+    t.join(timeout=10)
+
+    assert not t.is_alive()
+    assert stolen == [[]]
+    assert w.processed == 1
+
+
+def test_failing_task_backs_off_then_fails_for_good(temp_pool, monkeypatch):
+    from tools import service
+
+    monkeypatch.setattr(service, "MAX_TASK_ATTEMPTS", 2)
+    task_id = _insert("flaky")
+
+    [task] = dba.claim_tasks("w1").value
+    assert task.attempts == 0
+    service.fail_task(task, "w1")
+    assert dba.get_task_by_id(task_id).value.attempts == 1
+    # 退避期间不会被重新领取
+    assert dba.claim_tasks("w2").value == []
+    retry_at = dba.get_task_by_id(task_id).value.lease_expires_at
+    assert retry_at >= time.time() + service.TASK_RETRY_BASE_SEC - 1
+
+    with dba.get_connection(None) as conn:
+        conn.execute("UPDATE task SET lease_expires_at = 0 WHERE id = ?", (task_id,))
+    [again] = dba.claim_tasks("w2").value
+    assert again.id == task_id and again.attempts == 1
+    service.fail_task(again, "w2")
+
+    failed = dba.get_task_by_id(task_id).value
+    assert failed.status == 4 and failed.attempts == 2
+    assert failed.lease_expires_at is None
+    with dba.get_connection(None) as conn:
+        conn.execute("UPDATE task SET lease_expires_at = 0 WHERE id = ?", (task_id,))
+    assert dba.claim_tasks("w3").value == []
+
+
+def test_released_task_is_not_counted_as_failed(temp_pool, monkeypatch):
+    from tools import service
+
+    monkeypatch.setattr(service, "MAX_TASK_ATTEMPTS", 2)
+    task_id = _insert("busy")
+
+    # 系列锁被占、停机、租约丢失都会把任务放回队列，这些不算失败
+    for _ in range(5):
+        [task] = dba.claim_tasks("w1").value
+        dba.release_tasks([task.id], "w1")
+
+    [task] = dba.claim_tasks("w1").value
+    assert task.attempts == 0
+    service.fail_task(task, "w1")
+
+    retried = dba.get_task_by_id(task_id).value
+    assert retried.status == 1 and retried.attempts == 1
+    # 退避按第一次失败算
+    assert retried.lease_expires_at <= time.time() + service.TASK_RETRY_BASE_SEC
+
+
+def test_execute_records_failure(temp_pool, monkeypatch):
+    from tools import commands
+
+    def broken_process(task: Task, lease=None) -> None:
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(commands, "process_task", broken_process)
+    task_id = _insert("cli")
+
+    with pytest.raises(RuntimeError):
+        commands.execute()
+
+    task = dba.get_task_by_id(task_id).value
+    assert task.status == 1 and task.attempts == 1
+    assert task.lease_expires_at > time.time()